@@ -123,6 +123,8 @@ TYPING_DOT_DELAY = 280  # ms between dots
 CONTEXT_WINDOW_MAX = 8192
 CONTEXT_TRIM_THRESHOLD = 0.85  # Trim when usage exceeds 85% of max
 CHARS_PER_TOKEN_EST = 4  # Rough estimate for token counting
+AGENT_CONTEXT_HEAD_MESSAGES = 2  # Opening messages always kept in agent prompts
+AGENT_CONTEXT_MAX_MESSAGES = 40  # Most recent messages kept in agent prompts
 
 # API
 API_ENDPOINT_DEFAULT = "http://localhost:1234/v1"
@@ -130,6 +132,7 @@ API_CHAT_COMPLETIONS = "/chat/completions"
 API_MODELS = "/models"
 API_TIMEOUT = 120
 API_RECONNECT_INTERVAL = 5000  # ms
+CONNECTION_POLL_INTERVAL_SEC = 0  # Background connection re-check; 0 disables (opt-in)
 
 # Default settings
 DEFAULT_TEMPERATURE = 0.7
@@ -12,6 +12,7 @@ import logging
 import sys
 import asyncio
 import threading # Added import
+from concurrent.futures import ThreadPoolExecutor
 
 import os
 
@@ -49,6 +50,18 @@ class AsyncioThread(threading.Thread):
 
     def run(self):
         self.loop = asyncio.new_event_loop()
+        if sys.version_info >= (3, 12):
+            # Coroutines that finish without suspending (cached tool results,
+            # auto-approved calls) complete without an extra loop tick.
+            self.loop.set_task_factory(asyncio.eager_task_factory)
+        # asyncio.to_thread work here is light I/O (tokenizing, file reads);
+        # keep the worker pool small so it does not contend with GTK.
+        self.loop.set_default_executor(
+            ThreadPoolExecutor(
+                max_workers=min(8, (os.cpu_count() or 1) + 4),
+                thread_name_prefix="asyncio-worker",
+            )
+        )
         asyncio.set_event_loop(self.loop)
         logger.info("Asyncio event loop started in separate thread.")
         self.started.set()
@@ -1,11 +1,13 @@
 """
 Data models for conversations and messages.
 """
-from .message import Message, MessageRole, Conversation, ConversationSettings
+from .message import Message, MessageRole, ChatMode, Conversation, ConversationSettings, NormalizedTasks
 
 __all__ = [
     "Message",
     "MessageRole", 
+    "ChatMode",
     "Conversation",
     "ConversationSettings",
+    "NormalizedTasks",
 ]
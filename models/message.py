@@ -7,8 +7,8 @@ message list - never shared between chats.
 """
 from dataclasses import dataclass, field
 from datetime import datetime
-from typing import Optional
-from enum import Enum
+from typing import NamedTuple, Optional
+from enum import Enum, StrEnum
 
 from token_counter import count_text_tokens
 
@@ -20,6 +20,32 @@ class MessageRole(Enum):
     SYSTEM = "system"
 
 
+class ChatMode(StrEnum):
+    """Assistant mode of a conversation."""
+    ASK = "ask"
+    PLAN = "plan"
+    AGENT = "agent"
+
+    @classmethod
+    def coerce(cls, value: object) -> "ChatMode":
+        """Return the matching mode for a stored/UI value, defaulting to ASK."""
+        if isinstance(value, cls):
+            return value
+        try:
+            return cls(str(value or "").strip().lower())
+        except ValueError:
+            return cls.ASK
+
+
+class NormalizedTasks(NamedTuple):
+    """Normalized view of ``Conversation.ai_tasks``, cached on the conversation."""
+    source: object  # the ai_tasks value it was built from
+    size: int  # len(source) when built, -1 if source is not a list
+    rev: int  # _ai_tasks_rev when built
+    tasks: list[dict]  # normalized task list; read-only for callers
+    in_place: bool  # source is already normalized, so it may be edited in place
+
+
 @dataclass
 class Message:
     """Represents a single message in a conversation."""
@@ -46,9 +72,21 @@ class Conversation:
     total_tokens: int = 0
     chat_settings: Optional[dict] = None  # Per-chat override settings
     ai_tasks: list[dict] = field(default_factory=list)  # Planning tasks for this conversation
-    chat_mode: str = "ask"  # ask | plan | agent
+    chat_mode: ChatMode = ChatMode.ASK
     agent_config: Optional[dict] = None  # {"project_name": str, "project_dir": str}
     active_context_files: dict[str, str] = field(default_factory=dict) # Files loaded for deep retrieval
+    # Bumped on in-place task edits; with list identity keys the normalized-task cache
+    _ai_tasks_rev: int = field(default=0, init=False, repr=False, compare=False)
+    _normalized_tasks_cache: Optional[NormalizedTasks] = field(default=None, init=False, repr=False, compare=False)
+    # Bumped whenever message tokens change; keys the context estimate cache
+    _messages_revision: int = field(default=0, init=False, repr=False, compare=False)
+    _token_estimate_cache: dict[str, tuple[tuple[int, int, int], int]] = field(
+        default_factory=dict, init=False, repr=False, compare=False
+    )
+    # (revision, id(messages), len) stamp and the message id -> index map built for it
+    _message_index: Optional[tuple[tuple[int, int, int], dict[str, int]]] = field(
+        default=None, init=False, repr=False, compare=False
+    )
 
     def _is_ui_only_message(self, message: Message) -> bool:
         """Return True for UI-only messages that should not be sent to the model."""
@@ -61,10 +99,64 @@ class Conversation:
         elif message.tokens <= 0:
             message.tokens = self._estimate_tokens(message.content, self.model)
         self.messages.append(message)
+        self._messages_revision += 1
         self.updated_at = datetime.now()
         if not self._is_ui_only_message(message):
             self.total_tokens += message.tokens
 
+    def mark_messages_changed(self) -> None:
+        """Invalidate cached token estimates after editing messages in place."""
+        self._messages_revision += 1
+
+    def mark_tasks_changed(self) -> None:
+        """Invalidate cached task normalization after editing ai_tasks in place."""
+        self._ai_tasks_rev += 1
+
+    def update_task_in_place(self, index: int, **fields) -> bool:
+        """Update one task of an already-normalized ``ai_tasks`` list.
+
+        Bumps the task revision and keeps the normalized-task cache pointing
+        at the live list. Returns False, changing nothing, when the cache does
+        not vouch for ``ai_tasks`` being normalized or the index is out of
+        range; callers then rebuild the list instead.
+        """
+        tasks = self.ai_tasks
+        cached = self._normalized_tasks_cache
+        if (
+            cached is None
+            or not cached.in_place
+            or cached.source is not tasks
+            or cached.size != len(tasks)
+            or cached.rev != self._ai_tasks_rev
+            or not 0 <= index < len(tasks)
+        ):
+            return False
+        tasks[index].update(fields)
+        self.mark_tasks_changed()
+        self._normalized_tasks_cache = NormalizedTasks(tasks, len(tasks), self._ai_tasks_rev, tasks, True)
+        return True
+
+    def find_message(self, message_id: str) -> Optional[tuple[int, Message]]:
+        """Return ``(index, message)`` for a message id, or None.
+
+        The id index is rebuilt lazily whenever the message list changes.
+        """
+        messages = self.messages
+        stamp = (self._messages_revision, id(messages), len(messages))
+        cached = self._message_index
+        if cached is None or cached[0] != stamp:
+            cached = (stamp, {msg.id: i for i, msg in enumerate(messages)})
+            self._message_index = cached
+        index = cached[1].get(message_id)
+        if index is None:
+            return None
+        message = messages[index]
+        if message.id != message_id:
+            # Replaced in place without a revision bump; rebuild on next lookup.
+            self._message_index = None
+            return self.find_message(message_id)
+        return index, message
+
     def get_last_message(self) -> Optional[Message]:
         """Get the last message in the conversation."""
         return self.messages[-1] if self.messages else None
@@ -76,6 +168,12 @@ class Conversation:
     def estimate_context_tokens(self, model: Optional[str] = None) -> int:
         """Estimate total tokens for all messages in this conversation."""
         target_model = model or self.model
+        # List identity and length catch slices/reassignments done outside add_message.
+        stamp = (self._messages_revision, id(self.messages), len(self.messages))
+        cached = self._token_estimate_cache.get(target_model)
+        if cached is not None and cached[0] == stamp:
+            self.total_tokens = cached[1]
+            return cached[1]
         total = 0
         for msg in self.messages:
             if self._is_ui_only_message(msg):
@@ -84,6 +182,7 @@ class Conversation:
                 msg.tokens = self._estimate_tokens(msg.content, target_model)
             total += msg.tokens
         self.total_tokens = total
+        self._token_estimate_cache[target_model] = (stamp, total)
         return total
 
     def get_context_window(self, max_tokens: Optional[int] = None) -> list[dict]:
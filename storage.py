@@ -6,10 +6,29 @@ import os
 from datetime import datetime
 from typing import Optional
 
-from models import Conversation, Message, MessageRole, ConversationSettings
+from models import Conversation, Message, MessageRole, ChatMode, ConversationSettings
 import constants as C
 
 
+# Parsed config files keyed on their (mtime_ns, size) stamps; re-read only on change.
+_tools_cache: Optional[tuple[Optional[tuple[int, int]], tuple[Optional[list], Optional[object]]]] = None
+_mcp_configs_cache: Optional[tuple[tuple, dict[str, dict]]] = None
+# Conversations directory, created on first use.
+_conversations_dir: Optional[str] = None
+# Per-conversation files known to be on disk: loaded at startup, then tracked
+# by snapshot_conversations so saves never stat each file.
+_saved_conversation_paths: set[str] = set()
+
+
+def _file_stamp(path: str) -> Optional[tuple[int, int]]:
+    """Return (mtime_ns, size) for a file, or None if it does not exist."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
 def _get_config_dir() -> str:
     """Get config directory path."""
     config_dir = os.path.join(os.path.expanduser("~"), ".config", "AutoAIAgent")
@@ -144,10 +163,16 @@ def load_mcp_server_configs() -> dict[str, dict]:
           "config": {...},
           "sources": ["lmstudio", "app"]
         }
+        The result is cached until a config file changes; treat it as read-only.
     """
+    global _mcp_configs_cache
+    paths = _iter_mcp_paths()
+    stamps = tuple((path, _file_stamp(path) if path else None) for _, path in paths)
+    if _mcp_configs_cache is not None and _mcp_configs_cache[0] == stamps:
+        return _mcp_configs_cache[1]
     merged: dict[str, dict] = {}
-    for source, path in _iter_mcp_paths():
-        if not path or not os.path.exists(path):
+    for (source, path), (_, stamp) in zip(paths, stamps):
+        if stamp is None:
             continue
         try:
             with open(path, "r", encoding="utf-8") as f:
@@ -193,6 +218,7 @@ def load_mcp_server_configs() -> dict[str, dict]:
                         existing["sources"] = sources
         except (json.JSONDecodeError, IOError, AttributeError):
             continue
+    _mcp_configs_cache = (stamps, merged)
     return merged
 
 
@@ -316,18 +342,24 @@ def load_tools() -> tuple[Optional[list], Optional[object]]:
     Returns:
         (tools, tool_choice) or (None, None) if file missing/invalid.
     """
+    global _tools_cache
     path = os.path.join(_get_config_dir(), "tools.json")
-    if not os.path.exists(path):
+    stamp = _file_stamp(path)
+    if stamp is None:
         return (None, None)
+    if _tools_cache is not None and _tools_cache[0] == stamp:
+        return _tools_cache[1]
     try:
         with open(path, "r", encoding="utf-8") as f:
             data = json.load(f)
         tools = data.get("tools")
         tool_choice = data.get("tool_choice")
-        return (tools if tools else None, tool_choice)
+        result = (tools if tools else None, tool_choice)
     except (json.JSONDecodeError, IOError) as e:
         print(f"Warning: Could not load tools: {e}")
-        return (None, None)
+        result = (None, None)
+    _tools_cache = (stamp, result)
+    return result
 
 
 def _message_to_dict(msg: Message) -> dict:
@@ -367,7 +399,7 @@ def _conversation_to_dict(conv: Conversation) -> dict:
         "total_tokens": conv.total_tokens,
         "messages": [_message_to_dict(m) for m in conv.messages],
         "ai_tasks": conv.ai_tasks if isinstance(conv.ai_tasks, list) else [],
-        "chat_mode": conv.chat_mode if str(getattr(conv, "chat_mode", "ask")) in ("ask", "plan", "agent") else "ask",
+        "chat_mode": ChatMode.coerce(getattr(conv, "chat_mode", None)).value,
         "active_context_files": conv.active_context_files if isinstance(conv.active_context_files, dict) else {},
     }
     if conv.chat_settings is not None:
@@ -388,7 +420,7 @@ def _conversation_from_dict(data: dict) -> Conversation:
         total_tokens=data.get("total_tokens", 0),
         chat_settings=data.get("chat_settings"),
         ai_tasks=data.get("ai_tasks") if isinstance(data.get("ai_tasks"), list) else [],
-        chat_mode=data.get("chat_mode") if str(data.get("chat_mode")) in ("ask", "plan", "agent") else "ask",
+        chat_mode=ChatMode.coerce(data.get("chat_mode")),
         agent_config=data.get("agent_config") if isinstance(data.get("agent_config"), dict) else None,
         active_context_files=data.get("active_context_files") if isinstance(data.get("active_context_files"), dict) else {},
     )
@@ -397,6 +429,40 @@ def _conversation_from_dict(data: dict) -> Conversation:
     return conv
 
 
+def _get_conversations_dir() -> str:
+    """Get directory holding one JSON file per conversation, creating it once."""
+    global _conversations_dir
+    if _conversations_dir is None:
+        conv_dir = os.path.join(_get_config_dir(), "conversations")
+        os.makedirs(conv_dir, exist_ok=True)
+        _conversations_dir = conv_dir
+    return _conversations_dir
+
+
+def _get_conversation_path(conversation_id: str) -> str:
+    """Get path to a single conversation's data file."""
+    safe_id = "".join(ch if ch.isalnum() or ch in "-_" else "_" for ch in str(conversation_id))
+    return os.path.join(_get_conversations_dir(), f"conv_{safe_id}.json")
+
+
+def _encode_json(data: dict) -> str:
+    """Serialize data to the JSON text stored on disk."""
+    return json.dumps(data, indent=2, ensure_ascii=False)
+
+
+def _write_text_atomic(path: str, text: str) -> None:
+    """Write text atomically via a temp file and rename."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def _write_json(path: str, data: dict) -> None:
+    """Write JSON atomically via a temp file and rename."""
+    _write_text_atomic(path, _encode_json(data))
+
+
 def load_conversations() -> list[Conversation]:
     """Load all saved conversations from disk.
     
@@ -404,31 +470,100 @@ def load_conversations() -> list[Conversation]:
         List of Conversation objects, or empty list if file doesn't exist or is invalid.
     """
     path = _get_storage_path()
+    # Create the conversations directory up front; saves reuse it.
+    _get_conversations_dir()
+    _saved_conversation_paths.clear()
     if not os.path.exists(path):
         return []
     
     try:
         with open(path, "r", encoding="utf-8") as f:
             data = json.load(f)
-        return [_conversation_from_dict(c) for c in data.get("conversations", [])]
+        if data.get("version", 1) < 2:
+            return [_conversation_from_dict(c) for c in data.get("conversations", [])]
+        conversations = []
+        for conv_id in data.get("conversation_ids", []):
+            conv_path = _get_conversation_path(conv_id)
+            try:
+                with open(conv_path, "r", encoding="utf-8") as f:
+                    conversations.append(_conversation_from_dict(json.load(f)))
+                _saved_conversation_paths.add(conv_path)
+            except FileNotFoundError:
+                print(f"Warning: Missing conversation file: {conv_path}")
+            except (json.JSONDecodeError, KeyError, ValueError) as e:
+                print(f"Warning: Could not load conversation {conv_id}: {e}")
+        return conversations
     except (json.JSONDecodeError, KeyError, ValueError) as e:
         print(f"Warning: Could not load conversations: {e}")
         return []
 
 
-def save_conversations(conversations: list[Conversation]) -> None:
-    """Save all conversations to disk.
+def save_conversations(
+    conversations: list[Conversation],
+    changed_ids: Optional[set[str]] = None,
+) -> None:
+    """Save conversations to disk.
+
+    Each conversation lives in its own file; conversations.json is a manifest
+    listing the conversation ids in order.
     
     Args:
-        conversations: List of Conversation objects to save.
+        conversations: List of all Conversation objects.
+        changed_ids: Ids of conversations to rewrite. None rewrites all of them.
     """
-    path = _get_storage_path()
-    data = {
-        "conversations": [_conversation_to_dict(c) for c in conversations],
-        "version": 1,
+    write_conversations_snapshot(snapshot_conversations(conversations, changed_ids))
+
+
+def snapshot_conversations(
+    conversations: list[Conversation],
+    changed_ids: Optional[set[str]] = None,
+) -> dict:
+    """Serialize the conversations that need writing, without touching their files.
+
+    Call this on the thread that owns the Conversation objects; the returned
+    snapshot holds only strings and can be written from any thread with
+    write_conversations_snapshot. Files of conversations that are no longer
+    in the list are marked stale, whichever ids changed.
+
+    Args:
+        conversations: List of all Conversation objects.
+        changed_ids: Ids of conversations to rewrite. None rewrites all of them.
+    """
+    known_ids = [c.id for c in conversations]
+    files = {}
+    current_paths = set()
+    for conv in conversations:
+        conv_path = _get_conversation_path(conv.id)
+        current_paths.add(conv_path)
+        # Unsaved files (e.g. right after migrating a version 1 store) are always written.
+        if changed_ids is None or conv.id in changed_ids or conv_path not in _saved_conversation_paths:
+            files[conv_path] = _encode_json(_conversation_to_dict(conv))
+    # Files of deleted conversations; changed ids that are gone cover retries
+    # of a snapshot whose write failed.
+    stale = _saved_conversation_paths - current_paths
+    stale.update(_get_conversation_path(conv_id) for conv_id in set(changed_ids or ()) - set(known_ids))
+    stale_paths = list(stale)
+    _saved_conversation_paths.clear()
+    _saved_conversation_paths.update(current_paths)
+    return {
+        "files": files,
+        "stale_paths": stale_paths,
+        "manifest": _encode_json({"conversation_ids": known_ids, "version": 2}),
     }
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+
+
+def write_conversations_snapshot(snapshot: dict) -> None:
+    """Write a snapshot built by snapshot_conversations to disk."""
+    for conv_path, text in snapshot["files"].items():
+        _write_text_atomic(conv_path, text)
+
+    for conv_path in snapshot["stale_paths"]:
+        try:
+            os.remove(conv_path)
+        except FileNotFoundError:
+            pass
+
+    _write_text_atomic(_get_storage_path(), snapshot["manifest"])
 
 
 def append_file(file_path: str, content: str) -> None:
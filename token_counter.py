@@ -2,6 +2,7 @@
 from __future__ import annotations
 
 import logging
+from collections import OrderedDict
 from threading import Lock
 
 logger = logging.getLogger(__name__)
@@ -10,10 +11,15 @@ logger = logging.getLogger(__name__)
 class TokenCounter:
     """Tokenizer-backed token counter with model-aware encoding selection."""
 
+    _CACHE_SIZE = 4096
+
     def __init__(self):
         self._lock = Lock()
         self._tiktoken = None
         self._encodings = {}
+        # (hash(text), len(text), model) -> token count; length guards hash collisions.
+        self._count_cache: OrderedDict[tuple[int, int, str], int] = OrderedDict()
+        self._cache_lock = Lock()
         self._has_tiktoken = False
         self._init_tokenizer()
 
@@ -54,6 +60,54 @@ class TokenCounter:
         text = text or ""
         if not text:
             return 0
+        key = (hash(text), len(text), model or "")
+        with self._cache_lock:
+            cached = self._count_cache.get(key)
+            if cached is not None:
+                self._count_cache.move_to_end(key)
+                return cached
+        count = self._count_uncached(text, model)
+        with self._cache_lock:
+            self._count_cache[key] = count
+            if len(self._count_cache) > self._CACHE_SIZE:
+                self._count_cache.popitem(last=False)
+        return count
+
+    def count_texts(self, texts: list[str], model: str | None = None) -> list[int]:
+        """Count tokens for several texts with one batched tokenizer call."""
+        counts = [0] * len(texts)
+        missing: list[int] = []
+        with self._cache_lock:
+            for i, text in enumerate(texts):
+                if not text:
+                    continue
+                key = (hash(text), len(text), model or "")
+                cached = self._count_cache.get(key)
+                if cached is not None:
+                    self._count_cache.move_to_end(key)
+                    counts[i] = cached
+                else:
+                    missing.append(i)
+        if not missing:
+            return counts
+        enc = self._encoding_for_model(model)
+        batch = [texts[i] for i in missing]
+        if enc is None:
+            fresh = [max(1, len(text) // 4) for text in batch]
+        else:
+            try:
+                fresh = [len(ids) for ids in enc.encode_batch(batch)]
+            except Exception:
+                fresh = [self._count_uncached(text, model) for text in batch]
+        with self._cache_lock:
+            for i, count in zip(missing, fresh):
+                counts[i] = count
+                self._count_cache[(hash(texts[i]), len(texts[i]), model or "")] = count
+            while len(self._count_cache) > self._CACHE_SIZE:
+                self._count_cache.popitem(last=False)
+        return counts
+
+    def _count_uncached(self, text: str, model: str | None) -> int:
         enc = self._encoding_for_model(model)
         if enc is None:
             return max(1, len(text) // 4)
@@ -69,3 +123,8 @@ _counter = TokenCounter()
 def count_text_tokens(text: str, model: str | None = None) -> int:
     """Module-level convenience wrapper for tokenizer counting."""
     return _counter.count_text(text, model=model)
+
+
+def count_texts_tokens(texts: list[str], model: str | None = None) -> list[int]:
+    """Module-level convenience wrapper for batched tokenizer counting."""
+    return _counter.count_texts(texts, model=model)
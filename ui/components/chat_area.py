@@ -371,6 +371,44 @@ class ChatArea(Gtk.Box):
         self._request_scroll_to_bottom(6)
         return True
 
+    def remove_message(self, message_id: str) -> bool:
+        """Remove one message bubble without re-rendering the rest of the chat."""
+        bubble = self.get_message_bubble_by_id(message_id)
+        if bubble is None:
+            return False
+        self.messages_box.remove(bubble)
+        self._after_messages_removed()
+        return True
+
+    def truncate_from(self, message_id: str) -> bool:
+        """Remove a message bubble and everything displayed after it."""
+        if self.get_message_bubble_by_id(message_id) is None:
+            return False
+        self.end_assistant_stream()
+        self.hide_typing_indicator()
+        removing = False
+        for child in self.messages_box.get_children():
+            if not removing and isinstance(child, MessageBubble) and child.message.id == message_id:
+                removing = True
+            if removing:
+                self.messages_box.remove(child)
+        self._after_messages_removed()
+        return True
+
+    def _after_messages_removed(self) -> None:
+        """Drop date separators left without messages and resync date/subtitle state."""
+        children = self.messages_box.get_children()
+        last_date = None
+        for idx, child in enumerate(children):
+            if child.get_style_context().has_class("date-separator"):
+                following = children[idx + 1] if idx + 1 < len(children) else None
+                if following is None or following.get_style_context().has_class("date-separator"):
+                    self.messages_box.remove(child)
+            elif isinstance(child, MessageBubble):
+                last_date = child.message.timestamp.date()
+        self._last_date = last_date
+        self._update_subtitle()
+
     def show_typing_indicator(self) -> None:
         """Show the typing indicator."""
         if not self._typing_shown:
@@ -682,6 +720,7 @@ class ChatArea(Gtk.Box):
         """
         separator_box = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=12)
         separator_box.set_homogeneous(False)
+        separator_box.get_style_context().add_class("date-separator")
 
         # Line before
         line1 = Gtk.Separator(orientation=Gtk.Orientation.HORIZONTAL)
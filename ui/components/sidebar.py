@@ -249,6 +249,7 @@ class Sidebar(Gtk.Box):
         self.add(footer)
         
         self._conversations = {}
+        self._bulk_update_depth = 0
         self._current_active = None
         self._current_conversation_id = None
         self.on_conversation_selected = None
@@ -270,7 +271,23 @@ class Sidebar(Gtk.Box):
         self.conversations_box.add(item)
         item.show_all()  # Show the conversation item after adding it
         self._conversations[conversation.id] = (item, conversation)
-        self._refresh_tasks_controls()
+        if not self._bulk_update_depth:
+            self._refresh_tasks_controls()
+
+    def begin_bulk_update(self) -> None:
+        """Defer child notifications and control refreshes while adding many rows."""
+        if self._bulk_update_depth == 0:
+            self.conversations_box.freeze_child_notify()
+        self._bulk_update_depth += 1
+
+    def end_bulk_update(self) -> None:
+        """Finish a bulk update started with begin_bulk_update()."""
+        if self._bulk_update_depth == 0:
+            return
+        self._bulk_update_depth -= 1
+        if self._bulk_update_depth == 0:
+            self.conversations_box.thaw_child_notify()
+            self._refresh_tasks_controls()
 
     def remove_conversation(self, conversation_id: str) -> None:
         """Remove a conversation from the list.
@@ -334,6 +351,11 @@ class Sidebar(Gtk.Box):
         if self._current_conversation_id == conversation_id:
             self._refresh_tasks_view()
 
+    def refresh_ai_tasks(self, conversation_id: str) -> None:
+        """Re-render tasks after the conversation's list was edited in place."""
+        if self._current_conversation_id == conversation_id:
+            self._refresh_tasks_view()
+
     def _current_tasks(self) -> list[dict]:
         """Get tasks for active conversation."""
         if not self._current_conversation_id:
@@ -501,6 +523,9 @@ class Sidebar(Gtk.Box):
         """Notify listeners that active conversation tasks changed."""
         if not self._current_conversation_id:
             return
+        data = self._conversations.get(self._current_conversation_id)
+        if data:
+            data[1].mark_tasks_changed()
         if self.on_tasks_changed:
             self.on_tasks_changed(self._current_conversation_id, self._sanitize_tasks(tasks))
 
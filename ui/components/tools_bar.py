@@ -17,6 +17,7 @@ signatures and parameter information similar to LM Studio.
 import asyncio
 import logging
 import threading
+from typing import Optional
 import gi
 
 gi.require_version("Gtk", "3.0")
@@ -60,6 +61,8 @@ class ToolsBar(Gtk.Box):
         # Map of integration_id -> popover container widget created during init
         self._popover_containers: dict[str, Gtk.Box] = {}
         self._loading_popovers: set[str] = set()
+        # Enabled tool metadata; rebuilt after a switch is toggled.
+        self._enabled_metadata_cache: Optional[list[dict]] = None
 
         if not self._tools:
             label = Gtk.Label(label="No MCP tools found. Add in LM Studio or Settings → Add MCP Server")
@@ -103,10 +106,7 @@ class ToolsBar(Gtk.Box):
             switch.set_tooltip_text(f"Enable {name} for use in completions")
             self._switches[integration_id] = switch
             # Emit a signal when the switch state changes so outer code can react
-            switch.connect(
-                "notify::active",
-                lambda sw, pspec, iid=integration_id: self.emit("tool-toggled", iid, sw.get_active()),
-            )
+            switch.connect("notify::active", self._on_switch_toggled, integration_id)
 
             # Dropdown/popover to show available calls
             menu_btn = Gtk.MenuButton()
@@ -366,10 +366,16 @@ class ToolsBar(Gtk.Box):
         if sw is not None:
             sw.set_active(bool(enabled))
 
+    def _on_switch_toggled(self, switch, _pspec, integration_id: str) -> None:
+        self._enabled_metadata_cache = None
+        self.emit("tool-toggled", integration_id, switch.get_active())
+
     def get_enabled_tool_metadata(self) -> list[dict]:
         """Return metadata for currently enabled tools."""
-        enabled = []
-        for integration_id, sw in self._switches.items():
-            if sw.get_active() and integration_id in self._tools_by_id:
-                enabled.append(self._tools_by_id[integration_id])
-        return enabled
+        if self._enabled_metadata_cache is None:
+            self._enabled_metadata_cache = [
+                self._tools_by_id[integration_id]
+                for integration_id, sw in self._switches.items()
+                if sw.get_active() and integration_id in self._tools_by_id
+            ]
+        return list(self._enabled_metadata_cache)
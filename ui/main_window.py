@@ -18,40 +18,855 @@ from storage import (
     load_mcp_servers,
     load_mcp_server_configs,
     save_app_mcp_server,
-    save_conversations,
+    snapshot_conversations,
+    write_conversations_snapshot,
     write_file,
     append_file,
     load_settings,
     save_settings,
 )
-from api import LMStudioClient, GenerationCancelled
-from models import Message, MessageRole, Conversation, ConversationSettings
+from api import LMStudioClient, LMStudioError, GenerationCancelled
+from models import Message, MessageRole, ChatMode, Conversation, ConversationSettings, NormalizedTasks
 from gi.repository import Gtk, Gio, GLib, Gdk
 import logging
 import threading
 import uuid
 import asyncio
 from dataclasses import replace
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
 from typing import Optional, Callable
 import re
 import os
+import pathlib
 import json
 import shlex
+import subprocess
+import sys
+import types
 import difflib # Added for diff generation
+import functools
 import ast
 import hashlib
+import heapq
+import itertools
+import aiohttp
 import time
 from datetime import datetime
-from token_counter import count_text_tokens
+from token_counter import count_text_tokens, count_texts_tokens
 from project_map import refresh_project_map
 import fnmatch # Added for project map generation
 from html.parser import HTMLParser
 import gi
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 gi.require_version("Gtk", "3.0")
 
 logger = logging.getLogger(__name__)
 
+with open(os.path.join(os.path.dirname(__file__), "styles.css"), "rb") as _css_file:
+    _CSS_BYTES = _css_file.read()
+_CSS_INSTALLED = False
+
+# Shared parameter schema for placeholder tools when MCP discovery finds nothing.
+# Sent by reference in every placeholder; never mutate it.
+_PLACEHOLDER_PARAMS = {
+    "type": "object",
+    "properties": {
+        "method": {
+            "type": "string",
+            "description": "The method name to call on this integration"
+        },
+        "args": {
+            "type": "object",
+            "description": "Arguments for the method"
+        }
+    },
+    "required": ["method"]
+}
+# Plan-response task extraction
+_AI_TASKS_BLOCK_RE = re.compile(r"<ai_tasks>(.*?)</ai_tasks>", re.IGNORECASE | re.DOTALL)
+_CHECKBOX_RE = re.compile(r"^[-*]\s*\[(?: |x|X)\]\s+(.+)$")
+_BULLET_RE = re.compile(r"^(?:\d+[.)]|[-*])\s+(.+)$")
+_JSON_FENCE_RE = re.compile(r"```(?:json)?\s*(\{.*?\})\s*```", re.IGNORECASE | re.DOTALL)
+# Characters not allowed in tool/function identifiers sent to the model
+_SANITIZE_RE = re.compile(r"[^a-zA-Z0-9_-]")
+# Same mapping as _SANITIZE_RE for ASCII input, applied with str.translate
+_SANITIZE_ASCII_TABLE = str.maketrans({
+    chr(i): "_"
+    for i in range(128)
+    if not (chr(i).isascii() and (chr(i).isalnum() or chr(i) in "_-"))
+})
+_CODE_FENCE_RE = re.compile(r"```(?:\w+)?\s*(.*?)\s*```", re.DOTALL)
+# `[Agent]` / `[Agent - Phase ...]` activity entries in combined agent bubbles
+_AGENT_ENTRY_SPLIT_RE = re.compile(r"(?=\[Agent(?:\s*-\s*[^\]]+)?\])")
+_AGENT_ENTRY_RE = re.compile(r"^\[Agent(?:\s*-\s*[^\]]+)?\]\s+.+$", re.DOTALL)
+
+# Command that opens a directory in the platform file browser.
+_OPEN_DIR_CMD = {"darwin": ["open"], "win32": ["explorer"]}.get(sys.platform, ["xdg-open"])
+
+# Static parts of the agent phase prompts; only the task-specific middle is
+# joined in per call.
+_INTENT_PROMPT_HEAD = (
+    "You are an expert software engineer performing intent validation for a task. "
+    "Critically analyze the task before proceeding to design or implementation. "
+    "Your goal is to prevent errors, ensure alignment, and identify better approaches.\n\n"
+)
+_INTENT_PROMPT_TAIL = (
+    "Answer the following questions in a JSON object:\n"
+    "{\n"
+    '  "aligns_goal": boolean, // Does this align with the main project goal (from constitution)?\n'
+    '  "conflicts_prior_decisions": boolean, // Does it conflict with prior decisions (from decision log)?\n'
+    '  "simpler_approach_possible": boolean, // Is there a simpler approach?\n'
+    '  "simpler_approach_description": string, // If yes, describe it.\n'
+    '  "potential_risks": string, // What could go wrong? Describe potential issues.\n'
+    '  "proceed_with_task": boolean, // Based on validation, should we proceed with this task as is?\n'
+    '  "reason_for_decision": string // Explain why you recommend proceeding or not.\n'
+    "}\n"
+    "Return ONLY the JSON object. Do not include any other text or markdown."
+)
+_DESIGN_PROMPT_HEAD = (
+    "You are an expert software architect tasked with drafting a design for an upcoming task. "
+    "Focus on the high-level approach, architectural impact, and file changes. "
+    "DO NOT write any code in this phase. The goal is to plan thoroughly.\n\n"
+)
+_DESIGN_PROMPT_TAIL = (
+    "Provide your design draft in a structured Markdown format, including:\n"
+    "1.  **Architecture Sketch (High-level explanation):** How does this fit into the existing architecture?\n"
+    "2.  **Dependency Impact:** What existing dependencies are affected, and what new ones are introduced?\n"
+    "3.  **Files to Change/Create:** List specific files and briefly describe their role in the change.\n"
+    "4.  **New Abstractions:** What new classes, functions, or patterns will be introduced?\n"
+    "5.  **Plan of Action:** A step-by-step plan for implementation (this will be used by Phase 3).\n"
+    "Do NOT include code blocks in this design draft. Focus on descriptions and structure."
+)
+_CRITIQUE_PROMPT_HEAD = (
+    "You are a senior software engineer performing a critical review of a recent implementation. "
+    "Your goal is to identify potential flaws, ensure code quality, and maintain architectural integrity. "
+    "Be honest and thorough in your assessment.\n\n"
+)
+_CRITIQUE_PROMPT_TAIL = (
+    "Answer the following questions in a JSON object:\n"
+    "{\n"
+    '  "introduced_coupling": boolean, // Did this introduce undesirable coupling?\n'
+    '  "coupling_details": string, // If yes, describe where and why it\'s undesirable.\n'
+    '  "complexity_increased": boolean, // Did complexity increase unnecessarily?\n'
+    '  "complexity_details": string, // If yes, describe how and why it\'s unnecessary.\n'
+    '  "violates_constitution": boolean, // Does this violate any principles from the project constitution?\n'
+    '  "violation_details": string, // If yes, describe which principle and how it\'s violated.\n'
+    '  "is_scalable": boolean, // Is this solution scalable?\n'
+    '  "scalability_details": string, // If no, explain why not.\n'
+    '  "senior_engineer_approval": boolean, // Would a senior engineer approve this design/implementation?\n'
+    '  "approval_reason": string, // Explain why or why not.\n'
+    '  "flaws_found": boolean, // Overall, were significant flaws found?\n'
+    '  "new_tasks_needed": Array<string>, // If flaws found, list new tasks to address them. Each string is a task description.\n'
+    '  "critique_summary": string // A concise summary of your critique.\n'
+    "}\n"
+    "Return ONLY the JSON object. Do not include any other text or markdown."
+)
+
+# Persisted AI task statuses
+_TASK_STATUSES = frozenset({"uncompleted", "in_progress", "completed"})
+# Checkbox mark for each status in rendered plan lists
+_TASK_STATUS_MARKS = {"completed": "x", "in_progress": "~", "uncompleted": " "}
+
+# Files summarized per model request when summarize_file_for_index gets a path list.
+_SUMMARIZE_BATCH_MAX = 8
+# Reply budget per summarized file; batches reserve this much context for each file.
+_INDEX_SUMMARY_REPLY_TOKENS = 2048
+# Concurrent file reads when load_files_into_context loads several paths.
+_CONTEXT_LOAD_CONCURRENCY = 16
+# Bump when the shape of summarized PROJECT_INDEX.json entries changes.
+_INDEX_SCHEMA_VERSION = 1
+# Per-entry bookkeeping used to skip re-summarizing unchanged files; kept out of prompts.
+_INDEX_CACHE_KEYS = frozenset({"content_sha256", "schema_version", "config_hash"})
+
+# How long discovered MCP tool definitions are reused before re-querying servers.
+_MCP_DISCOVERY_TTL_SEC = 60.0
+
+# Per-chat settings keys that may override the global ConversationSettings.
+_OVERRIDE_KEYS = frozenset({
+    "temperature",
+    "top_p",
+    "repetition_penalty",
+    "max_tokens",
+    "context_limit",
+    "token_saver",
+    "system_prompt",
+    "auto_tool_approval",
+})
+
+
+# HTTP status the LM Studio client embeds in its "API error <status>: ..." messages.
+_API_STATUS_RE = re.compile(r"\bAPI error (\d{3})\b")
+
+
+def _is_retryable_api_error(exc: BaseException) -> bool:
+    """Return False only for failures a retry cannot fix.
+
+    Cancellation, client-side HTTP errors (4xx other than 429) and request
+    validation errors fail fast. Timeouts, dropped connections, 5xx/429
+    responses (e.g. 503 while a model loads) and other wrapped client errors
+    are treated as transient.
+    """
+    if isinstance(exc, GenerationCancelled):
+        return False
+    if isinstance(exc, (asyncio.TimeoutError, TimeoutError, ConnectionError, aiohttp.ClientError)):
+        return True
+    if isinstance(exc, LMStudioError):
+        text = str(exc)
+        status = _API_STATUS_RE.search(text)
+        if status is not None:
+            code = int(status.group(1))
+            return code == 429 or code >= 500
+        # Exhausting the tool-call rounds is deterministic for the same request.
+        return "tool-call round limit" not in text
+    return not isinstance(exc, (ValueError, TypeError))
+
+
+class _MessageView:
+    """Message list for throwaway conversations built on a history snapshot.
+
+    Reads the first ``len(base)`` messages (as of construction) straight from
+    ``base`` and keeps appended messages locally, so adding prompt messages
+    never touches the source. ``base`` must not be mutated afterwards: pass
+    a private list, never a live ``conversation.messages`` (the GTK thread
+    deletes and truncates those in place).
+    """
+
+    __slots__ = ("_base", "_base_len", "_extra")
+
+    def __init__(self, base: list[Message]):
+        self._base = base
+        self._base_len = len(base)
+        self._extra: list[Message] = []
+
+    def append(self, message: Message) -> None:
+        self._extra.append(message)
+
+    def __len__(self) -> int:
+        return self._base_len + len(self._extra)
+
+    def __iter__(self):
+        yield from itertools.islice(self._base, self._base_len)
+        yield from self._extra
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(self)[index]
+        if index < 0:
+            index += len(self)
+        if 0 <= index < self._base_len:
+            return self._base[index]
+        if self._base_len <= index < len(self):
+            return self._extra[index - self._base_len]
+        raise IndexError("message index out of range")
+
+
+def _unified_diff_text(before: str, after: str, fromfile: str, tofile: str, context: int = 3) -> str:
+    """Return a unified diff of two texts.
+
+    Identical leading/trailing lines are trimmed before running SequenceMatcher,
+    so a small edit in a large file only diffs the changed region.
+    """
+    if before == after:
+        return ""
+    a = before.splitlines(keepends=True)
+    b = after.splitlines(keepends=True)
+    prefix = 0
+    max_prefix = min(len(a), len(b))
+    while prefix < max_prefix and a[prefix] == b[prefix]:
+        prefix += 1
+    suffix = 0
+    max_suffix = max_prefix - prefix
+    while suffix < max_suffix and a[-1 - suffix] == b[-1 - suffix]:
+        suffix += 1
+
+    matcher = difflib.SequenceMatcher(
+        None, a[prefix:len(a) - suffix], b[prefix:len(b) - suffix], autojunk=False
+    )
+    opcodes = []
+    if prefix:
+        opcodes.append(("equal", 0, prefix, 0, prefix))
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        opcodes.append((tag, i1 + prefix, i2 + prefix, j1 + prefix, j2 + prefix))
+    if suffix:
+        opcodes.append(("equal", len(a) - suffix, len(a), len(b) - suffix, len(b)))
+    # get_grouped_opcodes() reuses precomputed opcodes when they are set.
+    matcher.opcodes = opcodes
+
+    def _range(start: int, stop: int) -> str:
+        length = stop - start
+        if length == 1:
+            return str(start + 1)
+        if not length:
+            start -= 1
+        return f"{start + 1},{length}"
+
+    def _line(prefix_char: str, text: str) -> str:
+        return prefix_char + (text if text.endswith("\n") else text + "\n")
+
+    out = [f"--- {fromfile}\n", f"+++ {tofile}\n"]
+    for group in matcher.get_grouped_opcodes(context):
+        first, last = group[0], group[-1]
+        out.append(f"@@ -{_range(first[1], last[2])} +{_range(first[3], last[4])} @@\n")
+        for tag, i1, i2, j1, j2 in group:
+            if tag == "equal":
+                out.extend(_line(" ", line) for line in a[i1:i2])
+                continue
+            if tag in ("replace", "delete"):
+                out.extend(_line("-", line) for line in a[i1:i2])
+            if tag in ("replace", "insert"):
+                out.extend(_line("+", line) for line in b[j1:j2])
+    return "".join(out)
+
+
+def _decode_utf8(data: bytes) -> str:
+    """Decode file bytes as UTF-8 text."""
+    return data.decode("utf-8")
+
+
+def _read_text_prefix(path: str, max_chars: int) -> str:
+    """Read up to max_chars characters of a text file, replacing undecodable bytes."""
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        return f.read(max_chars)
+
+
+def _json_loads(data: bytes) -> object:
+    """Parse JSON bytes, using orjson when available."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _json_loads_text(text: str) -> object:
+    """Parse model-produced JSON text, trying orjson first.
+
+    Falls back to json.loads, which also accepts inputs orjson rejects
+    (NaN, very large integers) and raises the usual JSONDecodeError.
+    """
+    if orjson is not None:
+        try:
+            return orjson.loads(text)
+        except ValueError:
+            pass
+    return json.loads(text)
+
+
+_JSON_DECODER = json.JSONDecoder()
+
+
+def _extract_json_object(text: str) -> Optional[dict]:
+    """Return the JSON object embedded in text, or None.
+
+    Decodes from the first ``{`` with raw_decode, which stops at the end of
+    that object, so trailing prose containing braces does not matter. Falls
+    back to the first-``{``-to-last-``}`` slice when that start is not valid.
+    """
+    start = text.find("{")
+    if start == -1:
+        return None
+    try:
+        parsed, _end = _JSON_DECODER.raw_decode(text, start)
+        if isinstance(parsed, dict):
+            return parsed
+    except ValueError:
+        pass
+    end = text.rfind("}")
+    if end <= start:
+        return None
+    try:
+        parsed = _json_loads_text(text[start:end + 1])
+    except ValueError:
+        return None
+    return parsed if isinstance(parsed, dict) else None
+
+
+@functools.lru_cache(maxsize=2048)
+def _sanitize_identifier_cached(value: str) -> str:
+    """Map a name to a model-safe identifier; the same ids recur on every tool rebuild."""
+    if value.isascii():
+        cleaned = value.translate(_SANITIZE_ASCII_TABLE)
+    else:
+        cleaned = _SANITIZE_RE.sub("_", value)
+    return cleaned[:64] if cleaned else "tool"
+
+
+def _json_dumps_pretty_bytes(obj) -> bytes:
+    """Serialize to indented UTF-8 JSON bytes, using orjson when available."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            pass  # e.g. integers wider than 64 bits; stdlib handles them
+    return json.dumps(obj, indent=2, ensure_ascii=False).encode("utf-8")
+
+
+def _json_dumps_pretty(obj) -> str:
+    """Serialize to indented JSON text, using orjson when available."""
+    return _json_dumps_pretty_bytes(obj).decode("utf-8")
+
+
+_TOOL_EVENT_ICONS = {
+    "syntax_check_all": "🧩",
+    "syntax_check": "🧪",
+    "file_edit": "📝",
+    "file_chunk_read": "📚",
+    "file_write": "💾",
+    "file_read": "📖",
+    "file_delete": "🗑️",
+    "file_listing": "📂",
+    "command_execution": "▶️",
+    "text_search": "🔎",
+}
+
+
+def _content_preview_block(details: dict) -> str:
+    content_preview = details.get("content_preview", "")
+    return f"\nContent Preview:\n```\n{content_preview}\n```" if content_preview else ""
+
+
+def _fmt_file_edit(details: dict) -> str:
+    path = details.get("path", "unknown file")
+    diff = details.get("diff", "No diff available.")
+    return f"**File Edited:** `{path}`\n```diff\n{diff}\n```"
+
+
+def _fmt_file_write(details: dict) -> str:
+    path = details.get("path", "unknown file")
+    bytes_written = details.get("bytes_written", 0)
+    diff = details.get("diff", "")
+    if diff:
+        return f"**File Written:** `{path}` ({bytes_written} bytes)\n```diff\n{diff}\n```"
+    return f"**File Written:** `{path}` ({bytes_written} bytes){_content_preview_block(details)}"
+
+
+def _fmt_file_read(details: dict) -> str:
+    path = details.get("path", "unknown file")
+    return f"**File Read:** `{path}`{_content_preview_block(details)}"
+
+
+def _fmt_file_chunk_read(details: dict) -> str:
+    path = details.get("path", "unknown file")
+    ws = details.get("window_start_line")
+    we = details.get("window_end_line")
+    ts = details.get("target_start_line")
+    te = details.get("target_end_line")
+    return (
+        f"**File Chunk Read:** `{path}` "
+        f"(target: {ts}-{te}, window: {ws}-{we})"
+        f"{_content_preview_block(details)}"
+    )
+
+
+def _fmt_file_delete(details: dict) -> str:
+    path = details.get("path", "unknown file")
+    return f"**File Deleted:** `{path}`"
+
+
+def _fmt_file_listing(details: dict) -> str:
+    path = details.get("path", ".")
+    entries = details.get("entries", [])
+    entries_list = "\n".join([f"- `{e}`" for e in entries[:10]]) # Limit to 10 for brevity
+    if len(entries) > 10:
+        entries_list += f"\n- ... ({len(entries) - 10} more)"
+    return f"**Listed Directory:** `{path}`\nFiles/Dirs:\n{entries_list}"
+
+
+def _fmt_command_execution(details: dict) -> str:
+    command = details.get("command", "unknown command")
+    stdout = details.get("stdout", "").strip()
+    stderr = details.get("stderr", "").strip()
+    output_lines = []
+    if stdout:
+        output_lines.append(f"**Stdout:**\n```bash\n{stdout}\n```")
+    if stderr:
+        output_lines.append(f"**Stderr:**\n```bash\n{stderr}\n```")
+    return f"**Command Executed:** `{command}`\n" + "\n".join(output_lines)
+
+
+def _fmt_text_search(details: dict) -> str:
+    pattern = details.get("pattern", "")
+    path = details.get("path", "")
+    matches = details.get("matches", [])
+    matches_list = "\n".join([f"- `{m}`" for m in matches[:10]])
+    if len(matches) > 10:
+        matches_list += f"\n- ... ({len(matches) - 10} more)"
+    return f"**Searched for:** `{pattern}` in `{path}`\nMatches:\n{matches_list}"
+
+
+def _fmt_syntax_check(details: dict) -> str:
+    path = details.get("path", "unknown file")
+    language = details.get("language", "unknown")
+    checker = details.get("checker", "checker")
+    summary = details.get("summary", "")
+    detail = details.get("detail", "")
+    diagnostics = details.get("diagnostics", [])
+    diag_lines = []
+    for d in diagnostics[:8]:
+        if not isinstance(d, dict):
+            continue
+        line = d.get("line")
+        col = d.get("column")
+        loc = f"{line}:{col}" if line and col else (f"{line}" if line else "?")
+        msg = str(d.get("message", ""))
+        diag_lines.append(f"- `{loc}` {msg}")
+    diags = ("\nDiagnostics:\n" + "\n".join(diag_lines)) if diag_lines else ""
+    detail_block = f"\nOutput:\n```text\n{detail}\n```" if detail else ""
+    return f"**Syntax Check:** `{path}` ({language}, {checker})\n{summary}{diags}{detail_block}"
+
+
+def _fmt_syntax_check_all(details: dict) -> str:
+    path = details.get("path", ".")
+    summary = details.get("summary", "")
+    checked = details.get("checked_files", 0)
+    passed = details.get("passed_files", 0)
+    fixed = details.get("fixed_files", 0)
+    failed = details.get("failed_files", 0)
+    return (
+        f"**Check All Syntax:** `{path}`\n"
+        f"{summary}\n"
+        f"Checked: {checked}, Passed: {passed}, Fixed: {fixed}, Failed: {failed}"
+    )
+
+
+def _fmt_tool_event_fallback(details: dict) -> str:
+    """Fallback for generic or unknown tool event types."""
+    result_content = _json_dumps_pretty(details.get("result", {}))
+    if result_content != "{}":
+        return f"**Result:**\n```json\n{result_content}\n```"
+    return "No specific details available."
+
+
+_TOOL_EVENT_FORMATTERS = {
+    "file_edit": _fmt_file_edit,
+    "file_write": _fmt_file_write,
+    "file_read": _fmt_file_read,
+    "file_chunk_read": _fmt_file_chunk_read,
+    "file_delete": _fmt_file_delete,
+    "file_listing": _fmt_file_listing,
+    "command_execution": _fmt_command_execution,
+    "text_search": _fmt_text_search,
+    "syntax_check": _fmt_syntax_check,
+    "syntax_check_all": _fmt_syntax_check_all,
+}
+
+
+# Tool definitions for the built-in local filesystem integration. The schemas
+# are static, so every request shares these dicts by reference; never mutate them.
+_BUILTIN_FILESYSTEM_TOOLS = (
+    {
+        "type": "function",
+        "function": {
+            "name": "update_project_constitution",
+            "description": (
+                "Updates the project constitution file (PROJECT_CONSTITUTION.md) with the provided content. "
+                "This file serves as a foundational memory layer for the agent mode. "
+                "Use this tool only when architecture/principles have materially changed. "
+                "Do not call repeatedly with unchanged or near-identical content."
+            ),
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "new_content": {
+                        "type": "string",
+                        "description": "The full new content to write to PROJECT_CONSTITUTION.md."
+                    },
+                },
+                "required": ["new_content"],
+            },
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "update_project_index",
+            "description": (
+                "Updates a summary entry in the dynamic project index (PROJECT_INDEX.json) for a specific file. "
+                "This index helps the AI understand the project structure and file responsibilities. "
+                "Use this tool to summarize a file's purpose, public API, dependencies, key responsibilities, and known issues."
+            ),
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "file_path": {"type": "string", "description": "Workspace-relative path to the file being summarized."},
+                    "purpose": {"type": "string", "description": "A brief description of the file's purpose."},
+                    "public_api": {"type": "string", "description": "(Optional) Description of the main functions/classes exposed by the file."},
+                    "dependencies": {"type": "array", "items": {"type": "string"}, "description": "(Optional) List of other files or modules the file significantly depends on."},
+                    "key_responsibilities": {"type": "array", "items": {"type": "string"}, "description": "(Optional) List of key tasks or features this file is responsible for."},
+                    "known_issues": {"type": "array", "items": {"type": "string"}, "description": "(Optional) List of any known bugs, limitations, or areas for improvement."},
+                },
+                "required": ["file_path", "purpose"],
+            },
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "summarize_file_for_index",
+            "description": (
+                "Reads a file and sends its content to the AI for summarization based on project index criteria "
+                "(purpose, public API, dependencies, key responsibilities, known issues). "
+                "The AI's summary is then used to update PROJECT_INDEX.json. "
+                "This tool allows the AI to dynamically update its understanding of project files."
+            ),
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "path": {"type": "string", "description": "The workspace-relative path to the file to summarize."},
+                    "paths": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "Optional list of workspace-relative paths to summarize together in batched requests. Takes precedence over 'path'.",
+                    },
+                },
+            },
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "load_files_into_context",
+            "description": (
+                "Loads specified files into the AI's active working context for deep retrieval. "
+                "The content of these files will be automatically appended to the agent's instructions for subsequent tasks. "
+                "If an empty list is provided, the active context will be cleared."
+            ),
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "paths": {"type": "array", "items": {"type": "string"}, "description": "A list of workspace-relative file paths to load. If empty, clears the active context."},
+                },
+                "required": ["paths"],
+            },
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "add_decision_log_entry",
+            "description": (
+                "Adds a new entry to the architectural decision log (DECISION_LOG.md). "
+                "This provides long-term memory of architectural choices, their justifications, and impacts. "
+                "Do not log duplicate entries; only add when there is genuinely new decision content."
+            ),
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "decision_summary": {"type": "string", "description": "A concise summary of the decision made."},
+                    "reasoning": {"type": "string", "description": "The justification or rationale behind the decision."},
+                    "impact": {"type": "string", "description": "The expected or observed consequences/impact of the decision."},
+                    "related_files": {"type": "array", "items": {"type": "string"}, "description": "(Optional) A list of files or components affected by this decision."},
+                    "status": {"type": "string", "description": "(Optional) The current status of the decision (e.g., implemented, pending, reconsidered). Defaults to 'implemented'."},
+                },
+                "required": ["decision_summary", "reasoning", "impact"],
+            },
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "perform_milestone_review",
+            "description": (
+                "Triggers a milestone-level review of the project's memory layers (Constitution, Dynamic Project Index, Decision Log) by the AI. "
+                "The AI will assess their consistency and up-to-dateness and suggest new tasks if updates are needed."
+            ),
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "review_focus": {"type": "string", "description": "(Optional) A specific area to focus the AI's review on. Defaults to 'general consistency and up-to-dateness'."},
+                },
+                "required": [],
+            },
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "builtin_search_text",
+            "description": "Search text/identifiers and return matching file paths with line numbers. Use this before loading large file chunks.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "pattern": {"type": "string", "description": "Regex or plain text pattern to search for."},
+                    "path": {"type": "string", "description": "Workspace-relative file or directory path to search in."},
+                    "max_results": {"type": "integer", "description": "Maximum number of matches to return."},
+                },
+                "required": ["pattern"],
+            },
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "builtin_check_syntax",
+            "description": (
+                "Run compile/syntax checks for a file. Supports major formats including Python, HTML, CSS, "
+                "JSON, and JavaScript/TypeScript (best effort depending on installed toolchain)."
+            ),
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "path": {"type": "string", "description": "Workspace-relative file path to validate."},
+                    "language": {"type": "string", "description": "Optional language override (python, html, css, json, javascript, typescript)."},
+                },
+                "required": ["path"],
+            },
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "check_all_syntax",
+            "description": (
+                "Scan supported source files in the workspace, run syntax checks, and optionally auto-fix failing code blocks "
+                "with LLM-assisted edits. Ignores __pycache__, .git, virtualenv, node_modules, and other junk directories."
+            ),
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "path": {"type": "string", "description": "Optional workspace-relative directory to scan. Defaults to '.'"},
+                    "auto_fix": {"type": "boolean", "description": "Whether to attempt automatic LLM-assisted block fixes. Defaults to true."},
+                    "max_files": {"type": "integer", "description": "Maximum number of files to scan. Defaults to 400."},
+                    "max_fix_attempts_per_file": {"type": "integer", "description": "Maximum LLM fix attempts per failing file. Defaults to 3."},
+                },
+                "required": [],
+            },
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "builtin_read_file",
+            "description": "Read a UTF-8 text file inside the workspace. Use this before analyzing or editing a file.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "path": {"type": "string", "description": "Workspace-relative file path (e.g., 'src/main.py'). Must not be empty, absolute, or contain '..'."},
+                    "max_chars": {"type": "integer", "description": "Optional max chars to read."},
+                    "allow_large_file_full_read": {"type": "boolean", "description": "Optional override for full reads of large files; prefer false and use builtin_read_file_chunk instead."},
+                },
+                "required": ["path"],
+            },
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "builtin_read_file_chunk",
+            "description": "Read a specific line range from a file with context lines above/below. Preferred for large files.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "path": {"type": "string", "description": "Workspace-relative file path."},
+                    "line": {"type": "integer", "description": "Anchor line for a focused chunk read."},
+                    "start_line": {"type": "integer", "description": "Start line of target section (1-based)."},
+                    "end_line": {"type": "integer", "description": "End line of target section (1-based, inclusive)."},
+                    "context_lines": {"type": "integer", "description": "Lines to include above/below target section. Defaults to 50."},
+                    "max_lines": {"type": "integer", "description": "Max total lines returned (target + context)."},
+                },
+                "required": ["path"],
+            },
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "builtin_write_file",
+            "description": "Write UTF-8 text file content inside the workspace. For existing files, this is for explicit full rewrites only.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "path": {"type": "string", "description": "Workspace-relative file path (e.g., 'src/main.py'). Must not be empty, absolute, or contain '..'."},
+                    "content": {"type": "string", "description": "Full file content to write."},
+                    "force_overwrite": {"type": "boolean", "description": "Required true to overwrite an existing file with full new content."},
+                    "expected_hash": {"type": "string", "description": "Optional SHA-256 hash of the last loaded file content to prevent stale overwrites."},
+                },
+                "required": ["path", "content"],
+            },
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "builtin_edit_file",
+            "description": "Replace one text segment with another in a file.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "path": {"type": "string", "description": "Workspace-relative file path (e.g., 'src/main.py'). Must not be empty, absolute, or contain '..'."},
+                    "find": {"type": "string", "description": "Exact text to find."},
+                    "replace": {"type": "string", "description": "Replacement text."},
+                    "replace_all": {"type": "boolean", "description": "Replace all occurrences."},
+                    "expected_hash": {"type": "string", "description": "Optional SHA-256 hash of the last loaded file content to prevent stale edits."},
+                },
+                "required": ["path", "find", "replace"],
+            },
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "builtin_delete_file",
+            "description": "Delete a file in the workspace (requires double user confirmation).",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "path": {"type": "string", "description": "Workspace-relative file path (e.g., 'src/main.py'). Must not be empty, absolute, or contain '..'."},
+                },
+                "required": ["path"],
+            },
+        },
+    },
+)
+
+
+_INDEX_SUMMARY_SYSTEM_PROMPT = (
+    "You are an expert software engineer assistant tasked with summarizing code files "
+    "for a project index. Your output MUST be a JSON object with the keys: 'purpose', "
+    "'public_api', 'dependencies' (list of strings), 'key_responsibilities' (list of strings), "
+    "'known_issues' (list of strings). Omit fields that are not applicable or cannot be determined. "
+    "Do NOT include any other text, markdown, or commentary."
+)
+_INDEX_SUMMARY_INSTRUCTIONS = (
+    "Summarize the following file content for a project index. Provide a JSON object with "
+    "'purpose', 'public_api', 'dependencies' (list of strings), 'key_responsibilities' (list of "
+    "strings), and 'known_issues' (list of strings). If a field is not applicable or cannot be "
+    "determined, omit it or set it to null."
+)
+# Multi-file variant used when summarize_file_for_index gets a path list.
+_INDEX_BATCH_SUMMARY_SYSTEM_PROMPT = (
+    "You are an expert software engineer assistant tasked with summarizing code files "
+    "for a project index. Your output MUST be a JSON object keyed by file path; each value "
+    "is an object with the keys: 'purpose', 'public_api', 'dependencies' (list of strings), "
+    "'key_responsibilities' (list of strings), 'known_issues' (list of strings). Omit fields "
+    "that are not applicable or cannot be determined. "
+    "Do NOT include any other text, markdown, or commentary."
+)
+_INDEX_BATCH_SUMMARY_INSTRUCTIONS = (
+    "Summarize each of the following files for a project index. Return ONLY a JSON object "
+    "whose keys are the file paths exactly as given and whose values are objects with "
+    "'purpose', 'public_api', 'dependencies' (list of strings), 'key_responsibilities' "
+    "(list of strings), and 'known_issues' (list of strings). If a field is not applicable "
+    "or cannot be determined, omit it or set it to null."
+)
+
+
+@functools.lru_cache(maxsize=32)
+def _index_summary_config_hash(model: str) -> str:
+    """Fingerprint the model and every summary prompt; a change invalidates every cached entry."""
+    fingerprint = "\0".join((
+        model,
+        _INDEX_SUMMARY_SYSTEM_PROMPT,
+        _INDEX_SUMMARY_INSTRUCTIONS,
+        _INDEX_BATCH_SUMMARY_SYSTEM_PROMPT,
+        _INDEX_BATCH_SUMMARY_INSTRUCTIONS,
+    ))
+    return hashlib.sha256(fingerprint.encode("utf-8")).hexdigest()[:16]
+
 
 class MainWindow(Gtk.ApplicationWindow):
     def __init__(self, app, asyncio_thread):
@@ -130,33 +945,39 @@ class MainWindow(Gtk.ApplicationWindow):
         self.set_resizable(True)
         self.set_size_request(self._window_min_width, self._window_min_height)
         self._apply_window_geometry_hints()
+        self._pending_clamp_id: Optional[int] = None
         self.connect("configure-event", self._on_configure_event)
 
         # Apply CSS
-        css_provider = Gtk.CssProvider()
-        css_provider.load_from_path(
-            "/home/kingnixon/Documents/Python Projects/AutoAIAgent/ui/styles.css")
-        style_context = Gtk.StyleContext()
-        style_context.add_provider_for_screen(
-            Gdk.Screen.get_default(),
-            css_provider,
-            Gtk.STYLE_PROVIDER_PRIORITY_APPLICATION
-        )
+        self._install_css()
 
         # API client
         self.api_client = LMStudioClient(
             on_auto_tool_approval_changed=self._on_auto_tool_approval_changed
         )
-        self._loop = None
         self.mcp_discovery = MCPToolDiscovery()
 
         # Data
         self.conversations = {}
         self.current_conversation: Optional[Conversation] = None
+        # Coalesced conversation persistence (see _save_conversations)
+        self._save_pending = False
+        self._save_all_pending = False
+        self._dirty_conversation_ids: set[str] = set()
+        self._save_timer_id: Optional[int] = None
+        self._save_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="conv-save")
+        self._cached_dialogs: dict[str, Gtk.MessageDialog] = {}
+        # (dialog, project name entry, project dir entry), built on first agent setup
+        self._agent_setup_dialog: Optional[tuple[Gtk.Dialog, Gtk.Entry, Gtk.Entry]] = None
+        # Running number for default "Conversation N" titles
+        self._conversation_counter = 0
         self.settings = storage.load_settings()
-        self.workspace_root = os.path.abspath(os.getcwd())
-        # Determine application code root (two levels up from this file)
-        self._app_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+        self.workspace_root = str(pathlib.Path(os.getcwd()).resolve())
+        # Determine application code root (two levels up from this file);
+        # resolved once so symlinked roots compare consistently everywhere.
+        self._app_root = str(pathlib.Path(__file__).resolve().parents[2])
+        # Resolved agent project_dir values -> usable workspace root (or None)
+        self._project_dir_roots: dict[str, Optional[str]] = {}
         # If the app was launched from inside the app repo, avoid using the
         # app repo as the workspace root for safety — default to the user's
         # home directory instead.
@@ -167,7 +988,7 @@ class MainWindow(Gtk.ApplicationWindow):
         if in_app:
             fallback = os.path.expanduser("~") or self.workspace_root
             logger.warning("Startup CWD %s is inside app repo; using fallback workspace %s", self.workspace_root, fallback)
-            self.workspace_root = os.path.abspath(fallback)
+            self.workspace_root = str(pathlib.Path(fallback).resolve())
             self._workspace_root_was_app = True
         else:
             self._workspace_root_was_app = False
@@ -176,6 +997,10 @@ class MainWindow(Gtk.ApplicationWindow):
         self._agent_running_conversations: set[str] = set()
         self._agent_stop_requests: set[str] = set()
         self._agent_state_lock = threading.Lock()
+        # Immutable copies republished under the lock on every change so the
+        # frequent membership checks can read them without locking.
+        self._agent_running_snapshot: frozenset[str] = frozenset()
+        self._agent_stop_snapshot: frozenset[str] = frozenset()
         self._generation_state_lock = threading.Lock()
         self._generation_active = False
         self._active_generation_conversation_id: Optional[str] = None
@@ -186,6 +1011,34 @@ class MainWindow(Gtk.ApplicationWindow):
         self._started_stream_ids: set[str] = set()
         self._file_context_cache: dict[str, dict] = {}
         self._file_context_cache_max_age_sec = 30.0
+        # Parsed memory-layer files keyed by path -> (mtime_ns, size, value)
+        self._file_cache: dict[str, tuple[int, int, object]] = {}
+        self._memory_paths_by_root: dict[str, types.SimpleNamespace] = {}
+        # Pre-generated message/stream ids, refilled in bulk by _next_id()
+        self._id_pool: deque[str] = deque()
+        # Ordered GTK updates posted by agent runs, drained by one idle callback
+        self._agent_ui_queue: deque[tuple[Callable, tuple]] = deque()
+        self._agent_ui_lock = threading.Lock()
+        # While a queue flush runs: message id -> (conversation id, agent bubble) to re-render at the end
+        self._agent_bubble_refresh: Optional[dict[str, tuple[str, Message]]] = None
+        # Priority of the pending queue flush, or None when nothing is scheduled
+        self._agent_ui_flush_priority: Optional[int] = None
+        # blake2b(model, settings, plan, review prompt) -> raw plan review response
+        self._plan_review_cache: dict[bytes, str] = {}
+        # (mode, base prompt, workspace root, task signature) -> system prompt
+        self._mode_prompt_cache: dict[tuple, str] = {}
+        # conversation id -> (ai_tasks list, its length, task revision, rendered agent task block)
+        self._task_context_cache: dict[str, tuple[list, int, int, str]] = {}
+        # (enabled ids, id set, "<sanitized id>_" prefix set, same prefixes as a tuple)
+        self._enabled_integration_match_cache: Optional[
+            tuple[tuple[str, ...], frozenset[str], frozenset[str], tuple[str, ...]]] = None
+        # (id(base settings), system prompt) -> (base settings, tool-free phase settings)
+        self._phase_settings_cache: dict[tuple[int, str], tuple[ConversationSettings, ConversationSettings]] = {}
+        # (selected tool dicts, function name -> MCP metadata) from the last request
+        self._mcp_tool_map_cache: Optional[tuple[tuple[dict, ...], dict[str, dict]]] = None
+        self._mcp_discovery_inflight: dict[tuple[bytes, tuple[str, ...]], asyncio.Future] = {}
+        # (server configs digest, enabled ids) -> (monotonic timestamp, tools)
+        self._mcp_discovery_cache: dict[tuple[bytes, tuple[str, ...]], tuple[float, list[dict]]] = {}
         self._file_access_journal: dict[str, dict] = {}
         self._large_file_line_threshold = 700
         self._search_then_load_window_sec = 300.0
@@ -368,6 +1221,22 @@ class MainWindow(Gtk.ApplicationWindow):
 
 
 
+    @staticmethod
+    def _install_css() -> None:
+        """Install the application stylesheet on the default screen once."""
+        global _CSS_INSTALLED
+        if _CSS_INSTALLED:
+            return
+        css_provider = Gtk.CssProvider()
+        css_provider.load_from_data(_CSS_BYTES)
+        style_context = Gtk.StyleContext()
+        style_context.add_provider_for_screen(
+            Gdk.Screen.get_default(),
+            css_provider,
+            Gtk.STYLE_PROVIDER_PRIORITY_APPLICATION
+        )
+        _CSS_INSTALLED = True
+
     def _on_configure_event(self, _widget, event) -> bool:
         """Clamp runtime resize requests to safe max bounds.
 
@@ -377,10 +1246,22 @@ class MainWindow(Gtk.ApplicationWindow):
         """
         width = int(getattr(event, "width", 0) or 0)
         height = int(getattr(event, "height", 0) or 0)
+        if width <= self._window_max_width and height <= self._window_max_height:
+            return False
         clamped_w = min(width, self._window_max_width)
         clamped_h = min(height, self._window_max_height)
-        if (width > self._window_max_width) or (height > self._window_max_height):
-            GLib.idle_add(lambda: self.resize(clamped_w, clamped_h) or False)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Clamping window %dx%d to %dx%d", width, height, clamped_w, clamped_h)
+        # Collapse a burst of oversize configure events into one resize.
+        if self._pending_clamp_id is not None:
+            GLib.source_remove(self._pending_clamp_id)
+        self._pending_clamp_id = GLib.timeout_add(80, self._do_clamp_resize, clamped_w, clamped_h)
+        return False
+
+    def _do_clamp_resize(self, width: int, height: int) -> bool:
+        """Apply the debounced max-size clamp."""
+        self._pending_clamp_id = None
+        self.resize(width, height)
         return False
 
     async def _async_init(self) -> None:
@@ -394,10 +1275,7 @@ class MainWindow(Gtk.ApplicationWindow):
             if isinstance(server_configs, dict) and server_configs:
                 enabled_ids = list(server_configs.keys())
                 logger.info("Running startup MCP discovery for: %s", ", ".join(enabled_ids))
-                discovered = await self.mcp_discovery.discover_tools(
-                    server_configs=server_configs,
-                    enabled_integrations=enabled_ids,
-                )
+                discovered = await self._discover_mcp_tools_cached(server_configs, enabled_ids)
                 # Group discovered tools by integration id
                 by_iid: dict[str, list[dict]] = {}
                 for t in discovered:
@@ -466,6 +1344,7 @@ class MainWindow(Gtk.ApplicationWindow):
         self._apply_initial_pane_position()
         # Now that layout is ready, load conversations
         self._load_or_create_conversations()
+        self._conversation_counter = len(self.conversations)
         return False
 
     def _apply_initial_pane_position(self) -> bool:
@@ -507,30 +1386,54 @@ class MainWindow(Gtk.ApplicationWindow):
             Gdk.WindowHints.MIN_SIZE | Gdk.WindowHints.MAX_SIZE,
         )
 
+    def _memory_layer_paths(self, root: Optional[str] = None) -> types.SimpleNamespace:
+        """Return memory-layer file paths for a workspace root, computed once per root."""
+        root = root or self._get_workspace_root()
+        paths = self._memory_paths_by_root.get(root)
+        if paths is None:
+            paths = types.SimpleNamespace(
+                constitution=os.path.join(root, "PROJECT_CONSTITUTION.md"),
+                index=os.path.join(root, "PROJECT_INDEX.json"),
+                decision_log=os.path.join(root, "DECISION_LOG.md"),
+            )
+            self._memory_paths_by_root[root] = paths
+        return paths
+
+    def _read_cached(self, path: str, parser: Callable[[bytes], object]) -> object:
+        """Read and parse a file, reusing the cached value while mtime/size are unchanged.
+
+        Raises FileNotFoundError when the file does not exist.
+        """
+        st = os.stat(path)
+        cached = self._file_cache.get(path)
+        if cached is not None and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+            return cached[2]
+        with open(path, "rb") as f:
+            value = parser(f.read())
+        self._file_cache[path] = (st.st_mtime_ns, st.st_size, value)
+        return value
+
     def _load_project_constitution(self) -> str:
         """Load the project constitution file."""
-        root = self._get_workspace_root()
-        constitution_path = os.path.join(root, "PROJECT_CONSTITUTION.md")
-        if not os.path.exists(constitution_path):
+        constitution_path = self._memory_layer_paths().constitution
+        try:
+            return self._read_cached(constitution_path, _decode_utf8)
+        except FileNotFoundError:
             logger.warning("PROJECT_CONSTITUTION.md not found at %s", constitution_path)
             return ""
-        try:
-            with open(constitution_path, "r", encoding="utf-8") as f:
-                return f.read()
         except Exception as e:
             logger.error("Error reading PROJECT_CONSTITUTION.md: %s", e)
             return ""
 
     def _load_project_index(self) -> dict:
         """Load the project index file."""
-        root = self._get_workspace_root()
-        index_path = os.path.join(root, "PROJECT_INDEX.json")
-        if not os.path.exists(index_path):
+        index_path = self._memory_layer_paths().index
+        try:
+            # Shallow copy so callers can add/replace entries without touching the cache.
+            return dict(self._read_cached(index_path, _json_loads))
+        except FileNotFoundError:
             logger.info("PROJECT_INDEX.json not found at %s. Returning empty index.", index_path)
             return {}
-        try:
-            with open(index_path, "r", encoding="utf-8") as f:
-                return json.load(f)
         except json.JSONDecodeError as e:
             logger.error("Error decoding PROJECT_INDEX.json: %s", e)
             return {}
@@ -540,25 +1443,25 @@ class MainWindow(Gtk.ApplicationWindow):
 
     def _save_project_index(self, index_data: dict) -> None:
         """Save the project index file."""
-        root = self._get_workspace_root()
-        index_path = os.path.join(root, "PROJECT_INDEX.json")
+        index_path = self._memory_layer_paths().index
         try:
-            with open(index_path, "w", encoding="utf-8") as f:
-                json.dump(index_data, f, indent=2, ensure_ascii=False)
+            with open(index_path, "wb") as f:
+                f.write(_json_dumps_pretty_bytes(index_data))
+            st = os.stat(index_path)
+            self._file_cache[index_path] = (st.st_mtime_ns, st.st_size, dict(index_data))
             logger.info("Successfully saved PROJECT_INDEX.json")
         except Exception as e:
+            self._file_cache.pop(index_path, None)
             logger.error("Error saving PROJECT_INDEX.json: %s", e)
 
     def _load_decision_log(self) -> str:
         """Load the decision log file."""
-        root = self._get_workspace_root()
-        log_path = os.path.join(root, "DECISION_LOG.md")
-        if not os.path.exists(log_path):
+        log_path = self._memory_layer_paths().decision_log
+        try:
+            return self._read_cached(log_path, _decode_utf8)
+        except FileNotFoundError:
             logger.warning("DECISION_LOG.md not found at %s", log_path)
             return ""
-        try:
-            with open(log_path, "r", encoding="utf-8") as f:
-                return f.read()
         except Exception as e:
             logger.error("Error reading DECISION_LOG.md: %s", e)
             return ""
@@ -567,35 +1470,84 @@ class MainWindow(Gtk.ApplicationWindow):
         """Load saved conversations from disk, or create a sample if none exist."""
         saved = load_conversations()
         if saved:
-            for conv in saved:
-                conv.estimate_context_tokens(model=conv.model)
-                self.conversations[conv.id] = conv
-                self.sidebar.add_conversation(conv)
-            # Load the most recently updated conversation
-            latest = max(saved, key=lambda c: c.updated_at)
+            # Track the most recently updated conversation while populating.
+            latest = saved[0]
+            self.sidebar.begin_bulk_update()
+            try:
+                for conv in saved:
+                    self.conversations[conv.id] = conv
+                    self.sidebar.add_conversation(conv)
+                    if conv.updated_at > latest.updated_at:
+                        latest = conv
+            finally:
+                self.sidebar.end_bulk_update()
             self._load_conversation(latest.id)
+            # Token totals for the other conversations are filled in off the GTK thread.
+            self._estimate_context_tokens_in_background(saved)
             logger.info(f"Loaded {len(saved)} saved conversation(s)")
         else:
             # Create sample conversation
             conv = Conversation(
-                id=str(uuid.uuid4()),
+                id=self._next_id(),
                 title="GTK UI Design",
                 model=self._default_model_name(),
             )
             conv.add_message(Message(
-                id=str(uuid.uuid4()),
+                id=self._next_id(),
                 role=MessageRole.USER,
                 content="What are the best practices for GTK4 UI design?"
             ))
             conv.add_message(Message(
-                id=str(uuid.uuid4()),
+                id=self._next_id(),
                 role=MessageRole.ASSISTANT,
                 content="GTK4 emphasizes modern design principles. Key practices include:\n\n- Use CSS for styling and theming\n- Leverage hardware acceleration\n- Design responsive layouts\n- Follow GNOME design guidelines\n- Use reactive programming patterns"
             ))
             self.conversations[conv.id] = conv
             self.sidebar.add_conversation(conv)
             self._load_conversation(conv.id)
-            self._save_conversations()
+            self._save_conversations({conv.id})
+
+    def _estimate_context_tokens_in_background(self, conversations: list[Conversation]) -> None:
+        """Tokenize saved conversations on worker threads without blocking first paint."""
+        executor = ThreadPoolExecutor(
+            max_workers=min(4, os.cpu_count() or 1),
+            thread_name_prefix="token-estimate",
+        )
+        for conv in conversations:
+            # Workers only see copied message texts; Conversation state is
+            # written back on the GTK thread.
+            pending = [
+                (msg, msg.content) for msg in conv.messages
+                if msg.tokens <= 0 and not conv._is_ui_only_message(msg)
+            ]
+            if not pending:
+                GLib.idle_add(self._apply_context_token_counts, conv, [], [])
+                continue
+            executor.submit(
+                self._count_pending_message_tokens, conv, pending, conv.model)
+        executor.shutdown(wait=False)
+
+    def _count_pending_message_tokens(
+        self, conv: Conversation, pending: list[tuple[Message, str]], model: str,
+    ) -> None:
+        """Tokenize copied message texts on a worker and hand results to GTK."""
+        try:
+            counts = count_texts_tokens([text for _, text in pending], model=model)
+        except Exception as e:
+            logger.warning("Background token estimate failed for %s: %s", conv.id, e)
+            return
+        GLib.idle_add(self._apply_context_token_counts, conv, pending, counts)
+
+    def _apply_context_token_counts(
+        self, conv: Conversation, pending: list[tuple[Message, str]], counts: list[int],
+    ) -> bool:
+        """Store background token counts and refresh the conversation total."""
+        for (msg, text), tokens in zip(pending, counts):
+            # Skip messages edited or counted since the snapshot was taken.
+            if msg.tokens <= 0 and msg.content is text:
+                msg.tokens = tokens
+        conv.estimate_context_tokens(model=conv.model)
+        return False
 
     def _load_conversation(self, conversation_id: str) -> None:
         """Load a conversation into the chat area.
@@ -605,20 +1557,25 @@ class MainWindow(Gtk.ApplicationWindow):
         """
         if conversation_id in self.conversations:
             self.current_conversation = self.conversations[conversation_id]
-            self.sidebar.set_active_conversation(conversation_id)
-            self.sidebar.set_ai_tasks(
-                conversation_id, self.current_conversation.ai_tasks)
-            self._suppress_mode_change = True
-            self.chat_input.set_mode(
-                getattr(
+            # Batch child notifications so the panes settle in one layout pass.
+            frozen = (self.center_box, self.sidebar, self.chat_area.messages_box)
+            for widget in frozen:
+                widget.freeze_child_notify()
+            try:
+                self.sidebar.set_active_conversation(conversation_id)
+                self.sidebar.set_ai_tasks(
+                    conversation_id, self.current_conversation.ai_tasks)
+                self._suppress_mode_change = True
+                self.chat_input.set_mode(
+                    ChatMode.coerce(self.current_conversation.chat_mode))
+                self._suppress_mode_change = False
+                settings = self._get_effective_settings(self.current_conversation)
+                self.chat_area.set_conversation(
                     self.current_conversation,
-                    "chat_mode",
-                    "ask"))
-            self._suppress_mode_change = False
-            settings = self._get_effective_settings(self.current_conversation)
-            self.chat_area.set_conversation(
-                self.current_conversation,
-                context_limit=settings.context_limit)
+                    context_limit=settings.context_limit)
+            finally:
+                for widget in reversed(frozen):
+                    widget.thaw_child_notify()
             self.chat_input.focus()
 
     def _on_chat_settings_changed(
@@ -630,7 +1587,7 @@ class MainWindow(Gtk.ApplicationWindow):
         if self.current_conversation and self.current_conversation.id == conversation.id:
             effective = self._get_effective_settings(conversation)
             self.chat_area.set_context_limit(effective.context_limit)
-        self._save_conversations()
+        self._save_conversations({conversation.id})
 
     def _on_chat_mode_changed(self, _combo) -> None:
         """Persist per-conversation mode selection from input footer."""
@@ -638,23 +1595,23 @@ class MainWindow(Gtk.ApplicationWindow):
             return
         if not self.current_conversation:
             return
-        mode = self.chat_input.get_mode()
-        if mode == "agent":
+        mode = ChatMode.coerce(self.chat_input.get_mode())
+        if mode is ChatMode.AGENT:
             if not self._ensure_agent_config(self.current_conversation):
                 self._suppress_mode_change = True
-                self.chat_input.set_mode("ask")
+                self.chat_input.set_mode(ChatMode.ASK)
                 self._suppress_mode_change = False
-                self.current_conversation.chat_mode = "ask"
-                self._save_conversations()
+                self.current_conversation.chat_mode = ChatMode.ASK
+                self._save_conversations({self.current_conversation.id})
                 return
-        if getattr(self.current_conversation, "chat_mode", "ask") == mode:
+        if ChatMode.coerce(self.current_conversation.chat_mode) is mode:
             return
-        if mode != "agent":
+        if mode is not ChatMode.AGENT:
             self._request_agent_stop(
                 self.current_conversation.id,
                 "Mode switched away from Agent.")
         self.current_conversation.chat_mode = mode
-        self._save_conversations()
+        self._save_conversations({self.current_conversation.id})
         # Adjust default enabled integrations according to mode
         try:
             self._apply_default_tool_enables(mode)
@@ -666,9 +1623,9 @@ class MainWindow(Gtk.ApplicationWindow):
         """Persist AI task changes coming from sidebar AI Tasks tab."""
         if conversation_id not in self.conversations:
             return
-        cleaned = self._normalize_task_list(tasks)
-        self.conversations[conversation_id].ai_tasks = cleaned
-        self._save_conversations()
+        conv = self.conversations[conversation_id]
+        conv.ai_tasks = self._normalize_task_list(tasks)
+        self._save_conversations({conversation_id})
 
     def _get_effective_settings(
             self, conversation: Conversation) -> ConversationSettings:
@@ -679,19 +1636,10 @@ class MainWindow(Gtk.ApplicationWindow):
         if not chat_settings or not chat_settings.get("enabled"):
             return global_settings
 
-        overrides = {}
-        for key in (
-            "temperature",
-            "top_p",
-            "repetition_penalty",
-            "max_tokens",
-            "context_limit",
-            "token_saver",
-            "system_prompt",
-            "auto_tool_approval",
-        ):
-            if key in chat_settings:
-                overrides[key] = chat_settings[key]
+        overrides = {
+            key: chat_settings[key]
+            for key in _OVERRIDE_KEYS & chat_settings.keys()
+        }
         return replace(global_settings, **overrides)
 
     def _on_conversation_selected(self, conversation: Conversation) -> None:
@@ -704,24 +1652,23 @@ class MainWindow(Gtk.ApplicationWindow):
 
     def _on_delete_conversation(self, conversation: Conversation) -> None:
         """Handle conversation delete request with confirmation."""
-        dialog = Gtk.MessageDialog(
-            transient_for=self,
-            flags=0,
-            message_type=Gtk.MessageType.QUESTION,
-            buttons=Gtk.ButtonsType.OK_CANCEL,
-            text="Delete conversation?",
+        dialog = self._get_cached_dialog(
+            "delete_conversation",
+            Gtk.MessageType.QUESTION,
+            Gtk.ButtonsType.OK_CANCEL,
+            "Delete conversation?",
         )
         dialog.format_secondary_text(
             f'"{conversation.title}" and all its messages will be permanently deleted.'
         )
         response = dialog.run()
-        dialog.destroy()
+        dialog.hide()
         if response != Gtk.ResponseType.OK:
             return
         conv_id = conversation.id
         self.sidebar.remove_conversation(conv_id)
         del self.conversations[conv_id]
-        self._save_conversations()
+        self._save_conversations({conv_id})
         if self.current_conversation and self.current_conversation.id == conv_id:
             remaining = list(self.conversations.values())
             if remaining:
@@ -741,12 +1688,11 @@ class MainWindow(Gtk.ApplicationWindow):
             current_tokens: Current context tokens.
             limit: The context limit in tokens.
         """
-        dialog = Gtk.MessageDialog(
-            transient_for=self,
-            flags=0,
-            message_type=Gtk.MessageType.WARNING,
-            buttons=Gtk.ButtonsType.OK,
-            text="Context Limit Exceeded",
+        dialog = self._get_cached_dialog(
+            "context_limit_warning",
+            Gtk.MessageType.WARNING,
+            Gtk.ButtonsType.OK,
+            "Context Limit Exceeded",
         )
         dialog.format_secondary_text(
             f"The conversation context ({current_tokens:,} tokens) exceeds your limit "
@@ -755,7 +1701,31 @@ class MainWindow(Gtk.ApplicationWindow):
             "You can adjust the context limit in Settings → Model."
         )
         dialog.run()
-        dialog.destroy()
+        dialog.hide()
+
+    def _get_cached_dialog(
+        self,
+        key: str,
+        message_type: Gtk.MessageType,
+        buttons: Gtk.ButtonsType,
+        text: str,
+    ) -> Gtk.MessageDialog:
+        """Return a reusable message dialog, building it on first use.
+
+        Callers set the secondary text, run() it and hide() it; it is never destroyed.
+        """
+        dialog = self._cached_dialogs.get(key)
+        if dialog is None:
+            dialog = Gtk.MessageDialog(
+                transient_for=self,
+                flags=0,
+                message_type=message_type,
+                buttons=buttons,
+                text=text,
+            )
+            dialog.connect("delete-event", lambda d, _e: d.hide_on_delete())
+            self._cached_dialogs[key] = dialog
+        return dialog
 
     def _on_toggle_settings(self, button) -> None:
         """Toggle settings window visibility."""
@@ -779,9 +1749,97 @@ class MainWindow(Gtk.ApplicationWindow):
         """Hide settings window overlay."""
         self.settings_window.hide()
 
-    def _save_conversations(self) -> None:
-        """Persist all conversations to disk."""
-        save_conversations(list(self.conversations.values()))
+    def _save_conversations(self, changed_ids: Optional[set[str]] = None, delay_ms: int = 250) -> None:
+        """Schedule a coalesced write of conversations to disk.
+
+        Must run on the GTK main loop; other threads go through GLib.idle_add.
+
+        Args:
+            changed_ids: Ids of the conversations that changed, or None to
+                rewrite every conversation.
+            delay_ms: How long to wait for further changes if no write is
+                already scheduled.
+        """
+        if changed_ids is None:
+            self._save_all_pending = True
+        else:
+            self._dirty_conversation_ids.update(changed_ids)
+        self._save_pending = True
+        if self._save_timer_id is None:
+            self._save_timer_id = GLib.timeout_add(delay_ms, self._flush_conversations_cb)
+
+    def _schedule_save(self, conversation_id: str) -> None:
+        """Schedule a save for updates that tend to arrive in bursts.
+
+        Agent runs post many messages per task, so they get a wider window
+        to coalesce into one write; other callers keep the default delay.
+        """
+        delay_ms = 500 if self._is_agent_running(conversation_id) else 250
+        self._save_conversations({conversation_id}, delay_ms=delay_ms)
+
+    def _flush_pending_save(self) -> bool:
+        """Write a scheduled save now instead of waiting for its timer."""
+        if self._save_timer_id is not None:
+            GLib.source_remove(self._save_timer_id)
+            self._flush_conversations_cb()
+        return False
+
+    def _take_pending_save(self) -> Optional[tuple[dict, Optional[set[str]]]]:
+        """Return (serialized snapshot, changed_ids) for pending changes and reset dirty state.
+
+        Runs on the GTK thread, which owns the conversations, so the saver
+        thread only ever sees the already-encoded snapshot.
+        """
+        if not self._save_pending:
+            return None
+        changed_ids = None if self._save_all_pending else set(self._dirty_conversation_ids)
+        self._save_pending = False
+        self._save_all_pending = False
+        self._dirty_conversation_ids.clear()
+        try:
+            snapshot = snapshot_conversations(list(self.conversations.values()), changed_ids)
+        except Exception as e:
+            logger.error("Failed to serialize conversations: %s", e)
+            self._save_conversations(changed_ids, delay_ms=2000)
+            return None
+        return snapshot, changed_ids
+
+    def _flush_conversations_cb(self) -> bool:
+        """Write pending conversation changes on the single saver thread."""
+        self._save_timer_id = None
+        pending = self._take_pending_save()
+        if pending is not None:
+            try:
+                self._save_executor.submit(self._write_conversations_on_saver, *pending)
+            except RuntimeError:
+                # Saver already shut down (window closing); write inline.
+                self._write_conversations(pending[0])
+        return False
+
+    def _write_conversations_on_saver(
+            self, snapshot: dict, changed_ids: Optional[set[str]]) -> None:
+        """Saver-thread write; failed ids go back to the dirty set on the main loop."""
+        if not self._write_conversations(snapshot):
+            GLib.idle_add(self._save_conversations, changed_ids, 2000)
+
+    def _write_conversations(self, snapshot: dict) -> bool:
+        """Persist a serialized snapshot, logging instead of raising."""
+        try:
+            write_conversations_snapshot(snapshot)
+            return True
+        except Exception as e:
+            logger.error("Failed to save conversations: %s", e)
+            return False
+
+    def _flush_conversations(self) -> None:
+        """Synchronously write any pending conversation changes."""
+        if self._save_timer_id is not None:
+            GLib.source_remove(self._save_timer_id)
+            self._save_timer_id = None
+        self._save_executor.shutdown(wait=True)
+        pending = self._take_pending_save()
+        if pending is not None:
+            self._write_conversations(pending[0])
 
     def _on_new_chat(self, button) -> None:
         """Create a new conversation.
@@ -789,23 +1847,17 @@ class MainWindow(Gtk.ApplicationWindow):
         Args:
             button: The clicked button.
         """
-        new_id = str(uuid.uuid4())
+        new_id = self._next_id()
+        self._conversation_counter += 1
         new_conv = Conversation(
             id=new_id,
-            title=f"Conversation {len(self.conversations) + 1}",
+            title=f"Conversation {self._conversation_counter}",
             model=self._default_model_name(),
         )
         self.conversations[new_id] = new_conv
         self.sidebar.add_conversation(new_conv)
         self._load_conversation(new_id)
-        self._save_conversations()
-
-    def _on_refresh_connection(self, _button) -> None:
-        """Handle refresh button click in chat input to re-check API connection."""
-        GLib.idle_add(
-            lambda: asyncio.ensure_future(self._check_api_connection_and_update_status()),
-            priority=GLib.PRIORITY_DEFAULT,
-        )
+        self._save_conversations({new_id})
 
     def _on_autoscroll_toggled(self, _button) -> None:
         """Apply autoscroll checkbox state to chat area sticky follow behavior."""
@@ -840,7 +1892,7 @@ class MainWindow(Gtk.ApplicationWindow):
         
         # Remove the message and all subsequent messages
         self.current_conversation.messages = self.current_conversation.messages[:message_index_to_delete]
-        self._save_conversations()
+        self._save_conversations({self.current_conversation.id})
         
         # Reload the conversation to update the UI
         self._load_conversation(self.current_conversation.id)
@@ -861,7 +1913,7 @@ class MainWindow(Gtk.ApplicationWindow):
         logger.debug("Message %s edited to: %s", message_id, new_content)
         if self.current_conversation:
             # Save the edited conversation state
-            self._save_conversations()
+            self._save_conversations({self.current_conversation.id})
             logger.debug("Conversation saved after message edit.")
 
     def _regenerate_response_from_message(self, message_id: str) -> None:
@@ -891,7 +1943,7 @@ class MainWindow(Gtk.ApplicationWindow):
         self.chat_area.show_typing_indicator()
 
         # Save conversation state
-        self._save_conversations()
+        self._save_conversations({self.current_conversation.id})
 
         # Trigger AI response from this point
         settings = self._get_effective_settings(self.current_conversation)
@@ -901,11 +1953,7 @@ class MainWindow(Gtk.ApplicationWindow):
         self.api_client.clear_cancel_generation()
         self._set_generation_active(True, conversation_id=conv_id, mode=mode)
 
-        threading.Thread(
-            target=self._fetch_ai_response,
-            args=(conv.messages[-1].content, conv, conv_id, settings, mode),
-            daemon=True,
-        ).start()
+        self._start_ai_response(conv.messages[-1].content, conv, conv_id, settings, mode)
 
     def _on_send_message(self, button) -> None:
         """Handle message sending.
@@ -926,10 +1974,10 @@ class MainWindow(Gtk.ApplicationWindow):
         if not text:
             logger.debug("_on_send_message: Empty message text.")
             return
-        logger.debug("_on_send_message: Message text received. Mode: %s", self.chat_input.get_mode())
+        mode = ChatMode.coerce(self.chat_input.get_mode())
+        logger.debug("_on_send_message: Message text received. Mode: %s", mode)
 
-        mode = self.chat_input.get_mode()
-        if mode == "agent":
+        if mode is ChatMode.AGENT:
             if not self._ensure_agent_config(self.current_conversation):
                 logger.debug("_on_send_message: Agent config not ensured.")
                 return
@@ -940,9 +1988,9 @@ class MainWindow(Gtk.ApplicationWindow):
                 "User submitted a new message. Current agent run will stop after the active step.",
             )
             logger.debug("_on_send_message: Agent is running, request stop.")
-        if getattr(self.current_conversation, "chat_mode", "ask") != mode:
+        if ChatMode.coerce(self.current_conversation.chat_mode) is not mode:
             self.current_conversation.chat_mode = mode
-            self._save_conversations()
+            self._save_conversations({self.current_conversation.id})
             logger.debug("_on_send_message: Chat mode changed and saved.")
 
         logger.info("User: %s", text)
@@ -950,15 +1998,17 @@ class MainWindow(Gtk.ApplicationWindow):
 
         # Add user message
         logger.debug("_on_send_message: Adding user message to conversation.")
+        # Cheap estimate now; the tokenizer count is reconciled off the GTK thread.
         user_msg = Message(
-            id=str(uuid.uuid4()),
+            id=self._next_id(),
             role=MessageRole.USER,
             content=text,
-            tokens=count_text_tokens(text, model=self.current_conversation.model),
+            tokens=max(1, len(text) // 4),
         )
         self.current_conversation.add_message(user_msg)
         self.chat_area.add_message(user_msg)
-        self._save_conversations()
+        self._schedule_message_token_count(self.current_conversation, user_msg)
+        self._save_conversations({self.current_conversation.id})
         logger.debug("_on_send_message: User message added and conversation saved.")
 
         # Clear input
@@ -985,29 +2035,91 @@ class MainWindow(Gtk.ApplicationWindow):
         # even if user switches conversations before response arrives
         conv = self.current_conversation
         conv_id = conv.id
-        if mode == "agent" and self._is_agent_running(conv_id):
+        if mode is ChatMode.AGENT and self._is_agent_running(conv_id):
             self.chat_area.hide_typing_indicator()
             logger.debug("_on_send_message: Agent is running, hiding typing indicator and returning.")
             return
 
         self.api_client.clear_cancel_generation()
         self._set_generation_active(True, conversation_id=conv_id, mode=mode)
-        logger.debug("_on_send_message: Starting _fetch_ai_response in a new thread.")
-        threading.Thread(
-            target=self._fetch_ai_response,
-            args=(text, conv, conv_id, settings, mode),
-            daemon=True,
-        ).start()
+        self._start_ai_response(text, conv, conv_id, settings, mode)
         logger.debug("Exiting _on_send_message.")
 
+    def _start_ai_response(
+        self, user_text: str, conversation: Conversation, conversation_id: str,
+        settings: ConversationSettings, mode: str
+    ) -> None:
+        """Dispatch response generation without blocking the GTK thread.
+
+        Ask/plan requests are submitted straight to the shared asyncio loop;
+        only agent mode, which drives its own synchronous run loop, still
+        needs a worker thread.
+        """
+        if mode == "agent":
+            logger.debug("_start_ai_response: Starting agent run in a new thread.")
+            threading.Thread(
+                target=self._fetch_ai_response,
+                args=(user_text, conversation, conversation_id, settings, mode),
+                daemon=True,
+            ).start()
+            return
+        loop = getattr(getattr(self, "asyncio_thread", None), "loop", None)
+        if loop is None or not loop.is_running():
+            logger.error("Asyncio event loop is not running. Cannot reach LM Studio.")
+            self.api_client.clear_cancel_generation()
+            self._set_generation_active(False)
+            self._add_assistant_message_and_save(
+                "Failed to get AI response: ConnectionError - Asyncio event loop is not running. Cannot reach LM Studio.",
+                conversation_id,
+                [],
+                [],
+                None,
+            )
+            return
+        logger.debug("_start_ai_response: Submitting _fetch_ai_response_async to the asyncio loop.")
+        asyncio.run_coroutine_threadsafe(
+            self._fetch_ai_response_async(user_text, conversation, conversation_id, settings, mode),
+            loop,
+        )
+
+    def _schedule_message_token_count(self, conversation: Conversation, message: Message) -> None:
+        """Count message tokens on the asyncio thread and apply the result in GTK."""
+        loop = getattr(self.asyncio_thread, "loop", None)
+        if not loop or not loop.is_running():
+            self._apply_message_tokens(
+                conversation,
+                message,
+                count_text_tokens(message.content, model=conversation.model),
+            )
+            return
+        future = asyncio.run_coroutine_threadsafe(
+            asyncio.to_thread(count_text_tokens, message.content, conversation.model),
+            loop,
+        )
+
+        def _on_done(fut) -> None:
+            if fut.cancelled() or fut.exception() is not None:
+                return
+            GLib.idle_add(self._apply_message_tokens, conversation, message, fut.result())
+
+        future.add_done_callback(_on_done)
+
+    def _apply_message_tokens(self, conversation: Conversation, message: Message, tokens: int) -> bool:
+        """Replace a message's estimated token count with the tokenizer count."""
+        tokens = int(tokens or 0)
+        if tokens > 0 and tokens != message.tokens:
+            conversation.total_tokens += tokens - message.tokens
+            message.tokens = tokens
+            conversation.mark_messages_changed()
+        return False
+
     def _fetch_ai_response(
         self, user_text: str, conversation: Conversation, conversation_id: str,
         settings: ConversationSettings, mode: str
     ) -> None:
-        """Fetch AI response from API (runs in background thread).
+        """Run an agent-mode response (runs in background thread).
 
-        Uses the captured conversation so full context (all prior messages)
-        is always sent to the API for memory.
+        Ask/plan requests go through _fetch_ai_response_async instead.
 
         Args:
             user_text: The user's message text.
@@ -1020,23 +2132,18 @@ class MainWindow(Gtk.ApplicationWindow):
         if mode == "agent":
             logger.debug("_fetch_ai_response: Agent mode detected.")
             if self._is_agent_running(conversation_id):
-                GLib.idle_add(
-                    self._add_agent_progress_message,
-                    conversation_id,
-                    "Agent is already running for this conversation.",
-                    priority=GLib.PRIORITY_DEFAULT,
-                )
-                GLib.idle_add(
-                    self._hide_typing_indicator_for_conversation,
-                    conversation_id,
-                    priority=GLib.PRIORITY_DEFAULT,
-                )
+                self._post_agent_ui_batch((
+                    (self._add_agent_progress_message,
+                     (conversation_id, "Agent is already running for this conversation.")),
+                    (self._hide_typing_indicator_for_conversation, (conversation_id,)),
+                ))
                 self.api_client.clear_cancel_generation()
                 self._set_generation_active(False)
                 logger.debug("_fetch_ai_response: Agent already running, returning.")
                 return
             self._set_agent_running(conversation_id, True)
             self._clear_agent_stop_request(conversation_id)
+            future = None
             try:
                 # Use the asyncio thread instance passed to MainWindow
                 if getattr(self, "asyncio_thread", None) and getattr(self.asyncio_thread, "loop", None) and self.asyncio_thread.loop.is_running():
@@ -1058,108 +2165,118 @@ class MainWindow(Gtk.ApplicationWindow):
                     raise ConnectionError("Asyncio event loop is not running. Cannot run agent mode.")
             except FuturesCancelledError:
                 logger.info("Agent mode cancelled by user for conversation %s", conversation_id)
-                GLib.idle_add(
+                self._post_agent_ui(
                     self._add_agent_progress_message,
                     conversation_id,
                     "Agent run stopped by user.",
-                    priority=GLib.PRIORITY_DEFAULT,
                 )
             except Exception as e:
                 logger.warning("_fetch_ai_response: Agent mode run failed (%s): %s", type(e).__name__, e)
-                GLib.idle_add(
+                self._post_agent_ui(
                     self._add_assistant_message_and_save,
                     f"Agent mode encountered an error and stopped: {type(e).__name__} - {e}. Check logs and task list, then retry.",
                     conversation_id,
                     [],
                     None,
-                    priority=GLib.PRIORITY_DEFAULT,
                 )
             finally:
                 self._set_agent_running(conversation_id, False)
-                GLib.idle_add(
-                    self._hide_typing_indicator_for_conversation,
-                    conversation_id,
-                    priority=GLib.PRIORITY_DEFAULT,
-                )
+                # End-of-run updates go through the agent UI queue so they land
+                # after the run's last progress lines, whatever their priority;
+                # the save flush then writes everything in one pass.
+                self._post_agent_ui_batch((
+                    (self._hide_typing_indicator_for_conversation, (conversation_id,)),
+                    (self._flush_pending_save, ()),
+                ))
                 self.api_client.clear_cancel_generation()
                 self._set_generation_active(False)
-                self._clear_active_generation_future(future if 'future' in locals() else None)
+                self._clear_active_generation_future(future)
             logger.debug("Exiting _fetch_ai_response (agent mode).")
-            return
 
+    async def _fetch_ai_response_async(
+        self, user_text: str, conversation: Conversation, conversation_id: str,
+        settings: ConversationSettings, mode: str
+    ) -> None:
+        """Fetch an ask/plan response (runs on the asyncio thread).
+
+        Uses the captured conversation so full context (all prior messages)
+        is always sent to the API for memory.
+
+        Args:
+            user_text: The user's message text.
+            conversation: The conversation object.
+            conversation_id: ID of the conversation.
+            settings: The current conversation settings.
+        """
+        logger.debug("Entering _fetch_ai_response_async for conversation: %s, mode: %s", conversation_id, mode)
         response_text = None
         stream_id: Optional[str] = None
         tool_events = []
+        planned_tasks: list[dict] = []
         followup_message = ""
         followup_tasks: list[dict] = []
         if mode in ("ask", "plan"):
-            stream_id = str(uuid.uuid4())
+            stream_id = self._next_id()
         try:
-            if self.asyncio_thread.loop and self.asyncio_thread.loop.is_running():
-                logger.debug("_fetch_ai_response: Submitting _get_api_response to asyncio_thread.")
-
-                stream_started = False
-
-                def _on_text_delta(delta_text: str) -> None:
-                    nonlocal stream_started
-                    if not stream_id or not delta_text:
-                        return
-                    if not stream_started:
-                        stream_started = True
-                        GLib.idle_add(
-                            self._begin_stream_for_conversation,
-                            conversation_id,
-                            stream_id,
-                            priority=GLib.PRIORITY_DEFAULT,
-                        )
+            stream_started = False
+
+            def _on_text_delta(delta_text: str) -> None:
+                nonlocal stream_started
+                if not stream_id or not delta_text:
+                    return
+                if not stream_started:
+                    stream_started = True
                     GLib.idle_add(
-                        self._append_stream_delta_for_conversation,
+                        self._begin_stream_for_conversation,
                         conversation_id,
                         stream_id,
-                        delta_text,
                         priority=GLib.PRIORITY_DEFAULT,
                     )
+                GLib.idle_add(
+                    self._append_stream_delta_for_conversation,
+                    conversation_id,
+                    stream_id,
+                    delta_text,
+                    priority=GLib.PRIORITY_DEFAULT,
+                )
 
-                # Submit _get_api_response to the asyncio thread and wait for its result.
-                # asyncio.run_coroutine_threadsafe returns a Future.
-                # .result() blocks until the coroutine completes or raises an exception.
-                future = asyncio.run_coroutine_threadsafe(
-                    self._get_api_response(
-                        conversation,
-                        settings,
-                        mode=mode,
-                        on_text_delta=_on_text_delta if stream_id else None,
-                        stream_response=bool(stream_id),
-                    ),
-                    self.asyncio_thread.loop
+            # Run as a task so the Stop button can cancel just the API call.
+            task = asyncio.ensure_future(
+                self._get_api_response(
+                    conversation,
+                    settings,
+                    mode=mode,
+                    on_text_delta=_on_text_delta if stream_id else None,
+                    stream_response=bool(stream_id),
                 )
-                self._set_active_generation_future(future)
-                response_text, tool_events, planned_tasks = future.result() # This will block until result is ready
-                self._clear_active_generation_future(future)
-                
-                logger.debug("_fetch_ai_response: _get_api_response returned from asyncio_thread. Response text length: %d", len(response_text) if response_text else 0)
-                
-                if mode == "plan" and response_text:
-                    logger.debug("_fetch_ai_response: Submitting _plan_mode_review_for_missing_info to asyncio_thread.")
-                    plan_review_future = asyncio.run_coroutine_threadsafe(
-                        self._plan_mode_review_for_missing_info(
-                            conversation=conversation,
-                            settings=settings,
-                            plan_response=response_text,
-                            planned_tasks=planned_tasks,
-                            existing_tasks=conversation.ai_tasks, # Pass existing tasks
-                        ),
-                        self.asyncio_thread.loop
+            )
+            self._set_active_generation_future(task)
+            try:
+                response_text, tool_events, planned_tasks = await task
+            finally:
+                self._clear_active_generation_future(task)
+
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("_fetch_ai_response_async: _get_api_response returned. Response text length: %d", len(response_text) if response_text else 0)
+
+            if mode == "plan" and response_text:
+                plan_review_task = asyncio.ensure_future(
+                    self._plan_mode_review_for_missing_info(
+                        conversation=conversation,
+                        settings=settings,
+                        plan_response=response_text,
+                        planned_tasks=planned_tasks,
+                        existing_tasks=conversation.ai_tasks, # Pass existing tasks
                     )
-                    self._set_active_generation_future(plan_review_future)
-                    followup_message, followup_tasks = plan_review_future.result()
-                    self._clear_active_generation_future(plan_review_future)
-                    logger.debug("_fetch_ai_response: _plan_mode_review_for_missing_info returned.")
-            else:
-                logger.error("Asyncio loop not running in separate thread during _fetch_ai_response.")
-                raise ConnectionError("Asyncio event loop is not running. Cannot reach LM Studio.")
-        except FuturesCancelledError:
-            logger.info("Generation cancelled via future cancellation for conversation %s", conversation_id)
+                )
+                self._set_active_generation_future(plan_review_task)
+                try:
+                    followup_message, followup_tasks = await plan_review_task
+                finally:
+                    self._clear_active_generation_future(plan_review_task)
+                logger.debug("_fetch_ai_response_async: _plan_mode_review_for_missing_info returned.")
+        except asyncio.CancelledError:
+            logger.info("Generation cancelled via task cancellation for conversation %s", conversation_id)
             response_text = ""
             planned_tasks = []
             followup_message = ""
@@ -1207,7 +2324,9 @@ class MainWindow(Gtk.ApplicationWindow):
         if response_text and response_text.strip():
             logger.info("Assistant: %s", response_text)
             # Update UI on main thread - pass conv id so we add to correct conversation
-            logger.debug("_fetch_ai_response: Updating UI on main thread.")
+            # Tokenize here so the GTK thread only stores the count.
+            response_tokens = await asyncio.to_thread(count_text_tokens, response_text, conversation.model)
+            logger.debug("_fetch_ai_response_async: Updating UI on main thread.")
             GLib.idle_add(
                 self._add_assistant_message_and_save,
                 response_text,
@@ -1215,6 +2334,7 @@ class MainWindow(Gtk.ApplicationWindow):
                 tool_events,
                 planned_tasks,
                 stream_id,
+                response_tokens,
                 priority=GLib.PRIORITY_DEFAULT,
             )
         else:
@@ -1224,18 +2344,23 @@ class MainWindow(Gtk.ApplicationWindow):
                 priority=GLib.PRIORITY_DEFAULT,
             )
         if followup_message or followup_tasks:
-            logger.debug("_fetch_ai_response: Adding plan followup.")
+            logger.debug("_fetch_ai_response_async: Adding plan followup.")
+            followup_tokens = None
+            if followup_message:
+                followup_tokens = await asyncio.to_thread(
+                    count_text_tokens, followup_message, conversation.model)
             GLib.idle_add(
                 self._add_plan_followup_and_save,
                 followup_message,
                 conversation_id,
                 followup_tasks,
+                followup_tokens,
                 priority=GLib.PRIORITY_DEFAULT,
             )
         self.api_client.clear_cancel_generation()
         self._set_generation_active(False)
         self._clear_active_generation_future()
-        logger.debug("Exiting _fetch_ai_response.")
+        logger.debug("Exiting _fetch_ai_response_async.")
 
     async def _get_api_response(
         self,
@@ -1274,14 +2399,19 @@ class MainWindow(Gtk.ApplicationWindow):
                 base_prompt=str(current_settings.system_prompt or ""),
                 tasks=conversation.ai_tasks if isinstance(
                     conversation.ai_tasks, list) else [],
+                task_context=(
+                    self._agent_task_context(conversation) if mode == "agent" else None
+                ),
             ),
         )
         configured_tools, configured_tool_choice = load_tools()
-        enabled_tool_metadata = self.tools_bar.get_enabled_tool_metadata()
-        enabled_mcp = [tool["id"] for tool in enabled_tool_metadata]
-        builtin_enabled = "mcp/builtin_filesystem" in enabled_mcp
-        enabled_mcp_external = [
-            iid for iid in enabled_mcp if iid != "mcp/builtin_filesystem"]
+        builtin_enabled = False
+        enabled_mcp_external: list[str] = []
+        for tool in self.tools_bar.get_enabled_tool_metadata():
+            if tool["id"] == "mcp/builtin_filesystem":
+                builtin_enabled = True
+            else:
+                enabled_mcp_external.append(tool["id"])
         selected_tools: list[dict] = []
         tool_choice = None
 
@@ -1289,10 +2419,7 @@ class MainWindow(Gtk.ApplicationWindow):
         # from enabled endpoints. Do NOT discover or use tools in `plan` mode.
         if enabled_mcp_external and mode != "plan":
             server_configs = load_mcp_server_configs()
-            discovered_tools = await self.mcp_discovery.discover_tools(
-                server_configs=server_configs,
-                enabled_integrations=enabled_mcp_external,
-            )
+            discovered_tools = await self._discover_mcp_tools_cached(server_configs, enabled_mcp_external)
             logger.info(
                 "Discovered %d tools from %d enabled integrations (%s)",
                 len(discovered_tools),
@@ -1300,18 +2427,19 @@ class MainWindow(Gtk.ApplicationWindow):
                 ", ".join(enabled_mcp_external),
             )
             # Log each discovered tool
-            for tool in discovered_tools:
-                if isinstance(tool, dict):
-                    fn = tool.get("function") or {}
-                    name = fn.get("name", "?")
-                    desc = fn.get("description", "")
-                    params = fn.get("parameters", {})
-                    logger.debug(
-                        "Tool: %s - %s (params: %s)",
-                        name,
-                        desc,
-                        "object" if isinstance(params, dict) else "unknown",
-                    )
+            if logger.isEnabledFor(logging.DEBUG):
+                for tool in discovered_tools:
+                    if isinstance(tool, dict):
+                        fn = tool.get("function") or {}
+                        name = fn.get("name", "?")
+                        desc = fn.get("description", "")
+                        params = fn.get("parameters", {})
+                        logger.debug(
+                            "Tool: %s - %s (params: %s)",
+                            name,
+                            desc,
+                            "object" if isinstance(params, dict) else "unknown",
+                        )
             selected_tools.extend(discovered_tools)
         else:
             server_configs = {}
@@ -1346,20 +2474,7 @@ class MainWindow(Gtk.ApplicationWindow):
                     "function": {
                         "name": integration_id.replace("/", "_").replace("-", "_"),
                         "description": f"Call {integration_id} MCP integration (discovery details unavailable)",
-                        "parameters": {
-                            "type": "object",
-                            "properties": {
-                                "method": {
-                                    "type": "string",
-                                    "description": "The method name to call on this integration"
-                                },
-                                "args": {
-                                    "type": "object",
-                                    "description": "Arguments for the method"
-                                }
-                            },
-                            "required": ["method"]
-                        }
+                        "parameters": _PLACEHOLDER_PARAMS,
                     }
                 }
                 selected_tools.append(placeholder_tool)
@@ -1374,19 +2489,22 @@ class MainWindow(Gtk.ApplicationWindow):
                 "Sending %d tools to API with tool_choice='%s'",
                 len(selected_tools),
                 tool_choice)
-            for tool in selected_tools:
-                if isinstance(tool, dict):
-                    fn = tool.get("function") or {}
-                    name = fn.get("name", "?")
-                    desc = fn.get("description", "")
-                    logger.info("  • %s: %s", name, desc)
+            if logger.isEnabledFor(logging.INFO):
+                for tool in selected_tools:
+                    if isinstance(tool, dict):
+                        fn = tool.get("function") or {}
+                        name = fn.get("name", "?")
+                        desc = fn.get("description", "")
+                        logger.info("  • %s: %s", name, desc)
 
         if enabled_mcp_external:
             current_settings = replace(
                 current_settings, integrations=enabled_mcp_external)
         mcp_tool_map = self._build_mcp_tool_map(selected_tools)
         tool_events: list[dict] = []
-        ev_collector = lambda ev: tool_events.append(ev) # Define the event collector
+        # The approval wrapper records the detailed event for every call, so it is
+        # the only collector; the client-level callback would duplicate each event.
+        ev_collector = tool_events.append
         # Call the LM Studio API with retries on transient connection failures.
         max_attempts = 3
         last_exc = None
@@ -1405,7 +2523,6 @@ class MainWindow(Gtk.ApplicationWindow):
                         server_configs=server_configs,
                         on_tool_event=ev_collector, # Pass the collector function
                     ),
-                    on_tool_event=lambda ev: tool_events.append(ev),
                     on_text_delta=_on_text_delta_wrapped if on_text_delta else None,
                     stream_response=stream_response,
                 )
@@ -1419,6 +2536,8 @@ class MainWindow(Gtk.ApplicationWindow):
             except Exception as e:
                 last_exc = e
                 logger.warning("API call attempt %d/%d failed: %s", attempt, max_attempts, e)
+                if not _is_retryable_api_error(e):
+                    raise
                 # Try to reinitialize the client session before next attempt
                 try:
                     await self.api_client.initialize()
@@ -1426,7 +2545,9 @@ class MainWindow(Gtk.ApplicationWindow):
                 except Exception as ie:
                     logger.debug("Failed to reinitialize LM Studio client: %s", ie)
                 if attempt < max_attempts:
-                    await asyncio.sleep(3)
+                    if not await self._retry_backoff(conversation.id, 3.0):
+                        logger.info("Stop requested during retry backoff; not retrying.")
+                        raise
                 else:
                     # All attempts failed: update UI to disconnected and return error
                     logger.error("All API attempts failed: %s", last_exc)
@@ -1453,6 +2574,17 @@ class MainWindow(Gtk.ApplicationWindow):
                 logger.debug("Failed emitting fallback text delta: %s", e)
                 break
 
+    async def _retry_backoff(self, conversation_id: str, seconds: float) -> bool:
+        """Wait before a retry; return False early if the user asked to stop."""
+        deadline = time.monotonic() + seconds
+        while True:
+            if self._is_agent_stop_requested(conversation_id) or self.api_client.is_cancel_generation_requested():
+                return False
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return True
+            await asyncio.sleep(min(0.25, remaining))
+
     async def _chat_with_retries(self, conversation: Conversation, settings: ConversationSettings, tool_executor=None) -> str:
         """Call `api_client.chat_completion_with_tools` with retry on transient failures.
 
@@ -1472,13 +2604,17 @@ class MainWindow(Gtk.ApplicationWindow):
             except Exception as e:
                 last_exc = e
                 logger.warning("API call attempt %d/%d failed: %s", attempt, max_attempts, e)
+                if not _is_retryable_api_error(e):
+                    raise
                 try:
                     await self.api_client.initialize()
                     logger.debug("Reinitialized LM Studio client after failure.")
                 except Exception as ie:
                     logger.debug("Failed to reinitialize LM Studio client: %s", ie)
                 if attempt < max_attempts:
-                    await asyncio.sleep(3)
+                    if not await self._retry_backoff(conversation.id, 3.0):
+                        logger.info("Stop requested during retry backoff; not retrying.")
+                        raise
                 else:
                     logger.error("All API attempts failed: %s", last_exc)
                     GLib.idle_add(self.chat_input.set_model_status, False, "Disconnected", priority=GLib.PRIORITY_DEFAULT)
@@ -1564,7 +2700,8 @@ class MainWindow(Gtk.ApplicationWindow):
             )
             if enable_auto:
                 settings.auto_tool_approval = True
-                GLib.idle_add(lambda: self.settings_window.set_auto_tool_approval(True) or False)
+                # set_auto_tool_approval returns None, so the idle source runs once.
+                GLib.idle_add(self.settings_window.set_auto_tool_approval, True)
             if not approved:
                 error_message = "Tool execution rejected by user."
                 if deny_reason:
@@ -1591,12 +2728,25 @@ class MainWindow(Gtk.ApplicationWindow):
                 priority=GLib.PRIORITY_DEFAULT,
             )
         
-        json_result, tool_event = await self._execute_tool_call(
-            tool_name,
-            normalized_args,
-            mcp_tool_map=mcp_tool_map,
-            server_configs=server_configs,
-        )
+        try:
+            json_result, tool_event = await self._execute_tool_call(
+                tool_name,
+                normalized_args,
+                mcp_tool_map=mcp_tool_map,
+                server_configs=server_configs,
+            )
+        except Exception as e:
+            # This wrapper is the only tool-event source, so record failures
+            # here too; the client turns the re-raised error into tool output.
+            if on_tool_event:
+                on_tool_event({
+                    "name": tool_name,
+                    "args": normalized_args,
+                    "status": "error",
+                    "result": {"ok": False, "error": str(e)},
+                    "details": {"type": "tool_error", "message": str(e)},
+                })
+            raise
         if on_tool_event:
             on_tool_event(tool_event)
         return json_result
@@ -1615,7 +2765,7 @@ class MainWindow(Gtk.ApplicationWindow):
             return False
 
         msg = Message(
-            id=str(uuid.uuid4()),
+            id=self._next_id(),
             role=MessageRole.SYSTEM,
             content=f"Tool permission request: {tool_name}",
             tokens=0,
@@ -1637,7 +2787,7 @@ class MainWindow(Gtk.ApplicationWindow):
         if self.current_conversation and self.current_conversation.id == conversation_id:
             self.current_conversation = conv
             self.chat_area.add_message(msg)
-        self._save_conversations()
+        self._save_conversations({conversation_id})
         return False
 
     def _tool_permission_metadata(
@@ -1656,7 +2806,7 @@ class MainWindow(Gtk.ApplicationWindow):
         if not description:
             description = "Tool execution requested by the assistant."
 
-        args_text = json.dumps(args or {}, indent=2, ensure_ascii=False)
+        args_text = _json_dumps_pretty(args or {})
         if len(args_text) > 6000:
             args_text = args_text[:6000] + "\n... [truncated]"
 
@@ -1680,7 +2830,7 @@ class MainWindow(Gtk.ApplicationWindow):
     ) -> tuple[bool, bool, str]:
         """Render an inline permission bubble and await the user decision."""
         loop = asyncio.get_running_loop()
-        request_id = str(uuid.uuid4())
+        request_id = self._next_id()
         decision_future = loop.create_future()
         meta = self._tool_permission_metadata(tool_name, args, mcp_tool_map=mcp_tool_map)
 
@@ -1728,11 +2878,11 @@ class MainWindow(Gtk.ApplicationWindow):
         """Append a tool permission request to the conversation stream."""
         conv = self.conversations.get(conversation_id)
         if conv is None:
-            if not decision_future.done():
-                loop.call_soon_threadsafe(
-                    decision_future.set_result,
-                    {"approved": False, "allow_always": False, "reason": "Conversation not found."},
-                )
+            self._resolve_future_threadsafe(
+                loop,
+                decision_future,
+                {"approved": False, "allow_always": False, "reason": "Conversation not found."},
+            )
             return
 
         msg = Message(
@@ -1757,7 +2907,7 @@ class MainWindow(Gtk.ApplicationWindow):
         if self.current_conversation and self.current_conversation.id == conversation_id:
             self.current_conversation = conv
             self.chat_area.add_message(msg)
-        self._save_conversations()
+        self._save_conversations({conversation_id})
 
         with self._pending_tool_permissions_lock:
             self._pending_tool_permissions[request_id] = {
@@ -1811,7 +2961,7 @@ class MainWindow(Gtk.ApplicationWindow):
         if self.current_conversation and self.current_conversation.id == conversation_id:
             self.current_conversation = conv
             self.chat_area.replace_message_bubble(request_id, updated, animate=False)
-        self._save_conversations()
+        self._save_conversations({conversation_id})
 
     def _on_tool_permission_decision(self, message_id: str, decision: str, allow_always: bool, reason: str = "") -> None:
         """Handle Allow/Deny clicks from inline permission cards."""
@@ -1835,9 +2985,10 @@ class MainWindow(Gtk.ApplicationWindow):
 
         loop = pending.get("loop")
         future = pending.get("future")
-        if loop and future and not future.done():
-            loop.call_soon_threadsafe(
-                future.set_result,
+        if loop and future:
+            self._resolve_future_threadsafe(
+                loop,
+                future,
                 {
                     "approved": approved,
                     "allow_always": bool(allow_always) if approved else False,
@@ -1845,6 +2996,22 @@ class MainWindow(Gtk.ApplicationWindow):
                 },
             )
 
+    @staticmethod
+    def _resolve_future_threadsafe(loop: asyncio.AbstractEventLoop, future: asyncio.Future, value) -> None:
+        """Set an asyncio future's result from the GTK thread.
+
+        The done() check runs on the loop itself, so a future cancelled by a
+        timeout in the meantime is skipped instead of raising InvalidStateError.
+        """
+        def _resolve() -> None:
+            if not future.done():
+                future.set_result(value)
+
+        try:
+            loop.call_soon_threadsafe(_resolve)
+        except RuntimeError:
+            logger.debug("Event loop closed before tool permission decision was delivered.")
+
     def _add_assistant_message_and_save(
         self,
         response_text: str,
@@ -1852,8 +3019,13 @@ class MainWindow(Gtk.ApplicationWindow):
         tool_events: Optional[list[dict]] = None,
         planned_tasks: Optional[list[dict]] = None,
         stream_id: Optional[str] = None,
+        tokens: Optional[int] = None,
     ) -> bool:
-        """Add assistant message to UI and save (runs on main thread)."""
+        """Add assistant message to UI and save (runs on main thread).
+
+        ``tokens`` is the precomputed count for ``response_text``; when omitted
+        the message is tokenized here.
+        """
         if conversation_id not in self.conversations:
             return False
         conv = self.conversations[conversation_id]
@@ -1862,12 +3034,18 @@ class MainWindow(Gtk.ApplicationWindow):
         if self._should_append_to_latest_agent_bubble(conv, response_text, tool_events, planned_tasks):
             last_msg = conv.messages[-1]
             previous_tokens = int(last_msg.tokens or 0)
-            existing_activity_count = self._count_agent_activity_entries(last_msg.content)
+            refresh = self._agent_bubble_refresh
             if not isinstance(last_msg.meta, dict):
                 last_msg.meta = {}
-            last_msg.meta["agent_activity_animate_from"] = existing_activity_count
-            last_msg.content = f"{last_msg.content.rstrip()}\n{response_text.strip()}".strip()
-            last_msg.tokens = count_text_tokens(last_msg.content, model=conv.model)
+            if refresh is None or last_msg.id not in refresh:
+                # Entries from here on animate in when the bubble is re-rendered.
+                last_msg.meta["agent_activity_animate_from"] = (
+                    self._count_agent_activity_entries(last_msg.content))
+            incoming = response_text.strip()
+            last_msg.content = f"{last_msg.content.rstrip()}\n{incoming}".strip()
+            # Count only the appended entry rather than re-tokenizing the whole bubble.
+            last_msg.tokens = previous_tokens + count_text_tokens(f"\n{incoming}", model=conv.model)
+            conv.mark_messages_changed()
             conv.total_tokens = max(0, int(conv.total_tokens or 0) - previous_tokens + last_msg.tokens)
             conv.updated_at = datetime.now()
 
@@ -1875,15 +3053,18 @@ class MainWindow(Gtk.ApplicationWindow):
                 self.current_conversation = conv
                 self.chat_area.end_assistant_stream(stream_id)
                 self.chat_area.hide_typing_indicator()
-                self.chat_area.replace_message_bubble(last_msg.id, last_msg, animate=True)
-            self._save_conversations()
+                if refresh is not None:
+                    refresh[last_msg.id] = (conversation_id, last_msg)
+                else:
+                    self.chat_area.replace_message_bubble(last_msg.id, last_msg, animate=True)
+            self._schedule_save(conversation_id)
             return False
 
         ai_msg = Message(
-            id=str(uuid.uuid4()),
+            id=self._next_id(),
             role=MessageRole.ASSISTANT,
             content=response_text,
-            tokens=count_text_tokens(response_text, model=conv.model),
+            tokens=tokens if tokens is not None else count_text_tokens(response_text, model=conv.model),
             meta={"tool_events": tool_events},
         )
         conv.add_message(ai_msg)
@@ -1895,7 +3076,7 @@ class MainWindow(Gtk.ApplicationWindow):
             self.chat_area.end_assistant_stream(stream_id)
             self.chat_area.hide_typing_indicator()
             self.chat_area.add_message(ai_msg)
-        self._save_conversations()
+        self._schedule_save(conversation_id)
         return False  # Don't reschedule idle
 
     def _should_append_to_latest_agent_bubble(
@@ -1934,13 +3115,13 @@ class MainWindow(Gtk.ApplicationWindow):
         raw = str(text or "").strip()
         if not raw:
             return 0
-        chunks = re.split(r"(?=\[Agent(?:\s*-\s*[^\]]+)?\])", raw)
+        chunks = _AGENT_ENTRY_SPLIT_RE.split(raw)
         count = 0
         for chunk in chunks:
             item = chunk.strip()
             if not item:
                 continue
-            if re.match(r"^\[Agent(?:\s*-\s*[^\]]+)?\]\s+.+$", item, flags=re.DOTALL):
+            if _AGENT_ENTRY_RE.match(item):
                 count += 1
         return count
 
@@ -1958,13 +3139,12 @@ class MainWindow(Gtk.ApplicationWindow):
             if str(t.get("status", "uncompleted")) != "completed"
         ]
         if not pending_indices:
-            GLib.idle_add(
+            self._post_agent_ui(
                 self._add_assistant_message_and_save,
                 "[Agent] No pending tasks in AI Tasks.",
                 conversation_id,
                 [],
                 None,
-                priority=GLib.PRIORITY_DEFAULT,
             )
             return
 
@@ -1974,36 +3154,32 @@ class MainWindow(Gtk.ApplicationWindow):
         
         project_constitution = self._load_project_constitution()
         if project_constitution:
-            GLib.idle_add(
+            self._post_agent_ui(
                 self._add_agent_progress_message,
                 conversation_id,
                 "Loaded Project Constitution.",
-                priority=GLib.PRIORITY_DEFAULT,
             )
 
         project_index_data = self._load_project_index()
         if project_index_data:
-            GLib.idle_add(
+            self._post_agent_ui(
                 self._add_agent_progress_message,
                 conversation_id,
                 "Loaded Dynamic Project Index.",
-                priority=GLib.PRIORITY_DEFAULT,
             )
 
         decision_log_content = self._load_decision_log()
         if decision_log_content:
-            GLib.idle_add(
+            self._post_agent_ui(
                 self._add_agent_progress_message,
                 conversation_id,
                 "Loaded Architectural Decision Log.",
-                priority=GLib.PRIORITY_DEFAULT,
             )
 
-        GLib.idle_add(
+        self._post_agent_ui(
             self._add_agent_progress_message,
             conversation_id,
             f"Starting implementation for {project_name} in {project_dir}.",
-            priority=GLib.PRIORITY_DEFAULT,
         )
 
         prompt_counter = 0
@@ -2020,19 +3196,32 @@ class MainWindow(Gtk.ApplicationWindow):
                 note=note,
             )
 
+        # The memory layers are loaded once per run, so format them once too.
+        static_context_parts: list[str] = []
+        if project_constitution:
+            static_context_parts.append(f"PROJECT CONSTITUTION:\n{project_constitution}\n\n")
+        if project_index_data:
+            prompt_index = {
+                path: {k: v for k, v in entry.items() if k not in _INDEX_CACHE_KEYS}
+                if isinstance(entry, dict) else entry
+                for path, entry in project_index_data.items()
+            }
+            static_context_parts.append(f"DYNAMIC PROJECT INDEX:\n```json\n{_json_dumps_pretty(prompt_index)}\n```\n\n")
+        if decision_log_content:
+            static_context_parts.append(f"ARCHITECTURAL DECISION LOG:\n```markdown\n{decision_log_content}\n```\n\n")
+
         for iteration_num, task_index in enumerate(pending_indices, start=1):
             if self._is_agent_stop_requested(conversation_id) or self.api_client.is_cancel_generation_requested():
-                GLib.idle_add(
+                self._post_agent_ui(
                     self._add_agent_progress_message,
                     conversation_id,
                     "Agent run paused by user. Resume in Agent mode to continue from current task.",
-                    priority=GLib.PRIORITY_DEFAULT,
                 )
                 return
             conv_live = self.conversations.get(conversation_id)
             if not conv_live:
                 return
-            live_tasks = self._normalize_task_list(conv_live.ai_tasks)
+            live_tasks = self._normalized_conversation_tasks(conv_live, populate=False)
             if task_index >= len(live_tasks):
                 continue
             task = live_tasks[task_index]
@@ -2040,51 +3229,46 @@ class MainWindow(Gtk.ApplicationWindow):
             if not task_text:
                 continue
 
-            GLib.idle_add(
+            self._post_agent_ui(
                 self._set_task_status_and_save,
                 conversation_id,
                 task_index,
                 "in_progress",
-                priority=GLib.PRIORITY_DEFAULT,
             )
-            GLib.idle_add(
+            self._post_agent_ui(
                 self._add_agent_progress_message,
                 conversation_id,
                 f"Task {iteration_num}/{len(pending_indices)} in progress: {task_text}",
-                priority=GLib.PRIORITY_DEFAULT,
             )
 
             # --- Prepare Global Context ---
-            global_context = ""
+            context_parts: list[str] = []
             # Generate and add simple project map
             project_map = self._generate_simple_project_map(project_dir)
-            logger.debug("--- Simple Project Map for %s ---\n%s\n-------------------------------------", project_dir, project_map)
-            global_context += f"CURRENT PROJECT FILE STRUCTURE:\n```\n{project_map}\n```\n\n"
-
-            if project_constitution:
-                global_context += f"PROJECT CONSTITUTION:\n{project_constitution}\n\n"
-            if project_index_data:
-                global_context += f"DYNAMIC PROJECT INDEX:\n```json\n{json.dumps(project_index_data, indent=2, ensure_ascii=False)}\n```\n\n"
-            if decision_log_content:
-                global_context += f"ARCHITECTURAL DECISION LOG:\n```markdown\n{decision_log_content}\n```\n\n"
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("--- Simple Project Map for %s ---\n%s\n-------------------------------------", project_dir, project_map)
+            context_parts.append(f"CURRENT PROJECT FILE STRUCTURE:\n```\n{project_map}\n```\n\n")
+            context_parts.extend(static_context_parts)
             if conv_live.active_context_files:
-                active_files_context_parts = []
+                context_parts.append("ACTIVE CONTEXT FILES:\n")
                 for path, content in conv_live.active_context_files.items():
-                    active_files_context_parts.append(f"--- ACTIVE FILE: {path} ---\n```\n{content}\n```")
-                global_context += "ACTIVE CONTEXT FILES:\n" + "\n\n".join(active_files_context_parts) + "\n\n"
-            
-            global_context += (
+                    context_parts.append(f"--- ACTIVE FILE: {path} ---\n```\n{content}\n```\n\n")
+
+            context_parts.append(
                 f"Project name: {project_name}\n"
                 f"Project directory: {project_dir}\n"
                 f"User request context: {user_text}\n"
             )
+            global_context = "".join(context_parts)
+            # One batched tokenizer call; unchanged blocks (files, constitution)
+            # are served from the token cache on later tasks.
+            global_context_tokens = sum(count_texts_tokens(context_parts, model=conv_live.model))
 
             # --- Phase 1: Intent Validation ---
-            GLib.idle_add(
+            self._post_agent_ui(
                 self._add_agent_progress_message,
                 conversation_id,
                 f"Phase 1: Validating intent for task {iteration_num}...",
-                priority=GLib.PRIORITY_DEFAULT,
             )
             validation_response = await self._phase1_intent_validation(
                 conversation=conv_live,
@@ -2100,46 +3284,41 @@ class MainWindow(Gtk.ApplicationWindow):
             )
 
             if not validation_response.get("ok"):
-                GLib.idle_add(
+                self._post_agent_ui(
                     self._add_agent_progress_message,
                     conversation_id,
                     f"Intent Validation failed for Task {iteration_num}: {validation_response.get('error')}",
-                    priority=GLib.PRIORITY_DEFAULT,
                 )
                 
 
             validation_result = validation_response.get("result", {})
-            GLib.idle_add(
+            self._post_agent_ui(
                 self._add_assistant_message_and_save,
-                f"[Agent - Phase 1 Validation]\n{json.dumps(validation_result, indent=2)}",
+                f"[Agent - Phase 1 Validation]\n{_json_dumps_pretty(validation_result)}",
                 conversation_id,
                 [],
                 None,
-                priority=GLib.PRIORITY_DEFAULT,
             )
 
             if not validation_result.get("proceed_with_task"):
-                GLib.idle_add(
+                self._post_agent_ui(
                     self._add_agent_progress_message,
                     conversation_id,
                     f"Intent Validation for Task {iteration_num} advised NOT to proceed: {validation_result.get('reason_for_decision')}. Agent run stopped.",
-                    priority=GLib.PRIORITY_DEFAULT,
                 )
-                GLib.idle_add(
+                self._post_agent_ui(
                     self._set_task_status_and_save,
                     conversation_id,
                     task_index,
                     "uncompleted", # Mark as uncompleted for reconsideration
-                    priority=GLib.PRIORITY_DEFAULT,
                 )
                 
 
             # --- Phase 2: Design Draft ---
-            GLib.idle_add(
+            self._post_agent_ui(
                 self._add_agent_progress_message,
                 conversation_id,
                 f"Phase 2: Drafting design for task {iteration_num}...",
-                priority=GLib.PRIORITY_DEFAULT,
             )
             design_response = await self._phase2_design_draft(
                 conversation=conv_live,
@@ -2156,22 +3335,20 @@ class MainWindow(Gtk.ApplicationWindow):
             )
 
             if not design_response.get("ok"):
-                GLib.idle_add(
+                self._post_agent_ui(
                     self._add_agent_progress_message,
                     conversation_id,
                     f"Design Draft failed for Task {iteration_num}: {design_response.get('error')}",
-                    priority=GLib.PRIORITY_DEFAULT,
                 )
                 return # Stop agent run on design failure
 
             design_draft_content = design_response.get("result", "No design draft provided.")
-            GLib.idle_add(
+            self._post_agent_ui(
                 self._add_assistant_message_and_save,
                 f"[Agent - Phase 2 Design Draft]\n{design_draft_content}",
                 conversation_id,
                 [],
                 None,
-                priority=GLib.PRIORITY_DEFAULT,
             )
             
             # --- Phase 3: Implementation ---
@@ -2183,11 +3360,10 @@ class MainWindow(Gtk.ApplicationWindow):
             while implementation_attempts < max_implementation_attempts:
                 implementation_attempts += 1
 
-                GLib.idle_add(
+                self._post_agent_ui(
                     self._add_agent_progress_message,
                     conversation_id,
                     f"Phase 3: Implementing task {iteration_num} (Attempt {implementation_attempts}/{max_implementation_attempts})...",
-                    priority=GLib.PRIORITY_DEFAULT,
                 )
 
                 # Dynamically adjust instruction based on previous compilation failure
@@ -2208,7 +3384,7 @@ class MainWindow(Gtk.ApplicationWindow):
                 temp_conv = Conversation(
                     id=conv_live.id,
                     title=conv_live.title,
-                    messages=list(conv_live.messages),
+                    messages=_MessageView(self._agent_context_window(conv_live)),
                     created_at=conv_live.created_at,
                     updated_at=conv_live.updated_at,
                     model=conv_live.model,
@@ -2221,9 +3397,12 @@ class MainWindow(Gtk.ApplicationWindow):
                 )
                 temp_conv.add_message(
                     Message(
-                        id=str(uuid.uuid4()),
+                        id=self._next_id(),
                         role=MessageRole.USER,
                         content=current_instruction, # Use the dynamically adjusted instruction
+                        tokens=global_context_tokens + count_text_tokens(
+                            current_instruction[len(global_context):], model=conv_live.model
+                        ),
                     )
                 )
 
@@ -2242,47 +3421,42 @@ class MainWindow(Gtk.ApplicationWindow):
                     f"Phase 3 implementation attempt {implementation_attempts} completed for task {iteration_num}."
                 )
 
-                if tool_events:
-                    for event in tool_events:
-                        GLib.idle_add(
-                            self._add_agent_activity_log,
-                            conversation_id,
-                            event,
-                            iteration_num,
-                            priority=GLib.PRIORITY_DEFAULT,
-                        )
-
-                GLib.idle_add(
+                # Activity rows and the task summary land in the same flush.
+                phase_updates = [
+                    (self._add_agent_activity_log, (conversation_id, event, iteration_num))
+                    for event in tool_events or []
+                ]
+                phase_updates.append((
                     self._add_assistant_message_and_save,
-                    response_text or f"[Agent] Task {iteration_num} completed with no summary.",
-                    conversation_id,
-                    tool_events,
-                    None,
-                    agent_stream_id,
-                    priority=GLib.PRIORITY_DEFAULT,
-                )
+                    (
+                        response_text or f"[Agent] Task {iteration_num} completed with no summary.",
+                        conversation_id,
+                        tool_events,
+                        None,
+                        agent_stream_id,
+                    ),
+                ))
+                self._post_agent_ui_batch(phase_updates)
                 
                 if self._is_agent_stop_requested(conversation_id) or self.api_client.is_cancel_generation_requested():
-                    GLib.idle_add(
+                    self._post_agent_ui(
                         self._add_agent_progress_message,
                         conversation_id,
                         "Agent run paused by user. Resume in Agent mode to continue.",
-                        priority=GLib.PRIORITY_DEFAULT,
                     )
                     return
 
                 compile_ok, compile_detail = await self._run_compile_check(project_dir)
                 if not compile_ok:
                     last_compile_detail = compile_detail # Store the detail for the next iteration
-                    GLib.idle_add(
+                    self._post_agent_ui(
                         self._add_agent_progress_message,
                         conversation_id,
                         f"Compile check failed. Output:\n{compile_detail}",
-                        priority=GLib.PRIORITY_DEFAULT,
                     )
                     conv_live.add_message(
                         Message(
-                            id=str(uuid.uuid4()),
+                            id=self._next_id(),
                             role=MessageRole.SYSTEM,
                             content=f"Compilation failed with the following output:\n{compile_detail}",
                         )
@@ -2293,11 +3467,10 @@ class MainWindow(Gtk.ApplicationWindow):
                     break
             
             if not compile_ok:
-                GLib.idle_add(
+                self._post_agent_ui(
                     self._add_agent_progress_message,
                     conversation_id,
                     f"Agent failed to fix compilation errors for task {iteration_num} after {max_implementation_attempts} attempts. Agent stopped.",
-                    priority=GLib.PRIORITY_DEFAULT,
                 )
                 return
 
@@ -2305,11 +3478,10 @@ class MainWindow(Gtk.ApplicationWindow):
 
             # --- Phase 4: Post-Implementation Critique ---
             if self.tools_bar.get_critique_enabled():
-                GLib.idle_add(
+                self._post_agent_ui(
                     self._add_agent_progress_message,
                     conversation_id,
                     f"Phase 4: Critiquing implementation for task {iteration_num}...",
-                    priority=GLib.PRIORITY_DEFAULT,
                 )
                 implementation_summary = response_text or ""
                 critique_response = await self._phase4_post_implementation_critique(
@@ -2328,22 +3500,20 @@ class MainWindow(Gtk.ApplicationWindow):
                 )
 
                 if not critique_response.get("ok"):
-                    GLib.idle_add(
+                    self._post_agent_ui(
                         self._add_agent_progress_message,
                         conversation_id,
                         f"Post-Implementation Critique failed for Task {iteration_num}: {critique_response.get('error')}",
-                        priority=GLib.PRIORITY_DEFAULT,
                     )
                     return # Stop agent run on critique failure
 
                 critique_result = critique_response.get("result", {})
-                GLib.idle_add(
+                self._post_agent_ui(
                     self._add_assistant_message_and_save,
-                    f"[Agent - Phase 4 Critique]\n{json.dumps(critique_result, indent=2)}",
+                    f"[Agent - Phase 4 Critique]\n{critique_response.get('text') or _json_dumps_pretty(critique_result)}",
                     conversation_id,
                     [],
                     None,
-                    priority=GLib.PRIORITY_DEFAULT,
                 )
 
                 if critique_result.get("flaws_found"):
@@ -2353,50 +3523,45 @@ class MainWindow(Gtk.ApplicationWindow):
                         for new_task_desc in new_tasks:
                             current_ai_tasks.append({"text": new_task_desc, "done": False, "status": "uncompleted"})
                         conv_live.ai_tasks = current_ai_tasks
-                        self._save_conversations()
-                        self.sidebar.set_ai_tasks(conversation_id, current_ai_tasks)
-                        GLib.idle_add(
+                        conv_live.mark_tasks_changed()
+                        # Sidebar and save must run on the GTK thread.
+                        self._post_agent_ui(self._sync_agent_tasks_and_save, conversation_id)
+                        self._post_agent_ui(
                             self._add_agent_progress_message,
                             conversation_id,
                             f"Critique found flaws. Added {len(new_tasks)} new tasks.",
-                            priority=GLib.PRIORITY_DEFAULT,
                         )
                     else:
-                        GLib.idle_add(
+                        self._post_agent_ui(
                             self._add_agent_progress_message,
                             conversation_id,
                             "Critique found flaws but no new tasks were suggested.",
-                            priority=GLib.PRIORITY_DEFAULT,
                         )
-                    GLib.idle_add(
+                    self._post_agent_ui(
                         self._set_task_status_and_save,
                         conversation_id,
                         task_index,
                         "uncompleted", # Mark as uncompleted for reconsideration
-                        priority=GLib.PRIORITY_DEFAULT,
                     )
             # --- End of Phase 4 ---
 
 
-            GLib.idle_add(
+            self._post_agent_ui(
                 self._add_agent_progress_message,
                 conversation_id,
                 f"Task {iteration_num} accepted. Marking as completed.",
-                priority=GLib.PRIORITY_DEFAULT,
             )
-            GLib.idle_add(
+            self._post_agent_ui(
                 self._set_task_status_and_save,
                 conversation_id,
                 task_index,
                 "completed",
-                priority=GLib.PRIORITY_DEFAULT,
             )
 
-        GLib.idle_add(
+        self._post_agent_ui(
             self._add_agent_progress_message,
             conversation_id,
             "All pending tasks completed.",
-            priority=GLib.PRIORITY_DEFAULT,
         )
 
     def _add_agent_activity_log(
@@ -2427,161 +3592,14 @@ class MainWindow(Gtk.ApplicationWindow):
         """Helper to get an icon for a tool event."""
         if status == "error":
             return "❌"
-        if detail_type == "syntax_check_all":
-            return "🧩"
-        if detail_type == "syntax_check":
-            return "🧪"
-        if detail_type == "file_edit":
-            return "📝"
-        elif detail_type == "file_chunk_read":
-            return "📚"
-        elif detail_type == "file_write":
-            return "💾"
-        elif detail_type == "file_read":
-            return "📖"
-        elif detail_type == "file_delete":
-            return "🗑️"
-        elif detail_type == "file_listing":
-            return "📂"
-        elif detail_type == "command_execution":
-            return "▶️"
-        elif detail_type == "text_search":
-            return "🔎"
-        return "🛠️" # Default tool icon
-
-    def _format_agent_tool_output(self, task_num: int, tool_events: list[dict]) -> str:
-        """Build readable per-task tool execution output for chat."""
-        lines = []
-        for ev in tool_events or []:
-            if not isinstance(ev, dict):
-                continue
-            name = str(ev.get("name", "tool"))
-            status = str(ev.get("status", "unknown"))
-            details = ev.get("details", {})
-            error_message = ""
-            if status == "error":
-                error_message = str(details.get("message", "An unknown error occurred."))
-                if "exception" in details:
-                    error_message += f" ({details['exception']})"
-            
-            icon = self._get_tool_event_icon(details.get("type", ""), status)
-            lines.append(f"{icon} ### Tool: `{name}` (Status: {status.upper()})")
-            if error_message:
-                lines.append(f"**Error:** {error_message}")
-            lines.append(self._format_tool_event_details(name, details))
-
-        return "\n".join(lines)
+        return _TOOL_EVENT_ICONS.get(detail_type, "🛠️")
 
     def _format_tool_event_details(self, tool_name: str, details: dict) -> str:
         """Format specific tool event details into a human-readable string."""
-        detail_type = details.get("type")
-        
-        if detail_type == "file_edit":
-            path = details.get("path", "unknown file")
-            diff = details.get("diff", "No diff available.")
-            return f"**File Edited:** `{path}`\n```diff\n{diff}\n```"
-        
-        elif detail_type == "file_write":
-            path = details.get("path", "unknown file")
-            bytes_written = details.get("bytes_written", 0)
-            diff = details.get("diff", "")
-            if diff:
-                return f"**File Written:** `{path}` ({bytes_written} bytes)\n```diff\n{diff}\n```"
-            content_preview = details.get("content_preview", "")
-            preview_line = f"\nContent Preview:\n```\n{content_preview}\n```" if content_preview else ""
-            return f"**File Written:** `{path}` ({bytes_written} bytes){preview_line}"
-        
-        elif detail_type == "file_read":
-            path = details.get("path", "unknown file")
-            content_preview = details.get("content_preview", "")
-            preview_line = f"\nContent Preview:\n```\n{content_preview}\n```" if content_preview else ""
-            return f"**File Read:** `{path}`{preview_line}"
-
-        elif detail_type == "file_chunk_read":
-            path = details.get("path", "unknown file")
-            ws = details.get("window_start_line")
-            we = details.get("window_end_line")
-            ts = details.get("target_start_line")
-            te = details.get("target_end_line")
-            content_preview = details.get("content_preview", "")
-            preview_line = f"\nContent Preview:\n```\n{content_preview}\n```" if content_preview else ""
-            return (
-                f"**File Chunk Read:** `{path}` "
-                f"(target: {ts}-{te}, window: {ws}-{we})"
-                f"{preview_line}"
-            )
-
-        elif detail_type == "file_delete":
-            path = details.get("path", "unknown file")
-            return f"**File Deleted:** `{path}`"
-        
-        elif detail_type == "file_listing":
-            path = details.get("path", ".")
-            entries = details.get("entries", [])
-            entries_list = "\n".join([f"- `{e}`" for e in entries[:10]]) # Limit to 10 for brevity
-            if len(entries) > 10:
-                entries_list += f"\n- ... ({len(entries) - 10} more)"
-            return f"**Listed Directory:** `{path}`\nFiles/Dirs:\n{entries_list}"
-        
-        elif detail_type == "command_execution":
-            command = details.get("command", "unknown command")
-            stdout = details.get("stdout", "").strip()
-            stderr = details.get("stderr", "").strip()
-            output_lines = []
-            if stdout:
-                output_lines.append(f"**Stdout:**\n```bash\n{stdout}\n```")
-            if stderr:
-                output_lines.append(f"**Stderr:**\n```bash\n{stderr}\n```")
-            return f"**Command Executed:** `{command}`\n" + "\n".join(output_lines)
-        
-        elif detail_type == "text_search":
-            pattern = details.get("pattern", "")
-            path = details.get("path", "")
-            matches = details.get("matches", [])
-            matches_list = "\n".join([f"- `{m}`" for m in matches[:10]])
-            if len(matches) > 10:
-                matches_list += f"\n- ... ({len(matches) - 10} more)"
-            return f"**Searched for:** `{pattern}` in `{path}`\nMatches:\n{matches_list}"
-
-        elif detail_type == "syntax_check":
-            path = details.get("path", "unknown file")
-            language = details.get("language", "unknown")
-            checker = details.get("checker", "checker")
-            summary = details.get("summary", "")
-            detail = details.get("detail", "")
-            diagnostics = details.get("diagnostics", [])
-            diag_lines = []
-            for d in diagnostics[:8]:
-                if not isinstance(d, dict):
-                    continue
-                line = d.get("line")
-                col = d.get("column")
-                loc = f"{line}:{col}" if line and col else (f"{line}" if line else "?")
-                msg = str(d.get("message", ""))
-                diag_lines.append(f"- `{loc}` {msg}")
-            diags = ("\nDiagnostics:\n" + "\n".join(diag_lines)) if diag_lines else ""
-            detail_block = f"\nOutput:\n```text\n{detail}\n```" if detail else ""
-            return f"**Syntax Check:** `{path}` ({language}, {checker})\n{summary}{diags}{detail_block}"
-
-        elif detail_type == "syntax_check_all":
-            path = details.get("path", ".")
-            summary = details.get("summary", "")
-            checked = details.get("checked_files", 0)
-            passed = details.get("passed_files", 0)
-            fixed = details.get("fixed_files", 0)
-            failed = details.get("failed_files", 0)
-            return (
-                f"**Check All Syntax:** `{path}`\n"
-                f"{summary}\n"
-                f"Checked: {checked}, Passed: {passed}, Fixed: {fixed}, Failed: {failed}"
-            )
-        
-        # Fallback for generic or unknown tool event types
-        result_content = json.dumps(details.get("result", {}), indent=2, ensure_ascii=False)
-        if result_content != "{}":
-            return f"**Result:**\n```json\n{result_content}\n```"
-        
-        return "No specific details available."
+        handler = _TOOL_EVENT_FORMATTERS.get(details.get("type"))
+        if handler is not None:
+            return handler(details)
+        return _fmt_tool_event_fallback(details)
 
     def _record_agent_memory_layers_checkpoint(
         self,
@@ -2625,8 +3643,8 @@ class MainWindow(Gtk.ApplicationWindow):
             index_data = {}
             if os.path.exists(index_path):
                 try:
-                    with open(index_path, "r", encoding="utf-8") as f:
-                        loaded = json.load(f)
+                    with open(index_path, "rb") as f:
+                        loaded = _json_loads(f.read())
                     if isinstance(loaded, dict):
                         index_data = loaded
                 except Exception:
@@ -2648,8 +3666,8 @@ class MainWindow(Gtk.ApplicationWindow):
             memory_meta["last_checkpoint_at"] = ts
             memory_meta["last_prompt_counter"] = int(prompt_counter)
             index_data["__agent_memory__"] = memory_meta
-            with open(index_path, "w", encoding="utf-8") as f:
-                json.dump(index_data, f, indent=2, ensure_ascii=False)
+            with open(index_path, "wb") as f:
+                f.write(_json_dumps_pretty_bytes(index_data))
 
             # 4) Refresh project map layer
             try:
@@ -2661,7 +3679,7 @@ class MainWindow(Gtk.ApplicationWindow):
                 self._add_agent_progress_message,
                 conversation_id,
                 f"Checkpointed memory layers at prompt #{prompt_counter}.",
-                priority=GLib.PRIORITY_DEFAULT,
+                priority=GLib.PRIORITY_DEFAULT_IDLE,
             )
         except Exception as e:
             logger.warning("Agent memory checkpoint failed: %s", e)
@@ -2669,6 +3687,7 @@ class MainWindow(Gtk.ApplicationWindow):
     def _on_destroy(self, _widget) -> None:
         """Called when the main window is destroyed."""
         logger.debug("MainWindow destroyed. Initiating cleanup.")
+        self._flush_conversations()
         # Schedule the async cleanup on the asyncio thread's loop
         if getattr(self, "asyncio_thread", None) and getattr(self.asyncio_thread, "loop", None) and self.asyncio_thread.loop.is_running():
             asyncio.run_coroutine_threadsafe(
@@ -2715,6 +3734,86 @@ class MainWindow(Gtk.ApplicationWindow):
         storage.save_settings(self.settings)
         logger.debug("Auto-tool approval setting updated to: %s and saved.", enabled)
 
+    def _next_id(self) -> str:
+        """Return a fresh random (version 4) UUID string.
+
+        Ids are generated 64 at a time from a single os.urandom() call;
+        deque.popleft() is atomic, so agent threads can share the pool.
+        """
+        try:
+            return self._id_pool.popleft()
+        except IndexError:
+            pass
+        raw = os.urandom(16 * 64)
+        self._id_pool.extend(
+            str(uuid.UUID(bytes=raw[i:i + 16], version=4)) for i in range(16, len(raw), 16)
+        )
+        return str(uuid.UUID(bytes=raw[:16], version=4))
+
+    def _post_agent_ui(self, callback: Callable, *args) -> None:
+        """Queue a GTK update from an agent run, preserving order.
+
+        Only the first update after the queue drains schedules an idle
+        callback; everything queued before it runs is applied in one pass.
+        """
+        self._post_agent_ui_batch(((callback, args),))
+
+    def _post_agent_ui_batch(self, updates) -> None:
+        """Queue several ``(callback, args)`` agent updates under one lock.
+
+        Progress lines and activity logs alone are flushed at idle priority
+        so they never delay redraws; any other update (messages, task status)
+        promotes the pending flush to default priority.
+        """
+        updates = tuple(updates)
+        if not updates:
+            return
+        chatty = (self._add_agent_progress_message, self._add_agent_activity_log)
+        priority = GLib.PRIORITY_DEFAULT_IDLE
+        if any(callback not in chatty for callback, _args in updates):
+            priority = GLib.PRIORITY_DEFAULT
+        with self._agent_ui_lock:
+            self._agent_ui_queue.extend(updates)
+            scheduled = self._agent_ui_flush_priority
+            if scheduled is not None and scheduled <= priority:
+                return
+            self._agent_ui_flush_priority = priority
+        # A superseded lower-priority flush later finds the queue empty.
+        GLib.idle_add(self._flush_agent_ui_queue, priority=priority)
+
+    def _flush_agent_ui_queue(self) -> bool:
+        """Apply queued agent updates, merging consecutive progress lines."""
+        with self._agent_ui_lock:
+            pending = list(self._agent_ui_queue)
+            self._agent_ui_queue.clear()
+            self._agent_ui_flush_priority = None
+        progress_conv_id = None
+        progress_lines: list[str] = []
+        # Appends to the running agent bubble only re-render it once per flush.
+        self._agent_bubble_refresh = {}
+        try:
+            for callback, args in pending:
+                if callback == self._add_agent_progress_message:
+                    if progress_lines and args[0] != progress_conv_id:
+                        self._add_agent_progress_message(progress_conv_id, "\n[Agent] ".join(progress_lines))
+                        progress_lines = []
+                    progress_conv_id = args[0]
+                    progress_lines.append(str(args[1]).strip())
+                    continue
+                if progress_lines:
+                    self._add_agent_progress_message(progress_conv_id, "\n[Agent] ".join(progress_lines))
+                    progress_lines = []
+                callback(*args)
+            if progress_lines:
+                self._add_agent_progress_message(progress_conv_id, "\n[Agent] ".join(progress_lines))
+        finally:
+            refresh = self._agent_bubble_refresh
+            self._agent_bubble_refresh = None
+            for conversation_id, msg in refresh.values():
+                if self.current_conversation and self.current_conversation.id == conversation_id:
+                    self.chat_area.replace_message_bubble(msg.id, msg, animate=True)
+        return False
+
     def _add_agent_progress_message(
             self, conversation_id: str, text: str) -> bool:
         """Add a progress message for agent workflow."""
@@ -2731,17 +3830,33 @@ class MainWindow(Gtk.ApplicationWindow):
         conv = self.conversations.get(conversation_id)
         if not conv or not isinstance(conv.ai_tasks, list):
             return False
-        normalized = self._normalize_task_list(conv.ai_tasks)
-        if task_index < 0 or task_index >= len(normalized):
-            return False
         final_status = str(status or "").strip().lower()
         if final_status not in ("uncompleted", "in_progress", "completed"):
             final_status = "uncompleted"
+        self._normalized_conversation_tasks(conv)
+        # Already normalized: update the one entry instead of rebuilding the list.
+        if conv.update_task_in_place(
+                task_index, status=final_status, done=(final_status == "completed")):
+            self.sidebar.refresh_ai_tasks(conversation_id)
+            self._schedule_save(conversation_id)
+            return False
+        normalized = self._normalize_task_list(conv.ai_tasks)
+        if task_index < 0 or task_index >= len(normalized):
+            return False
         normalized[task_index]["status"] = final_status
         normalized[task_index]["done"] = (final_status == "completed")
         conv.ai_tasks = normalized
         self.sidebar.set_ai_tasks(conversation_id, normalized)
-        self._save_conversations()
+        self._schedule_save(conversation_id)
+        return False
+
+    def _sync_agent_tasks_and_save(self, conversation_id: str) -> bool:
+        """Show an agent run's updated task list and schedule a save."""
+        conv = self.conversations.get(conversation_id)
+        if conv is None:
+            return False
+        self.sidebar.set_ai_tasks(conversation_id, conv.ai_tasks)
+        self._schedule_save(conversation_id)
         return False
 
     def _hide_typing_indicator_for_conversation(
@@ -2782,22 +3897,17 @@ class MainWindow(Gtk.ApplicationWindow):
         stream_id: str,
         delta_text: str,
     ) -> None:
-        """Route agent-mode text deltas to the same streaming UI path."""
+        """Route agent-mode text deltas to the same streaming UI path.
+
+        Deltas share the agent UI queue so streamed output never overtakes
+        progress lines queued before it.
+        """
         if not delta_text:
             return
-        GLib.idle_add(
-            self._begin_stream_for_conversation,
-            conversation_id,
-            stream_id,
-            priority=GLib.PRIORITY_DEFAULT,
-        )
-        GLib.idle_add(
-            self._append_stream_delta_for_conversation,
-            conversation_id,
-            stream_id,
-            delta_text,
-            priority=GLib.PRIORITY_DEFAULT,
-        )
+        self._post_agent_ui_batch((
+            (self._begin_stream_for_conversation, (conversation_id, stream_id)),
+            (self._append_stream_delta_for_conversation, (conversation_id, stream_id, delta_text)),
+        ))
 
     def _end_stream_for_conversation(
         self,
@@ -2870,7 +3980,11 @@ class MainWindow(Gtk.ApplicationWindow):
         if fut is None:
             return
         try:
-            fut.cancel()
+            if isinstance(fut, asyncio.Future):
+                # asyncio tasks must be cancelled from their own loop.
+                fut.get_loop().call_soon_threadsafe(fut.cancel)
+            else:
+                fut.cancel()
         except Exception as e:
             logger.debug("Failed to cancel active generation future: %s", e)
 
@@ -2881,16 +3995,17 @@ class MainWindow(Gtk.ApplicationWindow):
                 self._agent_running_conversations.add(conversation_id)
             else:
                 self._agent_running_conversations.discard(conversation_id)
+            self._agent_running_snapshot = frozenset(self._agent_running_conversations)
 
     def _is_agent_running(self, conversation_id: str) -> bool:
         """Check whether an agent run is currently active for conversation."""
-        with self._agent_state_lock:
-            return conversation_id in self._agent_running_conversations
+        return conversation_id in self._agent_running_snapshot
 
     def _request_agent_stop(self, conversation_id: str, reason: str = "") -> None:
         """Request graceful stop for running agent in a conversation."""
         with self._agent_state_lock:
             self._agent_stop_requests.add(conversation_id)
+            self._agent_stop_snapshot = frozenset(self._agent_stop_requests)
         if reason:
             GLib.idle_add(
                 self._add_agent_progress_message,
@@ -2903,11 +4018,11 @@ class MainWindow(Gtk.ApplicationWindow):
         """Clear stop request flag for a conversation."""
         with self._agent_state_lock:
             self._agent_stop_requests.discard(conversation_id)
+            self._agent_stop_snapshot = frozenset(self._agent_stop_requests)
 
     def _is_agent_stop_requested(self, conversation_id: str) -> bool:
         """Check whether a stop was requested for this conversation."""
-        with self._agent_state_lock:
-            return conversation_id in self._agent_stop_requests
+        return conversation_id in self._agent_stop_snapshot
 
     def _open_project_directory_after_agent_complete(
             self, conversation_id: str) -> bool:
@@ -2925,16 +4040,8 @@ class MainWindow(Gtk.ApplicationWindow):
             return False
 
         # Open the directory in the file browser
-        import subprocess
-        import sys
-
         try:
-            if sys.platform == "darwin":  # macOS
-                subprocess.Popen(["open", project_dir])
-            elif sys.platform == "win32":  # Windows
-                subprocess.Popen(["explorer", project_dir])
-            else:  # Linux and other Unix-like systems
-                subprocess.Popen(["xdg-open", project_dir])
+            subprocess.Popen([*_OPEN_DIR_CMD, project_dir])
 
             # Add a message indicating the directory was opened
             self._add_agent_progress_message(
@@ -2946,11 +4053,103 @@ class MainWindow(Gtk.ApplicationWindow):
 
         return False
 
+    @staticmethod
+    def _agent_context_window(conversation: Conversation) -> list[Message]:
+        """Return the opening messages plus the most recent ones for an agent prompt.
+
+        Long agent runs accumulate hundreds of progress and tool messages;
+        the API client would trim most of them by token budget anyway, after
+        converting every one of them.
+
+        UI-only messages are never sent to the model, so they do not count
+        toward (or fill) the head and tail. The result is always a new list,
+        so later in-place edits of the live history (delete, re-push) cannot
+        shift a prompt that is being built.
+        """
+        messages = conversation.messages
+        is_ui_only = conversation._is_ui_only_message
+        head_left = C.AGENT_CONTEXT_HEAD_MESSAGES
+        head_end = 0
+        while head_end < len(messages) and head_left > 0:
+            if not is_ui_only(messages[head_end]):
+                head_left -= 1
+            head_end += 1
+        tail_left = C.AGENT_CONTEXT_MAX_MESSAGES
+        tail_start = len(messages)
+        while tail_start > head_end and tail_left > 0:
+            tail_start -= 1
+            if not is_ui_only(messages[tail_start]):
+                tail_left -= 1
+        return [
+            msg for msg in itertools.chain(messages[:head_end], messages[tail_start:])
+            if not is_ui_only(msg)
+        ]
+
+    def _agent_task_context(self, conversation: Conversation) -> str:
+        """Return the rendered agent task block, rebuilt only after the tasks change.
+
+        Agent prompts are built on throwaway copies that share the live
+        conversation's id and hold a fresh copy of its tasks, so the cache
+        follows the live conversation's task list and revision. Runs on the
+        asyncio thread, so it only reads the normalized-task cache.
+        """
+        source = self.conversations.get(conversation.id, conversation)
+        source_tasks = source.ai_tasks
+        stamp = (len(source_tasks) if isinstance(source_tasks, list) else -1, source._ai_tasks_rev)
+        cached = self._task_context_cache.get(source.id)
+        if cached is not None and cached[0] is source_tasks and cached[1:3] == stamp:
+            return cached[3]
+        rendered = self._render_agent_task_context(
+            self._normalized_conversation_tasks(source, populate=False))
+        self._task_context_cache[source.id] = (source_tasks, *stamp, rendered)
+        return rendered
+
+    @staticmethod
+    def _render_agent_task_context(tasks: list[dict]) -> str:
+        """Render saved tasks as a numbered checklist for the agent prompt."""
+        task_lines = []
+        for idx, task in enumerate(tasks or [], start=1):
+            if not isinstance(task, dict):
+                continue
+            txt = str(task.get("text", "")).strip()
+            if not txt:
+                continue
+            done = bool(task.get("done", False))
+            task_lines.append(f"{idx}. [{'x' if done else ' '}] {txt}")
+        return "\n".join(task_lines) if task_lines else "(no saved tasks)"
+
     def _build_mode_system_prompt(
-            self, mode: str, base_prompt: str, tasks: list[dict]) -> str:
-        """Build an augmented system prompt according to selected mode."""
+            self, mode: str, base_prompt: str, tasks: list[dict],
+            task_context: Optional[str] = None) -> str:
+        """Build an augmented system prompt according to selected mode (memoized).
+
+        Agent mode callers pass the pre-rendered ``task_context`` so the
+        cache key does not have to walk the task list on every call.
+        """
+        effective_root = self._get_workspace_root() if mode == "ask" else ""
+        if task_context is not None:
+            tasks_key = task_context
+        else:
+            tasks_key = tuple(
+                (str(t.get("text", "")), str(t.get("status", "")), bool(t.get("done", False)))
+                if isinstance(t, dict) else None
+                for t in tasks or []
+            )
+        key = (str(mode), base_prompt, effective_root, tasks_key)
+        cached = self._mode_prompt_cache.get(key)
+        if cached is None:
+            cached = self._render_mode_system_prompt(
+                mode, base_prompt, tasks, effective_root, task_context)
+            if len(self._mode_prompt_cache) >= 32:
+                self._mode_prompt_cache.pop(next(iter(self._mode_prompt_cache)))
+            self._mode_prompt_cache[key] = cached
+        return cached
+
+    def _render_mode_system_prompt(
+            self, mode: str, base_prompt: str, tasks: list[dict], effective_root: str,
+            task_context: Optional[str] = None) -> str:
+        """Render the augmented system prompt for a mode."""
         base = (base_prompt or "You are a helpful AI assistant.").strip()
-        effective_root = self._get_workspace_root()
         if mode == "plan":
             task_context = self._render_ordered_tasks(tasks)
             return (
@@ -2979,17 +4178,8 @@ class MainWindow(Gtk.ApplicationWindow):
                 "Do not include extra keys. Keep each field concise and actionable."
             )
         if mode == "agent":
-            task_lines = []
-            for idx, task in enumerate(tasks or [], start=1):
-                if not isinstance(task, dict):
-                    continue
-                txt = str(task.get("text", "")).strip()
-                if not txt:
-                    continue
-                done = bool(task.get("done", False))
-                task_lines.append(f"{idx}. [{'x' if done else ' '}] {txt}")
-            task_context = "\n".join(
-                task_lines) if task_lines else "(no saved tasks)"
+            if task_context is None:
+                task_context = self._render_agent_task_context(tasks)
             return (
                 f"{base}\n\n"
                 "You are in AGENT mode.\n"
@@ -3031,13 +4221,22 @@ class MainWindow(Gtk.ApplicationWindow):
         """Extract task lines from a planning response."""
         text = response_text or ""
         tasks: list[dict] = []
+        seen: set[str] = set()
+
+        def add_task(task_text: str) -> bool:
+            """Append a case-insensitively new task; False once the list is full."""
+            key = task_text.lower()
+            if key not in seen:
+                seen.add(key)
+                tasks.append(
+                    {"text": task_text, "done": False, "status": "uncompleted"})
+            return len(tasks) < 24
 
         # Preferred format: strict JSON with "steps".
         json_payload = self._parse_json_object_from_text(text)
         if isinstance(json_payload, dict):
             steps = json_payload.get("steps")
             if isinstance(steps, list):
-                seen = set()
                 for step in steps:
                     if not isinstance(step, dict):
                         continue
@@ -3054,80 +4253,51 @@ class MainWindow(Gtk.ApplicationWindow):
                         parts.append(f"Goal: {goal}")
                     if expected:
                         parts.append(f"Expected: {expected}")
-                    task_text = " | ".join(parts).strip()
-                    key = task_text.lower()
-                    if key in seen:
-                        continue
-                    seen.add(key)
-                    tasks.append(
-                        {"text": task_text, "done": False, "status": "uncompleted"})
+                    if not add_task(" | ".join(parts).strip()):
+                        break
                 if tasks:
-                    return tasks[:24]
+                    return tasks
 
-        block_match = re.search(
-            r"<ai_tasks>(.*?)</ai_tasks>",
-            text,
-            flags=re.IGNORECASE | re.DOTALL)
+        block_match = _AI_TASKS_BLOCK_RE.search(text)
         candidate = block_match.group(1) if block_match else text
 
-        seen = set()
         for raw_line in candidate.splitlines():
             line = raw_line.strip()
             if not line:
                 continue
-            # Markdown checkbox
-            m = re.match(r"^[-*]\s*\[(?: |x|X)\]\s+(.+)$", line)
-            if m:
-                task_text = m.group(1).strip()
-                key = task_text.lower()
-                if task_text and key not in seen:
-                    seen.add(key)
-                    tasks.append(
-                        {"text": task_text, "done": False, "status": "uncompleted"})
+            # Markdown checkbox, then numbered/bulleted fallback
+            m = _CHECKBOX_RE.match(line) or _BULLET_RE.match(line)
+            if not m:
                 continue
-            # Numbered/bulleted fallback
-            m2 = re.match(r"^(?:\d+[.)]|[-*])\s+(.+)$", line)
-            if m2:
-                task_text = m2.group(1).strip()
-                key = task_text.lower()
-                if task_text and key not in seen:
-                    seen.add(key)
-                    tasks.append(
-                        {"text": task_text, "done": False, "status": "uncompleted"})
-
-        return tasks[:24]
+            task_text = m.group(1).strip()
+            if task_text and not add_task(task_text):
+                break
+
+        return tasks
 
     def _parse_json_object_from_text(self, text: str) -> Optional[dict]:
         """Parse the first JSON object from text, including fenced blocks."""
         raw = (text or "").strip()
         if not raw:
             return None
-        try:
-            parsed = json.loads(raw)
-            return parsed if isinstance(parsed, dict) else None
-        except Exception:
-            pass
-
-        fenced = re.search(
-            r"```(?:json)?\s*(\{.*?\})\s*```",
-            raw,
-            flags=re.IGNORECASE | re.DOTALL)
-        if fenced:
+        # Only a body that opens like JSON is worth a full parse attempt;
+        # prose-wrapped answers go straight to the fence/brace fallbacks.
+        if raw[0] in "{[":
             try:
-                parsed = json.loads(fenced.group(1))
+                parsed = _json_loads_text(raw)
                 return parsed if isinstance(parsed, dict) else None
             except Exception:
                 pass
 
-        start = raw.find("{")
-        end = raw.rfind("}")
-        if start != -1 and end != -1 and end > start:
+        fenced = _JSON_FENCE_RE.search(raw)
+        if fenced:
             try:
-                parsed = json.loads(raw[start:end + 1])
+                parsed = _json_loads_text(fenced.group(1))
                 return parsed if isinstance(parsed, dict) else None
             except Exception:
-                return None
-        return None
+                pass
+
+        return _extract_json_object(raw)
 
     async def _plan_mode_review_for_missing_info(
         self,
@@ -3163,7 +4333,7 @@ class MainWindow(Gtk.ApplicationWindow):
             temp_conv = Conversation(
                 id=conversation.id,
                 title=conversation.title,
-                messages=list(conversation.messages),
+                messages=_MessageView(list(conversation.messages)),
                 created_at=conversation.created_at,
                 updated_at=conversation.updated_at,
                 model=conversation.model,
@@ -3177,35 +4347,51 @@ class MainWindow(Gtk.ApplicationWindow):
             )
             temp_conv.add_message(
                 Message(
-                    id=str(uuid.uuid4()),
+                    id=self._next_id(),
                     role=MessageRole.ASSISTANT,
                     content=plan_response,
                 )
             )
             temp_conv.add_message(
                 Message(
-                    id=str(uuid.uuid4()),
+                    id=self._next_id(),
                     role=MessageRole.USER,
                     content=review_prompt,
                 )
             )
 
-            review_settings = replace(
+            review_settings = self._get_phase_settings(
                 settings,
-                token_saver=False,
-                tools=None,
-                tool_choice=None,
-                integrations=None,
-                system_prompt=(
-                    "You are validating a project plan. "
-                    "Respond with strict JSON only and no extra text."
-                ),
-            )
-            raw = await self._chat_with_retries(
-                temp_conv,
-                review_settings,
-                tool_executor=None,
+                "You are validating a project plan. "
+                "Respond with strict JSON only and no extra text.",
             )
+            # Identical plan + tasks + sampling settings: reuse the last review.
+            # History is left out; re-pushes rebuild it with fresh message ids.
+            cache_key = hashlib.blake2b(
+                json.dumps(
+                    {
+                        "model": conversation.model,
+                        "settings": [settings.temperature, settings.top_p, settings.max_tokens, settings.context_limit],
+                        "plan": plan_response,
+                        "prompt": review_prompt,
+                    },
+                    sort_keys=True,
+                    default=str,
+                ).encode("utf-8"),
+                digest_size=16,
+            ).digest()
+            raw = self._plan_review_cache.get(cache_key)
+            if raw is None:
+                raw = await self._chat_with_retries(
+                    temp_conv,
+                    review_settings,
+                    tool_executor=None,
+                )
+                if len(self._plan_review_cache) >= 256:
+                    self._plan_review_cache.pop(next(iter(self._plan_review_cache)))
+                self._plan_review_cache[cache_key] = raw
+            else:
+                logger.debug("Plan review cache hit for conversation %s", conversation.id)
             needs_info, assistant_message, updated_tasks = self._parse_plan_review_response(
                 raw_response=raw,
                 fallback_tasks=planned_tasks,
@@ -3223,13 +4409,11 @@ class MainWindow(Gtk.ApplicationWindow):
         cleaned = self._normalize_task_list(tasks)
         if not cleaned:
             return "1. [ ] Define plan tasks"
-        lines = []
-        for i, task in enumerate(cleaned, start=1):
-            status = str(task.get("status", "uncompleted"))
-            mark = "x" if status == "completed" else (
-                "~" if status == "in_progress" else " ")
-            lines.append(f"{i}. [{mark}] {task.get('text', '')}")
-        return "\n".join(lines)
+        # Normalized tasks always carry string "text" and "status" keys.
+        return "\n".join([
+            f"{i}. [{_TASK_STATUS_MARKS.get(task['status'], ' ')}] {task['text']}"
+            for i, task in enumerate(cleaned, start=1)
+        ])
 
     def _parse_plan_review_response(
         self,
@@ -3241,20 +4425,15 @@ class MainWindow(Gtk.ApplicationWindow):
         payload = None
 
         # Prefer full JSON body.
-        try:
-            payload = json.loads(text)
-        except Exception:
-            payload = None
+        if text[:1] in ("{", "["):
+            try:
+                payload = _json_loads_text(text)
+            except Exception:
+                payload = None
 
         # Fallback: extract first JSON object region.
         if not isinstance(payload, dict):
-            start = text.find("{")
-            end = text.rfind("}")
-            if start != -1 and end != -1 and end > start:
-                try:
-                    payload = json.loads(text[start:end + 1])
-                except Exception:
-                    payload = None
+            payload = _extract_json_object(text)
 
         if not isinstance(payload, dict):
             # Heuristic fallback if model ignored JSON contract.
@@ -3277,26 +4456,54 @@ class MainWindow(Gtk.ApplicationWindow):
             assistant_message = ""
         return (needs_info, assistant_message, updated_tasks)
 
+    def _normalized_conversation_tasks(self, conv: Conversation, populate: bool = True) -> list[dict]:
+        """Return the normalized task list for a conversation, reusing the last result.
+
+        The cache holds the source list itself, so reassigning ``ai_tasks``
+        invalidates it; in-place edits bump ``_ai_tasks_rev``. Treat the
+        result as read-only. The cache is only written on the GTK thread;
+        callers elsewhere pass ``populate=False`` to normalize on a miss
+        without storing the result.
+        """
+        tasks = conv.ai_tasks
+        size = len(tasks) if isinstance(tasks, list) else -1
+        cached = conv._normalized_tasks_cache
+        if cached is not None and cached.source is tasks and cached.size == size and cached.rev == conv._ai_tasks_rev:
+            return cached.tasks
+        normalized = self._normalize_task_list(tasks)
+        if not populate:
+            return normalized
+        conv._normalized_tasks_cache = NormalizedTasks(
+            tasks, size, conv._ai_tasks_rev, normalized, normalized == tasks)
+        return normalized
+
     def _normalize_task_list(self, tasks: object) -> list[dict]:
-        """Normalize generic task payload to persisted task dicts."""
+        """Normalize generic task payload to persisted task dicts (at most 24)."""
         cleaned = []
         seen = set()
         if not isinstance(tasks, list):
             return cleaned
         for task in tasks:
+            if len(cleaned) >= 24:
+                break
             if not isinstance(task, dict):
                 continue
-            text = str(task.get("text", "")).strip()
+            text = task.get("text", "")
+            if not isinstance(text, str):
+                text = str(text)
+            text = text.strip()
             if not text:
                 continue
             key = text.lower()
             if key in seen:
                 continue
             seen.add(key)
-            status = str(task.get("status", "")).strip().lower()
-            if status not in ("uncompleted", "in_progress", "completed"):
-                status = "completed" if bool(
-                    task.get("done", False)) else "uncompleted"
+            status = task.get("status", "")
+            if not isinstance(status, str):
+                status = str(status)
+            status = status.strip().lower()
+            if status not in _TASK_STATUSES:
+                status = "completed" if task.get("done", False) else "uncompleted"
             cleaned.append(
                 {
                     "text": text,
@@ -3304,7 +4511,7 @@ class MainWindow(Gtk.ApplicationWindow):
                     "done": (status == "completed"),
                 }
             )
-        return cleaned[:24]
+        return cleaned
 
     def _initialize_agent_memory_files(self, project_dir: str) -> None:
         """Initialize PROJECT_CONSTITUTION.md and PROJECT_INDEX.json in a new agent project directory."""
@@ -3346,36 +4553,14 @@ class MainWindow(Gtk.ApplicationWindow):
                 logger.error("Failed to initialize PROJECT_INDEX.json: %s", e)
 
 
-    def _ensure_agent_config(self, conversation: Conversation) -> bool:
-        """Ensure per-conversation agent config exists; prompt user if missing."""
-        cfg = conversation.agent_config if isinstance(
-            conversation.agent_config, dict) else {}
-        project_name = str(cfg.get("project_name", "")).strip()
-        project_dir = str(cfg.get("project_dir", "")).strip()
-
-        # Generate default project_dir if not set
-        if not project_dir:
-            # New unique directory for this conversation's agent memory
-            default_project_dir = os.path.join(
-                storage._get_config_dir(), "agent_workspaces", conversation.id
-            )
-            os.makedirs(default_project_dir, exist_ok=True)
-            project_dir = default_project_dir
-            # Initialize agent_config if it was None
-            if conversation.agent_config is None:
-                conversation.agent_config = {}
-            conversation.agent_config["project_dir"] = project_dir
-            self._save_conversations() # Save the new project_dir
-
-        # Initialize memory files if they don't exist
-        self._initialize_agent_memory_files(project_dir)
+    def _get_agent_setup_dialog(self) -> tuple[Gtk.Dialog, Gtk.Entry, Gtk.Entry]:
+        """Return the reusable Agent Setup dialog and its name/directory entries.
 
-        # Pre-check: if a project name is also set (either loaded or by default) and directory exists,
-        # we can skip the dialog. User can still re-enter config via settings panel.
-        if project_name and os.path.isdir(project_dir): # Check after potential auto-creation
-            return True
+        Built on first use; callers fill the entries, run() it and hide() it.
+        """
+        if self._agent_setup_dialog is not None:
+            return self._agent_setup_dialog
 
-        # Existing dialog code (if project_name or dir is still missing, or user wants to change)
         dialog = Gtk.Dialog(
             title="Agent Setup",
             transient_for=self,
@@ -3385,6 +4570,7 @@ class MainWindow(Gtk.ApplicationWindow):
         dialog.add_button("Cancel", Gtk.ResponseType.CANCEL)
         dialog.add_button("Save", Gtk.ResponseType.OK)
         dialog.set_default_size(560, 220)
+        dialog.connect("delete-event", lambda d, _e: d.hide_on_delete())
 
         area = dialog.get_content_area()
         area.set_margin_start(12)
@@ -3409,7 +4595,6 @@ class MainWindow(Gtk.ApplicationWindow):
         name_label = Gtk.Label(label="Project Name")
         name_label.set_halign(Gtk.Align.START)
         name_entry = Gtk.Entry()
-        name_entry.set_text(project_name or conversation.title or "My Project")
         grid.attach(name_label, 0, 0, 1, 1)
         grid.attach(name_entry, 1, 0, 1, 1)
 
@@ -3418,7 +4603,6 @@ class MainWindow(Gtk.ApplicationWindow):
         dir_row = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=6)
         dir_entry = Gtk.Entry()
         dir_entry.set_hexpand(True)
-        dir_entry.set_text(project_dir) # Use the potentially auto-generated project_dir
         browse_btn = Gtk.Button(label="Browse…")
 
         def _on_browse_clicked(_btn):
@@ -3450,15 +4634,51 @@ class MainWindow(Gtk.ApplicationWindow):
         grid.attach(dir_label, 0, 1, 1, 1)
         grid.attach(dir_row, 1, 1, 1, 1)
 
+        self._agent_setup_dialog = (dialog, name_entry, dir_entry)
+        return self._agent_setup_dialog
+
+    def _ensure_agent_config(self, conversation: Conversation) -> bool:
+        """Ensure per-conversation agent config exists; prompt user if missing."""
+        cfg = conversation.agent_config if isinstance(
+            conversation.agent_config, dict) else {}
+        project_name = str(cfg.get("project_name", "")).strip()
+        project_dir = str(cfg.get("project_dir", "")).strip()
+
+        # Generate default project_dir if not set
+        if not project_dir:
+            # New unique directory for this conversation's agent memory
+            default_project_dir = os.path.join(
+                storage._get_config_dir(), "agent_workspaces", conversation.id
+            )
+            os.makedirs(default_project_dir, exist_ok=True)
+            project_dir = default_project_dir
+            # Initialize agent_config if it was None
+            if conversation.agent_config is None:
+                conversation.agent_config = {}
+            conversation.agent_config["project_dir"] = project_dir
+            self._schedule_save(conversation.id) # Save the new project_dir
+
+        # Initialize memory files if they don't exist
+        self._initialize_agent_memory_files(project_dir)
+
+        # Pre-check: if a project name is also set (either loaded or by default) and directory exists,
+        # we can skip the dialog. User can still re-enter config via settings panel.
+        if project_name and os.path.isdir(project_dir): # Check after potential auto-creation
+            return True
+
+        # Existing dialog code (if project_name or dir is still missing, or user wants to change)
+        dialog, name_entry, dir_entry = self._get_agent_setup_dialog()
+        name_entry.set_text(project_name or conversation.title or "My Project")
+        dir_entry.set_text(project_dir) # Use the potentially auto-generated project_dir
+
         dialog.show_all()
         resp = dialog.run()
+        dialog.hide()
         if resp != Gtk.ResponseType.OK:
-            dialog.destroy()
             return False
 
         selected_name = name_entry.get_text().strip()
         selected_dir = os.path.abspath(dir_entry.get_text().strip())
-        dialog.destroy()
 
         if not selected_name:
             self._show_error_dialog("Agent Setup", "Project name is required.")
@@ -3478,7 +4698,7 @@ class MainWindow(Gtk.ApplicationWindow):
             "project_name": selected_name,
             "project_dir": selected_dir,
         }
-        self._save_conversations()
+        self._schedule_save(conversation.id)
         refresh_project_map(selected_dir)
 
         # Update the Open Dir button visibility in the chat area
@@ -3499,7 +4719,31 @@ class MainWindow(Gtk.ApplicationWindow):
                 stdout=asyncio.subprocess.PIPE,
                 stderr=asyncio.subprocess.PIPE,
             )
-            stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout=90)
+
+            async def _read_capped(stream, limit: int = 4096) -> bytes:
+                # Keep the head of the stream and drain the rest so the child never blocks.
+                head = b""
+                while len(head) < limit:
+                    chunk = await stream.read(limit - len(head))
+                    if not chunk:
+                        return head
+                    head += chunk
+                while await stream.read(65536):
+                    pass
+                return head
+
+            async def _collect() -> tuple[bytes, bytes]:
+                out_err = await asyncio.gather(_read_capped(proc.stdout), _read_capped(proc.stderr))
+                await proc.wait()
+                return out_err
+
+            try:
+                stdout, stderr = await asyncio.wait_for(_collect(), timeout=90)
+            except asyncio.TimeoutError:
+                proc.kill()
+                # Reap the child so it does not linger as a zombie.
+                await proc.wait()
+                raise
             out = stdout.decode("utf-8", errors="replace").strip()
             err = stderr.decode("utf-8", errors="replace").strip()
             detail = (out + ("\n" if out and err else "") + err).strip()
@@ -3514,8 +4758,13 @@ class MainWindow(Gtk.ApplicationWindow):
         followup_text: str,
         conversation_id: str,
         updated_tasks: Optional[list[dict]] = None,
+        tokens: Optional[int] = None,
     ) -> bool:
-        """Persist optional plan refinements and add follow-up clarification message."""
+        """Persist optional plan refinements and add follow-up clarification message.
+
+        ``tokens`` is the precomputed count for ``followup_text``; when omitted
+        the message is tokenized here.
+        """
         if conversation_id not in self.conversations:
             return False
         conv = self.conversations[conversation_id]
@@ -3527,10 +4776,10 @@ class MainWindow(Gtk.ApplicationWindow):
 
         if followup_text:
             ai_msg = Message(
-                id=str(uuid.uuid4()),
+                id=self._next_id(),
                 role=MessageRole.ASSISTANT,
                 content=followup_text,
-                tokens=count_text_tokens(followup_text, model=conv.model),
+                tokens=tokens if tokens is not None else count_text_tokens(followup_text, model=conv.model),
                 meta={"tool_events": []},
             )
             conv.add_message(ai_msg)
@@ -3538,70 +4787,87 @@ class MainWindow(Gtk.ApplicationWindow):
                 self.current_conversation = conv
                 self.chat_area.add_message(ai_msg)
 
-        self._save_conversations()
+        self._schedule_save(conversation_id)
         return False
 
-    async def _phase1_intent_validation(
-        self,
-        conversation: Conversation,
-        conversation_id: str,
-        settings: ConversationSettings,
-        user_text: str,
-        task_text: str,
-        global_context: str,
-        iteration_num: int,
-    ) -> dict:
-        """Phase 1: Intent Validation - Agent answers critical questions before coding."""
-        validation_prompt = (
-            "You are an expert software engineer performing intent validation for a task. "
-            "Critically analyze the task before proceeding to design or implementation. "
-            "Your goal is to prevent errors, ensure alignment, and identify better approaches.\n\n"
-            f"{global_context}"
-            f"Current User Request: {user_text}\n"
-            f"Task to Validate: {task_text}\n\n"
-            "Answer the following questions in a JSON object:\n"
-            "{\n"
-            '  "aligns_goal": boolean, // Does this align with the main project goal (from constitution)?\n'
-            '  "conflicts_prior_decisions": boolean, // Does it conflict with prior decisions (from decision log)?\n'
-            '  "simpler_approach_possible": boolean, // Is there a simpler approach?\n'
-            '  "simpler_approach_description": string, // If yes, describe it.\n'
-            '  "potential_risks": string, // What could go wrong? Describe potential issues.\n'
-            '  "proceed_with_task": boolean, // Based on validation, should we proceed with this task as is?\n'
-            '  "reason_for_decision": string // Explain why you recommend proceeding or not.\n'
-            "}\n"
-            "Return ONLY the JSON object. Do not include any other text or markdown."
-        )
+    def _phase_conversation(self, conversation: Conversation, prompt: str) -> Conversation:
+        """Return a throwaway conversation for one agent phase call.
 
+        It sees the bounded agent history window plus ``prompt`` and shares
+        the parent's task list and settings instead of copying them; the API
+        client only reads messages, id and model.
+        """
         temp_conv = Conversation(
             id=conversation.id,
             title=conversation.title,
-            messages=list(conversation.messages),
+            messages=_MessageView(self._agent_context_window(conversation)),
             created_at=conversation.created_at,
             updated_at=conversation.updated_at,
             model=conversation.model,
             total_tokens=conversation.total_tokens,
             chat_settings=conversation.chat_settings,
-            ai_tasks=list(conversation.ai_tasks),
+            ai_tasks=conversation.ai_tasks,
             chat_mode=conversation.chat_mode,
             agent_config=conversation.agent_config,
             active_context_files=conversation.active_context_files,
         )
         temp_conv.add_message(Message(
-            id=str(uuid.uuid4()),
+            id=self._next_id(),
             role=MessageRole.USER,
-            content=validation_prompt,
+            content=prompt,
         ))
+        return temp_conv
 
-        validation_settings = replace(
+    def _get_phase_settings(
+            self, settings: ConversationSettings, system_prompt: str) -> ConversationSettings:
+        """Return tool-free settings for a validation/design/critique/review call.
+
+        Effective settings are built fresh for each request, so the derived
+        copy is reused for every agent iteration of a run. Callers must not
+        mutate the result.
+        """
+        key = (id(settings), system_prompt)
+        cached = self._phase_settings_cache.get(key)
+        if cached is not None and cached[0] is settings:
+            return cached[1]
+        derived = replace(
             settings,
             token_saver=False,
-            tools=None, # No tools during validation
+            tools=None,
             tool_choice=None,
             integrations=None,
-            system_prompt=(
-                "You are an expert intent validator. "
-                "Respond with strict JSON only and no extra text."
-            ),
+            system_prompt=system_prompt,
+        )
+        if len(self._phase_settings_cache) >= 16:
+            self._phase_settings_cache.pop(next(iter(self._phase_settings_cache)))
+        self._phase_settings_cache[key] = (settings, derived)
+        return derived
+
+    async def _phase1_intent_validation(
+        self,
+        conversation: Conversation,
+        conversation_id: str,
+        settings: ConversationSettings,
+        user_text: str,
+        task_text: str,
+        global_context: str,
+        iteration_num: int,
+    ) -> dict:
+        """Phase 1: Intent Validation - Agent answers critical questions before coding."""
+        validation_prompt = "".join((
+            _INTENT_PROMPT_HEAD,
+            global_context,
+            "Current User Request: ", user_text, "\n",
+            "Task to Validate: ", task_text, "\n\n",
+            _INTENT_PROMPT_TAIL,
+        ))
+
+        temp_conv = self._phase_conversation(conversation, validation_prompt)
+
+        validation_settings = self._get_phase_settings(
+            settings,
+            "You are an expert intent validator. "
+            "Respond with strict JSON only and no extra text.",
         )
         try:
             raw_response = await self._chat_with_retries(
@@ -3610,11 +4876,7 @@ class MainWindow(Gtk.ApplicationWindow):
                 tool_executor=None,
             )
             # Parse JSON robustly: try full parse first, then extract JSON object region.
-            validation_result = None
-            try:
-                validation_result = json.loads(raw_response)
-            except Exception:
-                validation_result = self._parse_json_object_from_text(raw_response)
+            validation_result = self._parse_json_object_from_text(raw_response)
 
             if not isinstance(validation_result, dict):
                 logger.error("Intent validation returned non-JSON or empty response. Raw: %s", (raw_response or "<empty>")[:1000])
@@ -3636,54 +4898,22 @@ class MainWindow(Gtk.ApplicationWindow):
         validation_feedback: dict,
     ) -> dict:
         """Phase 2: Design Draft - Agent creates a design before writing code."""
-        design_prompt = (
-            "You are an expert software architect tasked with drafting a design for an upcoming task. "
-            "Focus on the high-level approach, architectural impact, and file changes. "
-            "DO NOT write any code in this phase. The goal is to plan thoroughly.\n\n"
-            f"{global_context}"
-            f"Current User Request: {user_text}\n"
-            f"Task to Design: {task_text}\n"
-            f"Intent Validation Feedback: {json.dumps(validation_feedback, indent=2)}\n\n"
-            "Provide your design draft in a structured Markdown format, including:\n"
-            "1.  **Architecture Sketch (High-level explanation):** How does this fit into the existing architecture?\n"
-            "2.  **Dependency Impact:** What existing dependencies are affected, and what new ones are introduced?\n"
-            "3.  **Files to Change/Create:** List specific files and briefly describe their role in the change.\n"
-            "4.  **New Abstractions:** What new classes, functions, or patterns will be introduced?\n"
-            "5.  **Plan of Action:** A step-by-step plan for implementation (this will be used by Phase 3).\n"
-            "Do NOT include code blocks in this design draft. Focus on descriptions and structure."
-        )
-
-        temp_conv = Conversation(
-            id=conversation.id,
-            title=conversation.title,
-            messages=list(conversation.messages),
-            created_at=conversation.created_at,
-            updated_at=conversation.updated_at,
-            model=conversation.model,
-            total_tokens=conversation.total_tokens,
-            chat_settings=conversation.chat_settings,
-            ai_tasks=list(conversation.ai_tasks),
-            chat_mode=conversation.chat_mode,
-            agent_config=conversation.agent_config,
-            active_context_files=conversation.active_context_files,
-        )
-        temp_conv.add_message(Message(
-            id=str(uuid.uuid4()),
-            role=MessageRole.USER,
-            content=design_prompt,
+        design_prompt = "".join((
+            _DESIGN_PROMPT_HEAD,
+            global_context,
+            "Current User Request: ", user_text, "\n",
+            "Task to Design: ", task_text, "\n",
+            "Intent Validation Feedback: ", _json_dumps_pretty(validation_feedback), "\n\n",
+            _DESIGN_PROMPT_TAIL,
         ))
 
-        design_settings = replace(
+        temp_conv = self._phase_conversation(conversation, design_prompt)
+
+        design_settings = self._get_phase_settings(
             settings,
-            token_saver=False,
-            tools=None, # No tools during design draft
-            tool_choice=None,
-            integrations=None,
-            system_prompt=(
-                "You are an expert software architect and designer. "
-                "Provide a detailed design draft in structured Markdown. "
-                "Do NOT write code or use tools in this phase."
-            ),
+            "You are an expert software architect and designer. "
+            "Provide a detailed design draft in structured Markdown. "
+            "Do NOT write code or use tools in this phase.",
         )
         try:
             raw_response = await self._chat_with_retries(
@@ -3695,78 +4925,36 @@ class MainWindow(Gtk.ApplicationWindow):
         except Exception as e:
             logger.error("Error during design draft generation: %s", e)
             return {"ok": False, "error": f"Design draft generation failed: {e}"}
-
-    async def _phase4_post_implementation_critique(
-        self,
-        conversation: Conversation,
-        conversation_id: str,
-        settings: ConversationSettings,
-        user_text: str,
-        task_text: str,
-        global_context: str,
-        implementation_summary: str,
-        iteration_num: int,
-        compile_status: dict,
-    ) -> dict:
-        """Phase 4: Post-Implementation Critique - Agent critiques its work."""
-        critique_prompt = (
-            "You are a senior software engineer performing a critical review of a recent implementation. "
-            "Your goal is to identify potential flaws, ensure code quality, and maintain architectural integrity. "
-            "Be honest and thorough in your assessment.\n\n"
-            f"{global_context}"
-            f"Original User Request: {user_text}\n"
-            f"Task Implemented: {task_text}\n"
-            f"Implementation Summary (AI's own summary): {implementation_summary}\n"
-            f"Compile Check Status: {json.dumps(compile_status, indent=2)}\n\n"
-            "Answer the following questions in a JSON object:\n"
-            "{\n"
-            '  "introduced_coupling": boolean, // Did this introduce undesirable coupling?\n'
-            '  "coupling_details": string, // If yes, describe where and why it\'s undesirable.\n'
-            '  "complexity_increased": boolean, // Did complexity increase unnecessarily?\n'
-            '  "complexity_details": string, // If yes, describe how and why it\'s unnecessary.\n'
-            '  "violates_constitution": boolean, // Does this violate any principles from the project constitution?\n'
-            '  "violation_details": string, // If yes, describe which principle and how it\'s violated.\n'
-            '  "is_scalable": boolean, // Is this solution scalable?\n'
-            '  "scalability_details": string, // If no, explain why not.\n'
-            '  "senior_engineer_approval": boolean, // Would a senior engineer approve this design/implementation?\n'
-            '  "approval_reason": string, // Explain why or why not.\n'
-            '  "flaws_found": boolean, // Overall, were significant flaws found?\n'
-            '  "new_tasks_needed": Array<string>, // If flaws found, list new tasks to address them. Each string is a task description.\n'
-            '  "critique_summary": string // A concise summary of your critique.\n'
-            "}\n"
-            "Return ONLY the JSON object. Do not include any other text or markdown."
-        )
-
-        temp_conv = Conversation(
-            id=conversation.id,
-            title=conversation.title,
-            messages=list(conversation.messages),
-            created_at=conversation.created_at,
-            updated_at=conversation.updated_at,
-            model=conversation.model,
-            total_tokens=conversation.total_tokens,
-            chat_settings=conversation.chat_settings,
-            ai_tasks=list(conversation.ai_tasks),
-            chat_mode=conversation.chat_mode,
-            agent_config=conversation.agent_config,
-            active_context_files=conversation.active_context_files,
-        )
-        temp_conv.add_message(Message(
-            id=str(uuid.uuid4()),
-            role=MessageRole.USER,
-            content=critique_prompt,
+
+    async def _phase4_post_implementation_critique(
+        self,
+        conversation: Conversation,
+        conversation_id: str,
+        settings: ConversationSettings,
+        user_text: str,
+        task_text: str,
+        global_context: str,
+        implementation_summary: str,
+        iteration_num: int,
+        compile_status: dict,
+    ) -> dict:
+        """Phase 4: Post-Implementation Critique - Agent critiques its work."""
+        critique_prompt = "".join((
+            _CRITIQUE_PROMPT_HEAD,
+            global_context,
+            "Original User Request: ", user_text, "\n",
+            "Task Implemented: ", task_text, "\n",
+            "Implementation Summary (AI's own summary): ", implementation_summary, "\n",
+            "Compile Check Status: ", _json_dumps_pretty(compile_status), "\n\n",
+            _CRITIQUE_PROMPT_TAIL,
         ))
 
-        critique_settings = replace(
+        temp_conv = self._phase_conversation(conversation, critique_prompt)
+
+        critique_settings = self._get_phase_settings(
             settings,
-            token_saver=False,
-            tools=None, # No tools during critique
-            tool_choice=None,
-            integrations=None,
-            system_prompt=(
-                "You are an expert and critical software reviewer. "
-                "Respond with strict JSON only and no extra text."
-            ),
+            "You are an expert and critical software reviewer. "
+            "Respond with strict JSON only and no extra text.",
         )
         try:
             raw_response = await self._chat_with_retries(
@@ -3774,17 +4962,20 @@ class MainWindow(Gtk.ApplicationWindow):
                 critique_settings,
                 tool_executor=None,
             )
-            # Parse JSON robustly
-            critique_result = None
-            try:
-                critique_result = json.loads(raw_response)
-            except Exception:
-                critique_result = self._parse_json_object_from_text(raw_response)
+            # Parse JSON robustly (full body first, then fenced/embedded object)
+            critique_result = self._parse_json_object_from_text(raw_response)
 
             if not isinstance(critique_result, dict):
                 logger.error("Post-implementation critique returned non-JSON or empty response. Raw: %s", (raw_response or "<empty>")[:1000])
                 return {"ok": False, "error": "Post-implementation critique failed: invalid JSON response from model."}
-            return {"ok": True, "result": critique_result}
+            # A bare JSON body is already readable; only re-serialize when the
+            # object had to be dug out of surrounding prose or fences.
+            raw_text = (raw_response or "").strip()
+            if raw_text.startswith("{") and raw_text.endswith("}"):
+                display_text = raw_text
+            else:
+                display_text = _json_dumps_pretty(critique_result)
+            return {"ok": True, "result": critique_result, "text": display_text}
         except Exception as e:
             logger.error("Error during post-implementation critique: %s", e)
             return {"ok": False, "error": f"Post-implementation critique failed: {e}"}
@@ -3793,37 +4984,32 @@ class MainWindow(Gtk.ApplicationWindow):
         """Handle request to edit a message."""
         if not self.current_conversation:
             return
-        for message in self.current_conversation.messages:
-            if message.id == message_id:
-                self.chat_input.set_text(message.content)
-                self.chat_input.focus()
-                # Optionally, delete the original message or mark as edited
-                break
+        found = self.current_conversation.find_message(message_id)
+        if found is not None:
+            self.chat_input.set_text(found[1].content)
+            self.chat_input.focus()
+            # Optionally, delete the original message or mark as edited
 
     def _on_repush_message(self, message_id: str) -> None:
         """Handle request to re-push (re-send) a message). Clears subsequent messages."""
         if not self.current_conversation:
             return
         
-        message_to_repush = None
-        repush_index = -1
-        for i, message in enumerate(self.current_conversation.messages):
-            if message.id == message_id:
-                message_to_repush = message
-                repush_index = i
-                break
-        
-        if message_to_repush and repush_index != -1:
+        found = self.current_conversation.find_message(message_id)
+        if found is not None:
+            repush_index, message_to_repush = found
             # Remove the selected user message so the new send doesn't create a duplicate.
             # Also clear any subsequent messages (they are being replaced by the new run).
-            self.current_conversation.messages = self.current_conversation.messages[:repush_index]
-            self._save_conversations()
+            del self.current_conversation.messages[repush_index:]
+            self.current_conversation.mark_messages_changed()
+            self._save_conversations({self.current_conversation.id})
 
-            # Refresh chat area to reflect cleared messages
-            self.chat_area.set_conversation(
-                self.current_conversation,
-                self._get_effective_settings(self.current_conversation).context_limit
-            )
+            # Drop the cleared bubbles; rebuild only if they are not on screen.
+            if not self.chat_area.truncate_from(message_id):
+                self.chat_area.set_conversation(
+                    self.current_conversation,
+                    self._get_effective_settings(self.current_conversation).context_limit
+                )
 
             # Now simulate sending the message content as a fresh user message
             self.chat_input.set_text(message_to_repush.content)
@@ -3835,26 +5021,26 @@ class MainWindow(Gtk.ApplicationWindow):
             return
         
         # Confirmation dialog before deleting
-        dialog = Gtk.MessageDialog(
-            transient_for=self,
-            flags=0,
-            message_type=Gtk.MessageType.QUESTION,
-            buttons=Gtk.ButtonsType.OK_CANCEL,
-            text="Delete message?",
+        dialog = self._get_cached_dialog(
+            "delete_message",
+            Gtk.MessageType.QUESTION,
+            Gtk.ButtonsType.OK_CANCEL,
+            "Delete message?",
         )
         dialog.format_secondary_text("This message will be permanently deleted from the conversation history.")
         response = dialog.run()
-        dialog.destroy()
+        dialog.hide()
 
         if response == Gtk.ResponseType.OK:
-            original_message_count = len(self.current_conversation.messages)
-            self.current_conversation.messages = [
-                msg for msg in self.current_conversation.messages if msg.id != message_id
-            ]
-            if len(self.current_conversation.messages) < original_message_count:
-                # Message was deleted, refresh UI
-                self._save_conversations()
-                self.chat_area.set_conversation(self.current_conversation, self._get_effective_settings(self.current_conversation).context_limit)
+            conv = self.current_conversation
+            found = conv.find_message(message_id)
+            if found is not None:
+                # Delete in place; no copy of the whole history.
+                del conv.messages[found[0]]
+                conv.mark_messages_changed()
+                self._schedule_save(conv.id)
+                if not self.chat_area.remove_message(message_id):
+                    self.chat_area.set_conversation(conv, self._get_effective_settings(conv).context_limit)
 
     def _select_tools_for_enabled_integrations(
         self, tools: list[dict], enabled_integrations: list[str]
@@ -3866,11 +5052,20 @@ class MainWindow(Gtk.ApplicationWindow):
             return []
 
         selected = []
-        enabled_set = set(enabled_integrations)
-        normalized_enabled = {
-            self._sanitize_identifier(iid.replace("/", "_")).lower(): iid
-            for iid in enabled_integrations
-        }
+        key = tuple(enabled_integrations)
+        cached = self._enabled_integration_match_cache
+        if cached is None or cached[0] != key:
+            prefix_set = frozenset(
+                _sanitize_identifier_cached(iid.replace("/", "_")).lower() + "_"
+                for iid in enabled_integrations
+            )
+            cached = (key, frozenset(enabled_integrations), prefix_set, tuple(prefix_set))
+            self._enabled_integration_match_cache = cached
+        _key, enabled_set, prefix_set, enabled_prefixes = cached
+        # Few prefixes: str.startswith checks the whole tuple in one C call.
+        # Many: probe the set with each "<head>_" of the name instead, so the
+        # cost follows the name's underscores rather than the integration count.
+        probe_by_underscore = len(enabled_prefixes) > 20
         for tool in tools:
             if not isinstance(tool, dict):
                 continue
@@ -3889,13 +5084,18 @@ class MainWindow(Gtk.ApplicationWindow):
             # match function name prefixes against enabled integration ids.
             fn = tool.get("function") if tool.get(
                 "type") == "function" else tool
-            fn_name = ""
-            if isinstance(fn, dict):
-                fn_name = str(fn.get("name", "")).lower()
-            for normalized_key in normalized_enabled.keys():
-                if fn_name.startswith(normalized_key + "_"):
-                    selected.append(tool)
-                    break
+            if not isinstance(fn, dict):
+                continue
+            fn_name = str(fn.get("name", "")).lower()
+            if probe_by_underscore:
+                cut = fn_name.find("_")
+                while cut != -1:
+                    if fn_name[:cut + 1] in prefix_set:
+                        selected.append(tool)
+                        break
+                    cut = fn_name.find("_", cut + 1)
+            elif fn_name.startswith(enabled_prefixes):
+                selected.append(tool)
 
         return selected
 
@@ -3905,14 +5105,14 @@ class MainWindow(Gtk.ApplicationWindow):
         tool_defs = []
         for tool in enabled_tools:
             integration_id = tool.get("id") or "mcp/tool"
-            integration_name = self._sanitize_identifier(
+            integration_name = _sanitize_identifier_cached(
                 integration_id.replace("/", "_"))
             calls = tool.get("calls") or []
             if not calls:
                 calls = ["run"]
             for call in calls:
-                call_name = self._sanitize_identifier(str(call))
-                fn_name = self._sanitize_identifier(
+                call_name = _sanitize_identifier_cached(str(call))
+                fn_name = _sanitize_identifier_cached(
                     f"{integration_name}_{call_name}")
                 tool_defs.append(
                     {
@@ -3930,10 +5130,47 @@ class MainWindow(Gtk.ApplicationWindow):
                 )
         return tool_defs
 
+    async def _discover_mcp_tools_cached(
+        self, server_configs: dict[str, dict], enabled_integrations: list[str]
+    ) -> list[dict]:
+        """Discover MCP tools, reusing results for unchanged configs within the TTL."""
+        try:
+            configs_blob = json.dumps(server_configs, sort_keys=True, default=str).encode("utf-8")
+        except (TypeError, ValueError):
+            configs_blob = repr(server_configs).encode("utf-8")
+        key = (
+            hashlib.blake2b(configs_blob, digest_size=16).digest(),
+            tuple(sorted(enabled_integrations)),
+        )
+        cached = self._mcp_discovery_cache.get(key)
+        now = time.monotonic()
+        if cached is not None and now - cached[0] < _MCP_DISCOVERY_TTL_SEC:
+            logger.debug("Using cached MCP discovery for %s", ", ".join(key[1]))
+            return list(cached[1])
+        # Concurrent requests for the same key share one in-flight discovery.
+        inflight = self._mcp_discovery_inflight.get(key)
+        if inflight is not None:
+            return list(await asyncio.shield(inflight))
+        inflight = asyncio.ensure_future(
+            self.mcp_discovery.discover_tools(
+                server_configs=server_configs,
+                enabled_integrations=enabled_integrations,
+            )
+        )
+        self._mcp_discovery_inflight[key] = inflight
+        try:
+            discovered = await asyncio.shield(inflight)
+        finally:
+            if inflight.done():
+                self._mcp_discovery_inflight.pop(key, None)
+            else:
+                inflight.add_done_callback(lambda _fut: self._mcp_discovery_inflight.pop(key, None))
+        self._mcp_discovery_cache[key] = (time.monotonic(), list(discovered))
+        return discovered
+
     def _dedupe_tool_definitions(self, tools: list[dict]) -> list[dict]:
         """Dedupe tool definitions by function name while preserving order."""
-        deduped = []
-        seen = set()
+        by_name: dict[str, dict] = {}
         for tool in tools:
             if not isinstance(tool, dict):
                 continue
@@ -3942,15 +5179,14 @@ class MainWindow(Gtk.ApplicationWindow):
             if not isinstance(fn, dict):
                 continue
             name = str(fn.get("name", "")).strip()
-            if not name or name in seen:
-                continue
-            seen.add(name)
-            deduped.append(tool)
-        return deduped
+            if name:
+                # First definition wins; dicts keep insertion order.
+                by_name.setdefault(name, tool)
+        return list(by_name.values())
 
-    def _sanitize_identifier(self, value: str) -> str:
-        cleaned = re.sub(r"[^a-zA-Z0-9_-]", "_", value)
-        return cleaned[:64] if cleaned else "tool"
+    @staticmethod
+    def _sanitize_identifier(value: str) -> str:
+        return _sanitize_identifier_cached(value)
 
     def _normalize_file_cache_key(self, rel_path: str) -> str:
         """Normalize a workspace-relative path to a stable lowercase cache key."""
@@ -4060,8 +5296,8 @@ class MainWindow(Gtk.ApplicationWindow):
         state.pop("last_diff_snapshot_content", None)
         state.pop("last_diff_snapshot_ts", None)
 
-    def _file_line_count(self, rel_path: str, target_path: str) -> int:
-        """Count lines with a lightweight per-file cache."""
+    async def _file_line_count(self, rel_path: str, target_path: str) -> int:
+        """Count lines with a lightweight per-file cache; misses scan the file in a worker thread."""
         state = self._get_or_create_file_access_state(rel_path)
         cached_count = state.get("line_count")
         cached_mtime = state.get("line_count_mtime")
@@ -4072,14 +5308,33 @@ class MainWindow(Gtk.ApplicationWindow):
         if isinstance(cached_count, int) and current_mtime is not None and cached_mtime == current_mtime:
             return cached_count
 
-        count = 0
-        with open(target_path, "r", encoding="utf-8", errors="replace") as f:
-            for count, _ in enumerate(f, start=1):
-                pass
+        count = await asyncio.to_thread(self._count_file_lines, target_path)
         state["line_count"] = int(count)
         state["line_count_mtime"] = current_mtime
         return int(count)
 
+    @staticmethod
+    def _count_file_lines(target_path: str) -> int:
+        """Count lines on raw bytes, reading the file in 1 MiB chunks.
+
+        Matches iterating the file in text mode: ``\n``, ``\r`` and ``\r\n``
+        each end a line, and a trailing partial line counts as one more.
+        """
+        count = 0
+        last = b""
+        with open(target_path, "rb") as f:
+            while True:
+                chunk = f.read(1 << 20)
+                if not chunk:
+                    break
+                count += chunk.count(b"\n") + chunk.count(b"\r") - chunk.count(b"\r\n")
+                if last == b"\r" and chunk[:1] == b"\n":
+                    count -= 1  # \r\n split across two chunks
+                last = chunk[-1:]
+        if last and last not in (b"\n", b"\r"):
+            count += 1
+        return count
+
     def _normalize_constitution_text(self, content: str) -> str:
         """Normalize constitution text for stable equality checks."""
         normalized_lines = [line.rstrip() for line in str(content or "").splitlines()]
@@ -4107,6 +5362,28 @@ class MainWindow(Gtk.ApplicationWindow):
                     continue
         return latest
 
+    # Built-in tool name -> handler method name, resolved per call with getattr.
+    _TOOL_HANDLER_NAMES = {
+        "list_files": "_tool_list_files",
+        "read_file": "_tool_read_file",
+        "search_text": "_tool_search_text",
+        "run_command": "_tool_run_command",
+        "builtin_check_syntax": "_tool_builtin_check_syntax",
+        "check_all_syntax": "_tool_check_all_syntax",
+        "update_project_constitution": "_tool_update_project_constitution",
+        "update_project_index": "_tool_update_project_index",
+        "builtin_read_file": "_tool_builtin_read_file",
+        "builtin_read_file_chunk": "_tool_builtin_read_file_chunk",
+        "builtin_search_text": "_tool_search_text",
+        "summarize_file_for_index": "_tool_summarize_file_for_index",
+        "load_files_into_context": "_tool_load_files_into_context",
+        "add_decision_log_entry": "_tool_add_decision_log_entry",
+        "perform_milestone_review": "_tool_perform_milestone_review",
+        "builtin_write_file": "_tool_builtin_write_file",
+        "builtin_edit_file": "_tool_builtin_edit_file",
+        "builtin_delete_file": "_tool_builtin_delete_file",
+    }
+
     async def _execute_tool_call(
         self,
         tool_name: str,
@@ -4124,27 +5401,7 @@ class MainWindow(Gtk.ApplicationWindow):
         }
 
         try:
-            handlers = {
-                "list_files": self._tool_list_files,
-                "read_file": self._tool_read_file,
-                "search_text": self._tool_search_text,
-                "run_command": self._tool_run_command,
-                "builtin_check_syntax": self._tool_builtin_check_syntax,
-                "check_all_syntax": self._tool_check_all_syntax,
-                "update_project_constitution": self._tool_update_project_constitution,
-                "update_project_index": self._tool_update_project_index,
-                "builtin_read_file": self._tool_builtin_read_file,
-                "builtin_read_file_chunk": self._tool_builtin_read_file_chunk,
-                "builtin_search_text": self._tool_search_text,
-                "summarize_file_for_index": self._tool_summarize_file_for_index,
-                "load_files_into_context": self._tool_load_files_into_context,
-                "add_decision_log_entry": self._tool_add_decision_log_entry,
-                "perform_milestone_review": self._tool_perform_milestone_review,
-                "builtin_write_file": self._tool_builtin_write_file,
-                "builtin_edit_file": self._tool_builtin_edit_file,
-                "builtin_delete_file": self._tool_builtin_delete_file,
-            }
-            handler = handlers.get(tool_name)
+            handler = getattr(self, self._TOOL_HANDLER_NAMES.get(tool_name, ""), None)
             if handler is not None:
                 result = await handler(args or {})
                 tool_event["result"] = result
@@ -4208,28 +5465,33 @@ class MainWindow(Gtk.ApplicationWindow):
         Returns:
             A JSON string indicating success or failure.
         """
-        project_index_data = self._load_project_index()
+        return await self._store_project_index_entries({
+            file_path: {
+                "purpose": purpose,
+                "public_api": public_api,
+                "dependencies": dependencies or [],
+                "key_responsibilities": key_responsibilities or [],
+                "known_issues": known_issues or [],
+            }
+        })
+
+    async def _store_project_index_entries(self, entries: dict[str, dict]) -> str:
+        """Write several PROJECT_INDEX.json entries with a single load and save."""
+        project_index_data = await asyncio.to_thread(self._load_project_index)
 
         # Use effective workspace root so agent project_dir is respected
         root = self._get_workspace_root()
 
-        # Ensure file_path is relative to workspace root
-        abs_file_path = os.path.join(root, file_path)
-        relative_file_path = os.path.relpath(abs_file_path, root)
-
-        project_index_data[relative_file_path] = {
-            "purpose": purpose,
-            "public_api": public_api,
-            "dependencies": dependencies or [],
-            "key_responsibilities": key_responsibilities or [],
-            "known_issues": known_issues or [],
-        }
+        for file_path, entry in entries.items():
+            # Ensure file_path is relative to workspace root
+            relative_file_path = os.path.relpath(os.path.join(root, file_path), root)
+            project_index_data[relative_file_path] = entry
 
         # Persist the updated PROJECT_INDEX.json
         index_path = os.path.join(root, "PROJECT_INDEX.json")
         try:
-            # write_file expects bytes and is async in this codebase
-            await write_file(index_path, json.dumps(project_index_data, indent=2, ensure_ascii=False).encode("utf-8"))
+            # storage.write_file is a blocking text write; keep it off the event loop
+            await asyncio.to_thread(write_file, index_path, _json_dumps_pretty(project_index_data))
             return json.dumps({"ok": True, "message": "PROJECT_INDEX.json updated"}, ensure_ascii=False)
         except Exception as e:
             logger.error("Failed to update PROJECT_INDEX.json: %s", e)
@@ -4353,8 +5615,8 @@ class MainWindow(Gtk.ApplicationWindow):
                     }
                 )
 
-            # Using the imported write_file utility
-            await write_file(constitution_path, incoming_raw.encode('utf-8'))
+            # storage.write_file is a blocking text write; keep it off the event loop
+            await asyncio.to_thread(write_file, constitution_path, incoming_raw)
             self._constitution_update_state = {
                 "last_constitution_hash": incoming_hash,
                 "last_project_change_marker": float(project_marker),
@@ -4373,272 +5635,21 @@ class MainWindow(Gtk.ApplicationWindow):
             logger.error("Error updating PROJECT_CONSTITUTION.md: %s", e)
             return json.dumps({"status": "error", "ok": False, "message": f"Failed to update PROJECT_CONSTITUTION.md: {e}"})
 
-    def _builtin_filesystem_tools(self) -> list[dict]:
+    def _builtin_filesystem_tools(self) -> tuple[dict, ...]:
         """Tool definitions for built-in local filesystem integration."""
-        return [
-            {
-                "type": "function",
-                "function": {
-                    "name": "update_project_constitution",
-                    "description": (
-                        "Updates the project constitution file (PROJECT_CONSTITUTION.md) with the provided content. "
-                        "This file serves as a foundational memory layer for the agent mode. "
-                        "Use this tool only when architecture/principles have materially changed. "
-                        "Do not call repeatedly with unchanged or near-identical content."
-                    ),
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "new_content": {
-                                "type": "string",
-                                "description": "The full new content to write to PROJECT_CONSTITUTION.md."
-                            },
-                        },
-                        "required": ["new_content"],
-                    },
-                },
-            },
-            {
-                "type": "function",
-                "function": {
-                    "name": "update_project_index",
-                    "description": (
-                        "Updates a summary entry in the dynamic project index (PROJECT_INDEX.json) for a specific file. "
-                        "This index helps the AI understand the project structure and file responsibilities. "
-                        "Use this tool to summarize a file's purpose, public API, dependencies, key responsibilities, and known issues."
-                    ),
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "file_path": {"type": "string", "description": "Workspace-relative path to the file being summarized."},
-                            "purpose": {"type": "string", "description": "A brief description of the file's purpose."},
-                            "public_api": {"type": "string", "description": "(Optional) Description of the main functions/classes exposed by the file."},
-                            "dependencies": {"type": "array", "items": {"type": "string"}, "description": "(Optional) List of other files or modules the file significantly depends on."},
-                            "key_responsibilities": {"type": "array", "items": {"type": "string"}, "description": "(Optional) List of key tasks or features this file is responsible for."},
-                            "known_issues": {"type": "array", "items": {"type": "string"}, "description": "(Optional) List of any known bugs, limitations, or areas for improvement."},
-                        },
-                        "required": ["file_path", "purpose"],
-                    },
-                },
-            },
-            {
-                "type": "function",
-                "function": {
-                    "name": "summarize_file_for_index",
-                    "description": (
-                        "Reads a file and sends its content to the AI for summarization based on project index criteria "
-                        "(purpose, public API, dependencies, key responsibilities, known issues). "
-                        "The AI's summary is then used to update PROJECT_INDEX.json. "
-                        "This tool allows the AI to dynamically update its understanding of project files."
-                    ),
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "path": {"type": "string", "description": "The workspace-relative path to the file to summarize."},
-                        },
-                        "required": ["path"],
-                    },
-                },
-            },
-            {
-                "type": "function",
-                "function": {
-                    "name": "load_files_into_context",
-                    "description": (
-                        "Loads specified files into the AI's active working context for deep retrieval. "
-                        "The content of these files will be automatically appended to the agent's instructions for subsequent tasks. "
-                        "If an empty list is provided, the active context will be cleared."
-                    ),
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "paths": {"type": "array", "items": {"type": "string"}, "description": "A list of workspace-relative file paths to load. If empty, clears the active context."},
-                        },
-                        "required": ["paths"],
-                    },
-                },
-            },
-            {
-                "type": "function",
-                "function": {
-                    "name": "add_decision_log_entry",
-                    "description": (
-                        "Adds a new entry to the architectural decision log (DECISION_LOG.md). "
-                        "This provides long-term memory of architectural choices, their justifications, and impacts. "
-                        "Do not log duplicate entries; only add when there is genuinely new decision content."
-                    ),
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "decision_summary": {"type": "string", "description": "A concise summary of the decision made."},
-                            "reasoning": {"type": "string", "description": "The justification or rationale behind the decision."},
-                            "impact": {"type": "string", "description": "The expected or observed consequences/impact of the decision."},
-                            "related_files": {"type": "array", "items": {"type": "string"}, "description": "(Optional) A list of files or components affected by this decision."},
-                            "status": {"type": "string", "description": "(Optional) The current status of the decision (e.g., implemented, pending, reconsidered). Defaults to 'implemented'."},
-                        },
-                        "required": ["decision_summary", "reasoning", "impact"],
-                    },
-                },
-            },
-            {
-                "type": "function",
-                "function": {
-                    "name": "perform_milestone_review",
-                    "description": (
-                        "Triggers a milestone-level review of the project's memory layers (Constitution, Dynamic Project Index, Decision Log) by the AI. "
-                        "The AI will assess their consistency and up-to-dateness and suggest new tasks if updates are needed."
-                    ),
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "review_focus": {"type": "string", "description": "(Optional) A specific area to focus the AI's review on. Defaults to 'general consistency and up-to-dateness'."},
-                        },
-                        "required": [],
-                    },
-                },
-            },
-            {
-                "type": "function",
-                "function": {
-                    "name": "builtin_search_text",
-                    "description": "Search text/identifiers and return matching file paths with line numbers. Use this before loading large file chunks.",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "pattern": {"type": "string", "description": "Regex or plain text pattern to search for."},
-                            "path": {"type": "string", "description": "Workspace-relative file or directory path to search in."},
-                            "max_results": {"type": "integer", "description": "Maximum number of matches to return."},
-                        },
-                        "required": ["pattern"],
-                    },
-                },
-            },
-            {
-                "type": "function",
-                "function": {
-                    "name": "builtin_check_syntax",
-                    "description": (
-                        "Run compile/syntax checks for a file. Supports major formats including Python, HTML, CSS, "
-                        "JSON, and JavaScript/TypeScript (best effort depending on installed toolchain)."
-                    ),
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "path": {"type": "string", "description": "Workspace-relative file path to validate."},
-                            "language": {"type": "string", "description": "Optional language override (python, html, css, json, javascript, typescript)."},
-                        },
-                        "required": ["path"],
-                    },
-                },
-            },
-            {
-                "type": "function",
-                "function": {
-                    "name": "check_all_syntax",
-                    "description": (
-                        "Scan supported source files in the workspace, run syntax checks, and optionally auto-fix failing code blocks "
-                        "with LLM-assisted edits. Ignores __pycache__, .git, virtualenv, node_modules, and other junk directories."
-                    ),
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "path": {"type": "string", "description": "Optional workspace-relative directory to scan. Defaults to '.'"},
-                            "auto_fix": {"type": "boolean", "description": "Whether to attempt automatic LLM-assisted block fixes. Defaults to true."},
-                            "max_files": {"type": "integer", "description": "Maximum number of files to scan. Defaults to 400."},
-                            "max_fix_attempts_per_file": {"type": "integer", "description": "Maximum LLM fix attempts per failing file. Defaults to 3."},
-                        },
-                        "required": [],
-                    },
-                },
-            },
-            {
-                "type": "function",
-                "function": {
-                    "name": "builtin_read_file",
-                    "description": "Read a UTF-8 text file inside the workspace. Use this before analyzing or editing a file.",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "path": {"type": "string", "description": "Workspace-relative file path (e.g., 'src/main.py'). Must not be empty, absolute, or contain '..'."},
-                            "max_chars": {"type": "integer", "description": "Optional max chars to read."},
-                            "allow_large_file_full_read": {"type": "boolean", "description": "Optional override for full reads of large files; prefer false and use builtin_read_file_chunk instead."},
-                        },
-                        "required": ["path"],
-                    },
-                },
-            },
-            {
-                "type": "function",
-                "function": {
-                    "name": "builtin_read_file_chunk",
-                    "description": "Read a specific line range from a file with context lines above/below. Preferred for large files.",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "path": {"type": "string", "description": "Workspace-relative file path."},
-                            "line": {"type": "integer", "description": "Anchor line for a focused chunk read."},
-                            "start_line": {"type": "integer", "description": "Start line of target section (1-based)."},
-                            "end_line": {"type": "integer", "description": "End line of target section (1-based, inclusive)."},
-                            "context_lines": {"type": "integer", "description": "Lines to include above/below target section. Defaults to 50."},
-                            "max_lines": {"type": "integer", "description": "Max total lines returned (target + context)."},
-                        },
-                        "required": ["path"],
-                    },
-                },
-            },
-            {
-                "type": "function",
-                "function": {
-                    "name": "builtin_write_file",
-                    "description": "Write UTF-8 text file content inside the workspace. For existing files, this is for explicit full rewrites only.",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "path": {"type": "string", "description": "Workspace-relative file path (e.g., 'src/main.py'). Must not be empty, absolute, or contain '..'."},
-                            "content": {"type": "string", "description": "Full file content to write."},
-                            "force_overwrite": {"type": "boolean", "description": "Required true to overwrite an existing file with full new content."},
-                            "expected_hash": {"type": "string", "description": "Optional SHA-256 hash of the last loaded file content to prevent stale overwrites."},
-                        },
-                        "required": ["path", "content"],
-                    },
-                },
-            },
-            {
-                "type": "function",
-                "function": {
-                    "name": "builtin_edit_file",
-                    "description": "Replace one text segment with another in a file.",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "path": {"type": "string", "description": "Workspace-relative file path (e.g., 'src/main.py'). Must not be empty, absolute, or contain '..'."},
-                            "find": {"type": "string", "description": "Exact text to find."},
-                            "replace": {"type": "string", "description": "Replacement text."},
-                            "replace_all": {"type": "boolean", "description": "Replace all occurrences."},
-                            "expected_hash": {"type": "string", "description": "Optional SHA-256 hash of the last loaded file content to prevent stale edits."},
-                        },
-                        "required": ["path", "find", "replace"],
-                    },
-                },
-            },
-            {
-                "type": "function",
-                "function": {
-                    "name": "builtin_delete_file",
-                    "description": "Delete a file in the workspace (requires double user confirmation).",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "path": {"type": "string", "description": "Workspace-relative file path (e.g., 'src/main.py'). Must not be empty, absolute, or contain '..'."},
-                        },
-                        "required": ["path"],
-                    },
-                },
-            },
-        ]
+        return _BUILTIN_FILESYSTEM_TOOLS
 
     def _build_mcp_tool_map(self, tools: list[dict]) -> dict[str, dict]:
-        """Build lookup map from function tool name to MCP metadata."""
+        """Build lookup map from function tool name to MCP metadata.
+
+        Tool definitions are shared by reference between requests (built-in
+        schemas, TTL-cached discovery results), so the previous map is reused
+        while the same dicts are selected. Callers must not mutate the result.
+        """
+        cached = self._mcp_tool_map_cache
+        if cached is not None and len(cached[0]) == len(tools) and all(
+                a is b for a, b in zip(cached[0], tools)):
+            return cached[1]
         out = {}
         for tool in tools:
             if not isinstance(tool, dict):
@@ -4659,6 +5670,7 @@ class MainWindow(Gtk.ApplicationWindow):
                     "mcp_tool_name": str(raw_name) if raw_name is not None else fn_name,
                     "description": description,
                 }
+        self._mcp_tool_map_cache = (tuple(tools), out)
         return out
 
     async def _tool_list_files(self, args: dict) -> dict:
@@ -4672,7 +5684,9 @@ class MainWindow(Gtk.ApplicationWindow):
                 return {"ok": False, "error": f"Operation denied: project workspace root is inside the application directory ({app_root}). Set a project directory outside the application directory to allow filesystem operations."}
             allowed = getattr(self, "_last_safe_root", self._get_workspace_root())
             return {"ok": False, "error": f"Invalid directory path. Path must be inside project workspace: {allowed}"}
-        names = sorted(os.listdir(target))[:max_results]
+        # Top-k selection keeps only max_results names instead of sorting the whole directory.
+        with os.scandir(target) as it:
+            names = heapq.nsmallest(max_results, (entry.name for entry in it))
         return {
             "ok": True,
             "path": rel_path,
@@ -4697,8 +5711,8 @@ class MainWindow(Gtk.ApplicationWindow):
             allowed = getattr(self, "_last_safe_root", self._get_workspace_root())
             return {"ok": False, "error": f"Invalid file path. Path must be inside project workspace: {allowed}"}
         try:
-            with open(target, "r", encoding="utf-8", errors="replace") as f:
-                content = f.read(max_chars + 1)
+            # Off the event loop so concurrent LLM streaming and MCP calls keep running.
+            content = await asyncio.to_thread(_read_text_prefix, target, max_chars + 1)
             truncated = len(content) > max_chars
             if truncated:
                 content = content[:max_chars]
@@ -4866,7 +5880,7 @@ class MainWindow(Gtk.ApplicationWindow):
 
         # Large files must use search-then-load chunk flow unless explicitly overridden.
         try:
-            line_count = self._file_line_count(rel_path, target)
+            line_count = await self._file_line_count(rel_path, target)
         except Exception as e:
             return {"ok": False, "error": f"Failed to inspect file before read: {e}"}
         is_large = line_count > int(self._large_file_line_threshold)
@@ -4925,7 +5939,7 @@ class MainWindow(Gtk.ApplicationWindow):
         if not target or not os.path.isfile(target):
             return {"ok": False, "error": f"Invalid or unsafe file path: '{rel_path}'. Path must be relative and within the project directory."}
 
-        line_count = self._file_line_count(rel_path, target)
+        line_count = await self._file_line_count(rel_path, target)
         is_large = line_count > int(self._large_file_line_threshold)
         if is_large and not self._has_recent_search(rel_path):
             return {
@@ -5296,7 +6310,7 @@ class MainWindow(Gtk.ApplicationWindow):
 
     def _strip_code_fences(self, text: str) -> str:
         raw = str(text or "").strip()
-        fenced = re.search(r"```(?:\w+)?\s*(.*?)\s*```", raw, flags=re.DOTALL)
+        fenced = _CODE_FENCE_RE.search(raw)
         if fenced:
             return fenced.group(1).strip("\n")
         return raw
@@ -5354,13 +6368,13 @@ class MainWindow(Gtk.ApplicationWindow):
         )
 
         temp_conv = Conversation(
-            id=str(uuid.uuid4()),
+            id=self._next_id(),
             title=f"Fix syntax block {rel_path}",
             model=self.current_conversation.model if self.current_conversation else "default",
         )
         temp_conv.add_message(
             Message(
-                id=str(uuid.uuid4()),
+                id=self._next_id(),
                 role=MessageRole.USER,
                 content=prompt,
             )
@@ -5527,7 +6541,16 @@ class MainWindow(Gtk.ApplicationWindow):
         Handles the 'summarize_file_for_index' tool call. Reads a file's content,
         sends it to the LM Studio AI for summarization based on project index
         criteria, and then updates the PROJECT_INDEX.json.
+
+        A 'paths' list is summarized in batches of up to _SUMMARIZE_BATCH_MAX
+        files per request, sized to the context limit, instead of one
+        round-trip per file.
         """
+        paths = args.get("paths")
+        if isinstance(paths, list) and paths:
+            return await self._summarize_files_for_index(
+                [str(p).strip() for p in paths if str(p).strip()])
+
         file_path = args.get("path")
         if not file_path:
             return {"ok": False, "error": "Missing 'path' argument for summarize_file_for_index."}
@@ -5546,29 +6569,29 @@ class MainWindow(Gtk.ApplicationWindow):
         if not content:
             return {"ok": False, "error": f"File {file_path} is empty, cannot summarize."}
 
+        model = self.current_conversation.model if self.current_conversation else "default"
+        cache_fields = self._index_cache_fields(content, model)
+        project_index = await asyncio.to_thread(self._load_project_index)
+        if self._index_entry_is_current(project_index, file_path, cache_fields):
+            return {"ok": True, "cached": True, "message": f"Index entry for {file_path} is up to date."}
+
         # 2. Prepare a temporary conversation for AI summarization
         temp_conv = Conversation(
-            id=str(uuid.uuid4()), # Use a new UUID for temp conv
+            id=self._next_id(), # Use a new UUID for temp conv
             title=f"Summarize {file_path}",
-            model=self.current_conversation.model if self.current_conversation else "default",
+            model=model,
         )
         temp_conv.add_message(Message(
-            id=str(uuid.uuid4()),
+            id=self._next_id(),
             role=MessageRole.USER,
-            content=f"Summarize the following file content for a project index. Provide a JSON object with 'purpose', 'public_api', 'dependencies' (list of strings), 'key_responsibilities' (list of strings), and 'known_issues' (list of strings). If a field is not applicable or cannot be determined, omit it or set it to null.\n\nFile: {file_path}\nContent:\n```\n{content}\n```\n\nReturn ONLY a JSON object. Do not include any other text or markdown."
+            content=f"{_INDEX_SUMMARY_INSTRUCTIONS}\n\nFile: {file_path}\nContent:\n```\n{content}\n```\n\nReturn ONLY a JSON object. Do not include any other text or markdown."
         ))
 
         settings = self._get_effective_settings(temp_conv)
         # Ensure token saver is off and context limit is sufficient for summarization
         settings.token_saver = False
-        settings.max_tokens = min(settings.max_tokens, 2048) # Cap summary response
-        settings.system_prompt = (
-            "You are an expert software engineer assistant tasked with summarizing code files "
-            "for a project index. Your output MUST be a JSON object with the keys: 'purpose', "
-            "'public_api', 'dependencies' (list of strings), 'key_responsibilities' (list of strings), "
-            "'known_issues' (list of strings). Omit fields that are not applicable or cannot be determined. "
-            "Do NOT include any other text, markdown, or commentary."
-        )
+        settings.max_tokens = min(settings.max_tokens, _INDEX_SUMMARY_REPLY_TOKENS) # Cap summary response
+        settings.system_prompt = _INDEX_SUMMARY_SYSTEM_PROMPT
 
         try:
             # Call LM Studio API for summarization
@@ -5584,15 +6607,10 @@ class MainWindow(Gtk.ApplicationWindow):
             if not isinstance(summarized_data, dict):
                 raise ValueError("AI response was not a valid JSON object.")
 
-            # 4. Update the project index using the dedicated tool
-            update_result_json = await self._update_project_index_tool(
-                file_path=file_path,
-                purpose=summarized_data.get("purpose", ""),
-                public_api=summarized_data.get("public_api"),
-                dependencies=summarized_data.get("dependencies"),
-                key_responsibilities=summarized_data.get("key_responsibilities"),
-                known_issues=summarized_data.get("known_issues"),
-            )
+            # 4. Update the project index, recording what the summary was built from
+            update_result_json = await self._store_project_index_entries({
+                file_path: self._index_entry_from_summary(summarized_data, cache_fields),
+            })
             update_result = json.loads(update_result_json) # Deserialize the result from the tool call
             if not update_result.get("ok"):
                 return {"ok": False, "error": f"Failed to update project index after summarization: {update_result.get('error')}"}
@@ -5605,6 +6623,178 @@ class MainWindow(Gtk.ApplicationWindow):
             logger.error("Error during file summarization: %s", e)
             return {"ok": False, "error": f"An error occurred during summarization: {e}"}
 
+    @staticmethod
+    def _index_cache_fields(content: str, model: str) -> dict:
+        """Return the bookkeeping fields identifying what an index summary was built from."""
+        return {
+            "content_sha256": hashlib.sha256(content.encode("utf-8", "surrogatepass")).hexdigest(),
+            "schema_version": _INDEX_SCHEMA_VERSION,
+            "config_hash": _index_summary_config_hash(model),
+        }
+
+    def _index_entry_is_current(self, project_index: dict, file_path: str, cache_fields: dict) -> bool:
+        """Return True when the stored entry was summarized from identical content and config."""
+        root = self._get_workspace_root()
+        entry = project_index.get(os.path.relpath(os.path.join(root, file_path), root))
+        return isinstance(entry, dict) and all(
+            entry.get(key) == value for key, value in cache_fields.items())
+
+    @staticmethod
+    def _index_entry_from_summary(summary: dict, cache_fields: dict) -> dict:
+        """Build a PROJECT_INDEX.json entry from a model summary."""
+        return {
+            "purpose": summary.get("purpose", ""),
+            "public_api": summary.get("public_api"),
+            "dependencies": summary.get("dependencies") or [],
+            "key_responsibilities": summary.get("key_responsibilities") or [],
+            "known_issues": summary.get("known_issues") or [],
+            **cache_fields,
+        }
+
+    async def _summarize_files_for_index(self, paths: list[str]) -> dict:
+        """Summarize many files for PROJECT_INDEX.json with batched model requests."""
+        paths = list(dict.fromkeys(paths))
+        if not paths:
+            return {"ok": False, "error": "Missing 'path' argument for summarize_file_for_index."}
+
+        model = self.current_conversation.model if self.current_conversation else "default"
+        project_index = await asyncio.to_thread(self._load_project_index)
+        errors = {}
+        cached = []
+        pending = []
+        for file_path in paths:
+            read_result = await self._tool_builtin_read_file(
+                {
+                    "path": file_path,
+                    "allow_large_file_full_read": True,
+                }
+            )
+            if not read_result.get("ok"):
+                errors[file_path] = f"Failed to read file for summarization: {read_result.get('error')}"
+            elif not read_result.get("content"):
+                errors[file_path] = "File is empty, cannot summarize."
+            else:
+                content = read_result["content"]
+                cache_fields = self._index_cache_fields(content, model)
+                if self._index_entry_is_current(project_index, file_path, cache_fields):
+                    cached.append(file_path)
+                else:
+                    pending.append((file_path, content, cache_fields))
+
+        batches, oversized = await self._plan_index_summary_batches(pending, model)
+        summarized_alone = []
+        for file_path in oversized:
+            # Too big to share a request; the single-file path summarizes and stores it.
+            single_result = await self._tool_summarize_file_for_index({"path": file_path})
+            if single_result.get("ok"):
+                summarized_alone.append(file_path)
+            else:
+                errors[file_path] = single_result.get("error") or "Summarization failed."
+
+        entries = {}
+        for batch in batches:
+            try:
+                summaries = await self._request_index_summaries(
+                    [(file_path, content) for file_path, content, _fields in batch], model)
+            except Exception as e:
+                logger.error("Error during batched file summarization: %s", e)
+                summaries = {}
+            for file_path, _content, cache_fields in batch:
+                summary = summaries.get(file_path)
+                if not isinstance(summary, dict):
+                    errors[file_path] = "AI response did not include a summary for this file."
+                    continue
+                entries[file_path] = self._index_entry_from_summary(summary, cache_fields)
+
+        if entries:
+            update_result = json.loads(await self._store_project_index_entries(entries))
+            if not update_result.get("ok"):
+                return {"ok": False, "error": f"Failed to update project index after summarization: {update_result.get('error')}"}
+
+        summarized = list(entries) + summarized_alone
+        result = {
+            "ok": bool(summarized or cached),
+            "message": f"Summarized and updated index for {len(summarized)} of {len(paths)} files.",
+            "summarized": summarized,
+        }
+        if cached:
+            result["cached"] = cached
+        if errors:
+            result["errors"] = errors
+        return result
+
+    async def _plan_index_summary_batches(
+        self, pending: list[tuple[str, str, dict]], model: str,
+    ) -> tuple[list[list[tuple[str, str, dict]]], list[str]]:
+        """Group files into summary requests that fit the context limit.
+
+        Each file costs its content tokens plus its reply budget. Batches are
+        filled in order up to the context limit (less the shared prompt) and
+        _SUMMARIZE_BATCH_MAX files. Files that need more than half of that
+        budget are returned separately for the single-file path.
+        """
+        if not pending:
+            return [], []
+        settings = self._get_effective_settings(
+            Conversation(id=self._next_id(), title="Summarize files", model=model))
+        reply_tokens = min(settings.max_tokens, _INDEX_SUMMARY_REPLY_TOKENS)
+        texts = [_INDEX_BATCH_SUMMARY_SYSTEM_PROMPT + _INDEX_BATCH_SUMMARY_INSTRUCTIONS]
+        texts.extend(
+            f"\nFile: {file_path}\nContent:\n```\n{content}\n```\n"
+            for file_path, content, _fields in pending)
+        counts = await asyncio.to_thread(count_texts_tokens, texts, model)
+        budget = settings.context_limit - counts[0]
+
+        batches = []
+        oversized = []
+        batch = []
+        batch_tokens = 0
+        for item, tokens in zip(pending, counts[1:]):
+            cost = tokens + reply_tokens
+            if cost > budget // 2:
+                oversized.append(item[0])
+                continue
+            if batch and (batch_tokens + cost > budget or len(batch) >= _SUMMARIZE_BATCH_MAX):
+                batches.append(batch)
+                batch = []
+                batch_tokens = 0
+            batch.append(item)
+            batch_tokens += cost
+        if batch:
+            batches.append(batch)
+        return batches, oversized
+
+    async def _request_index_summaries(self, batch: list[tuple[str, str]], model: str) -> dict:
+        """Ask the model for index summaries of several files in one request.
+
+        Returns a dict mapping each file path to its summary object.
+        """
+        parts = [_INDEX_BATCH_SUMMARY_INSTRUCTIONS, "\n"]
+        for file_path, content in batch:
+            parts.append(f"\nFile: {file_path}\nContent:\n```\n{content}\n```\n")
+        parts.append("\nReturn ONLY a JSON object. Do not include any other text or markdown.")
+
+        temp_conv = Conversation(
+            id=self._next_id(),
+            title=f"Summarize {len(batch)} files",
+            model=model,
+        )
+        temp_conv.add_message(Message(
+            id=self._next_id(),
+            role=MessageRole.USER,
+            content="".join(parts),
+        ))
+
+        settings = self._get_effective_settings(temp_conv)
+        settings.token_saver = False
+        # Each file gets the single-file summary budget; a shared one would truncate
+        # the JSON reply and lose every entry in the batch together.
+        settings.max_tokens = min(settings.max_tokens, _INDEX_SUMMARY_REPLY_TOKENS) * len(batch)
+        settings.system_prompt = _INDEX_BATCH_SUMMARY_SYSTEM_PROMPT
+
+        response = await self._chat_with_retries(temp_conv, settings, tool_executor=None)
+        return self._parse_json_object_from_text(response) or {}
+
     async def _tool_load_files_into_context(self, args: dict) -> dict:
         """
         Tool: Loads specified files into the AI's active working context for deep retrieval.
@@ -5632,21 +6822,35 @@ class MainWindow(Gtk.ApplicationWindow):
         if not paths_to_load:
             # Clear active context if no paths are provided
             self.current_conversation.active_context_files = {}
-            self._save_conversations() # Persist the change
+            # Runs on the asyncio thread; the save scheduler lives on the main loop.
+            GLib.idle_add(self._save_conversations, {self.current_conversation.id})
             logger.info("Active context files cleared for conversation %s", self.current_conversation.id)
             return {"ok": True, "message": "Active context files cleared."}
 
-        for rel_path in paths_to_load:
-            # Use _tool_builtin_read_file to get content safely
-            read_result = await self._tool_builtin_read_file({"path": rel_path})
-            if read_result.get("ok"):
+        # Reads run in worker threads, so overlap them; the semaphore bounds open files.
+        read_slots = asyncio.Semaphore(_CONTEXT_LOAD_CONCURRENCY)
+
+        async def read_one(rel_path):
+            async with read_slots:
+                # Use _tool_builtin_read_file to get content safely
+                return await self._tool_builtin_read_file({"path": rel_path})
+
+        read_results = await asyncio.gather(
+            *(read_one(rel_path) for rel_path in paths_to_load), return_exceptions=True)
+        for rel_path, read_result in zip(paths_to_load, read_results):
+            if isinstance(read_result, asyncio.CancelledError):
+                raise read_result
+            if isinstance(read_result, BaseException):
+                errors.append(f"Failed to load '{rel_path}': {read_result}")
+            elif read_result.get("ok"):
                 loaded_files[rel_path] = read_result.get("content", "")
             else:
                 errors.append(f"Failed to load '{rel_path}': {read_result.get('error')}")
         
         # Update the conversation's active context files
         self.current_conversation.active_context_files = loaded_files
-        self._save_conversations() # Persist the change
+        # Runs on the asyncio thread; the save scheduler lives on the main loop.
+        GLib.idle_add(self._save_conversations, {self.current_conversation.id})
 
         if errors:
             logger.warning("Errors while loading files into context for conversation %s: %s", self.current_conversation.id, errors)
@@ -5838,21 +7042,19 @@ class MainWindow(Gtk.ApplicationWindow):
             op_diff = ""
             cumulative_diff = ""
             if existing_file and prior_content is not None:
-                op_diff = "".join(difflib.unified_diff(
-                    prior_content.splitlines(keepends=True),
-                    content.splitlines(keepends=True),
+                op_diff = _unified_diff_text(
+                    prior_content,
+                    content,
                     fromfile=rel_path + " (before write)",
                     tofile=rel_path + " (after write)",
-                    lineterm=""
-                ))
+                )
                 if baseline_content is not None:
-                    cumulative_diff = "".join(difflib.unified_diff(
-                        baseline_content.splitlines(keepends=True),
-                        content.splitlines(keepends=True),
+                    cumulative_diff = _unified_diff_text(
+                        baseline_content,
+                        content,
                         fromfile=rel_path + " (last shown)",
                         tofile=rel_path + " (current)",
-                        lineterm=""
-                    ))
+                    )
             self._set_last_diff_snapshot(rel_path, content)
             return {
                 "ok": True,
@@ -5898,7 +7100,7 @@ class MainWindow(Gtk.ApplicationWindow):
         if find_text == "":
             return {"ok": False, "error": "'find' must not be empty"}
 
-        line_count = self._file_line_count(rel_path, target)
+        line_count = await self._file_line_count(rel_path, target)
         if line_count > int(self._large_file_line_threshold):
             if not self._has_recent_search(rel_path):
                 return {
@@ -5956,21 +7158,19 @@ class MainWindow(Gtk.ApplicationWindow):
                 target_path=target,
             )
 
-            diff = list(difflib.unified_diff(
-                original_content.splitlines(keepends=True),
-                updated_content.splitlines(keepends=True),
+            baseline_content = self._get_last_diff_snapshot(rel_path) or original_content
+            diff = _unified_diff_text(
+                original_content,
+                updated_content,
                 fromfile=rel_path + " (original)",
                 tofile=rel_path + " (modified)",
-                lineterm=""
-            ))
-            baseline_content = self._get_last_diff_snapshot(rel_path) or original_content
-            diff_since_last = list(difflib.unified_diff(
-                baseline_content.splitlines(keepends=True),
-                updated_content.splitlines(keepends=True),
+            )
+            diff_since_last = _unified_diff_text(
+                baseline_content,
+                updated_content,
                 fromfile=rel_path + " (last shown)",
                 tofile=rel_path + " (current)",
-                lineterm=""
-            ))
+            )
             self._set_last_diff_snapshot(rel_path, updated_content)
 
             return {
@@ -5986,8 +7186,8 @@ class MainWindow(Gtk.ApplicationWindow):
                     "path": rel_path,
                     "content_hash": cache_entry.get("content_hash"),
                     "read_before_edit": True,
-                    "diff": "".join(diff_since_last),
-                    "operation_diff": "".join(diff),
+                    "diff": diff_since_last,
+                    "operation_diff": diff,
                 }
             }
         except Exception as e:
@@ -6008,7 +7208,7 @@ class MainWindow(Gtk.ApplicationWindow):
         target = self._safe_path(rel_path)
         if not target or not os.path.isfile(target): # _safe_path returns None if path is outside sandbox
             return {"ok": False, "error": f"Invalid or unsafe file path: '{rel_path}'. Path must be relative and within the project directory."}
-        allowed = await asyncio.to_thread(self._confirm_delete_file_twice_blocking, rel_path)
+        allowed = await self._confirm_delete_file_twice(rel_path)
         if not allowed:
             return {"ok": False, "error": "Deletion rejected by user"}
         try:
@@ -6089,8 +7289,6 @@ class MainWindow(Gtk.ApplicationWindow):
 
     async def _tool_builtin_search_files(self, args: dict) -> dict:
         """Built-in filesystem search for files/folders by name pattern."""
-        import fnmatch
-
         pattern = str(args.get("pattern", "")).strip()
         rel_path = str(args.get("path", ".")).strip() or "."
         max_results = int(args.get("max_results", 100))
@@ -6169,24 +7367,32 @@ class MainWindow(Gtk.ApplicationWindow):
         except Exception as e:
             return {"ok": False, "error": f"Search failed: {e}"}
 
-    def _confirm_delete_file_twice_blocking(self, rel_path: str) -> bool:
+    async def _confirm_delete_file_twice(self, rel_path: str) -> bool:
         """Require two explicit user approvals before deleting a whole file."""
-        first = self._confirm_delete_dialog_blocking(
+        first = await self._confirm_delete_dialog_async(
             "Confirm File Deletion",
             f"The AI requested deleting file:\n{rel_path}\n\nContinue?",
         )
         if not first:
             return False
-        second = self._confirm_delete_dialog_blocking(
+        second = await self._confirm_delete_dialog_async(
             "Final Confirmation",
             f"This will permanently delete:\n{rel_path}\n\nDelete this file now?",
         )
         return second
 
-    def _confirm_delete_dialog_blocking(self, title: str, body: str) -> bool:
-        """Show one blocking yes/no dialog on GTK main thread."""
-        done = threading.Event()
-        result = {"ok": False}
+    async def _confirm_delete_dialog_async(self, title: str, body: str) -> bool:
+        """Show one yes/no dialog on GTK main thread and await its response."""
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+
+        def _resolve(approved: bool) -> None:
+            if not fut.done():
+                fut.set_result(approved)
+
+        def _on_response(dialog, response) -> None:
+            loop.call_soon_threadsafe(_resolve, response == Gtk.ResponseType.OK)
+            dialog.destroy()
 
         def _show() -> bool:
             dialog = Gtk.MessageDialog(
@@ -6197,25 +7403,24 @@ class MainWindow(Gtk.ApplicationWindow):
                 text=title,
             )
             dialog.format_secondary_text(body)
-            response = dialog.run()
-            dialog.destroy()
-            result["ok"] = response == Gtk.ResponseType.OK
-            done.set()
+            dialog.set_modal(True)
+            dialog.connect("response", _on_response)
+            dialog.show()
             return False
 
         GLib.idle_add(_show)
-        done.wait(timeout=300.0)
-        return bool(result["ok"])
+        try:
+            return bool(await asyncio.wait_for(fut, timeout=300.0))
+        except asyncio.TimeoutError:
+            return False
 
     def _safe_path(self, path_value: str) -> Optional[str]:
         """Resolve path within workspace root only."""
         # Use effective workspace root which may be overridden in agent mode
         root_dir = self._get_workspace_root()
-        # Determine application code root (two levels up from this file)
-        app_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+        app_root = self._app_root
         # Record for diagnostics
         self._last_safe_root = root_dir
-        self._app_root = app_root
         # If the workspace root is inside the application code directory, deny access.
         try:
             in_app = (root_dir == app_root) or root_dir.startswith(app_root + os.sep)
@@ -6296,18 +7501,30 @@ class MainWindow(Gtk.ApplicationWindow):
             if isinstance(cfg, dict):
                 proj_dir = str(cfg.get("project_dir", "")).strip()
                 if proj_dir and os.path.isdir(proj_dir):
-                    try:
-                        proj_dir_abs = os.path.abspath(proj_dir)
-                        # Reject project dirs that are inside the application code
-                        app_root = getattr(self, "_app_root", os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
-                        if proj_dir_abs == app_root or proj_dir_abs.startswith(app_root + os.sep):
-                            logger.warning("Ignoring agent project_dir inside app repo: %s", proj_dir_abs)
-                        else:
-                            return proj_dir_abs
-                    except Exception:
-                        pass
+                    resolved = self._resolve_project_dir_root(proj_dir)
+                    if resolved:
+                        return resolved
         return self.workspace_root
 
+    def _resolve_project_dir_root(self, proj_dir: str) -> Optional[str]:
+        """Resolve a configured project_dir once; None when it lies inside app code."""
+        if proj_dir in self._project_dir_roots:
+            return self._project_dir_roots[proj_dir]
+        resolved = None
+        try:
+            # Resolved like the workspace and app roots so symlinks compare consistently.
+            proj_dir_abs = str(pathlib.Path(proj_dir).resolve())
+            # Reject project dirs that are inside the application code
+            app_root = self._app_root
+            if proj_dir_abs == app_root or proj_dir_abs.startswith(app_root + os.sep):
+                logger.warning("Ignoring agent project_dir inside app repo: %s", proj_dir_abs)
+            else:
+                resolved = proj_dir_abs
+        except Exception:
+            return None
+        self._project_dir_roots[proj_dir] = resolved
+        return resolved
+
     def _default_model_name(self) -> str:
         """Return active loaded model id when known, otherwise fallback."""
         return self.loaded_model_id or "llama2-7b"
@@ -6573,13 +7790,15 @@ class MainWindow(Gtk.ApplicationWindow):
                         context_limit=self._get_effective_settings(
                             self.current_conversation).context_limit,
                     )
-                self._save_conversations()
+                GLib.idle_add(self._save_conversations)
         else:
             print("Warning: Could not connect to LM Studio")
             self.chat_input.update_connection_status(False)
 
-        # Start periodic connection status check
-        GLib.timeout_add_seconds(5, self._check_connection_status_periodic)
+        # Periodic connection re-checks poll the API endpoint; only when opted in.
+        if C.CONNECTION_POLL_INTERVAL_SEC > 0:
+            GLib.timeout_add_seconds(
+                C.CONNECTION_POLL_INTERVAL_SEC, self._check_connection_status_periodic)
 
     def _check_connection_status_periodic(self) -> bool:
         """Periodically check API connection status and update the UI.
@@ -6587,76 +7806,44 @@ class MainWindow(Gtk.ApplicationWindow):
         Returns:
             True to continue the timeout, False to stop it.
         """
-        def check_and_update():
-            """Async helper to check connection and update status."""
-            async def do_check():
-                try:
-                    is_connected = await self.api_client.check_connection()
-                    if is_connected:
-                        self.chat_input.update_connection_status(
-                            True, "Connected · Ready")
-                    else:
-                        self.chat_input.update_connection_status(
-                            False, "Disconnected · LM Studio")
-                except Exception as e:
-                    print(f"Error checking connection: {e}")
-                    self.chat_input.update_connection_status(
-                        False, "Disconnected · LM Studio")
-
-            # Run the async check in the event loop
-            if self._loop:
-                import asyncio
-                task = asyncio.ensure_future(do_check(), loop=self._loop)
-
-        check_and_update()
+        self._submit_connection_check(announce=False)
         return True  # Continue the timeout
 
     def _on_refresh_connection(self) -> None:
         """Handle refresh button click - immediately check connection status."""
-        def check_and_update():
-            """Async helper to check connection and update status."""
-            async def do_check():
-                try:
-                    # Show checking message
+        self._submit_connection_check(announce=True)
+
+    def _submit_connection_check(self, announce: bool) -> None:
+        """Run a connection check on the shared asyncio loop."""
+        async def do_check():
+            try:
+                if announce:
                     GLib.idle_add(
                         self.chat_input.update_connection_status,
                         False,
                         "Checking connection...",
                     )
-
-                    is_connected = await self.api_client.check_connection()
-                    if is_connected:
-                        GLib.idle_add(
-                            self.chat_input.update_connection_status,
-                            True,
-                            "Connected · Ready",
-                        )
-                    else:
-                        GLib.idle_add(
-                            self.chat_input.update_connection_status,
-                            False,
-                            "Disconnected · LM Studio",
-                        )
-                except Exception as e:
-                    print(f"Error checking connection: {e}")
+                is_connected = await self.api_client.check_connection()
+                if is_connected:
+                    GLib.idle_add(
+                        self.chat_input.update_connection_status,
+                        True,
+                        "Connected · Ready",
+                    )
+                else:
                     GLib.idle_add(
                         self.chat_input.update_connection_status,
                         False,
                         "Disconnected · LM Studio",
                     )
+            except Exception as e:
+                print(f"Error checking connection: {e}")
+                GLib.idle_add(
+                    self.chat_input.update_connection_status,
+                    False,
+                    "Disconnected · LM Studio",
+                )
 
-            # Run the async check in a new thread
-            import asyncio
-            import threading
-
-            def run_check():
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-                try:
-                    loop.run_until_complete(do_check())
-                finally:
-                    loop.close()
-
-            threading.Thread(target=run_check, daemon=True).start()
-
-        check_and_update()
+        loop = getattr(self.asyncio_thread, "loop", None)
+        if loop and loop.is_running():
+            asyncio.run_coroutine_threadsafe(do_check(), loop)